@@ -0,0 +1,275 @@
+# api.py
+
+# API HTTP (FastAPI) para integrações sem passar pelo Streamlit (BI, terminais de beira-leito etc.).
+# Reutiliza as mesmas funções de dados do app (notificasanta.py): a listagem é paginada no próprio SQL
+# (fetch_summary_page), os detalhes vêm de load_notification_detail e as escritas passam por
+# create_notification / update_notification / add_history_entry.
+#
+# - Paginação por cursor: ?limit=50&cursor=<next_cursor da página anterior>, ordenado por created_at e id
+#   decrescentes; o cursor é opaco e estável mesmo com inserções novas no topo da lista.
+# - Seleção de campos: ?fields=id,title,status
+# - ETag/If-None-Match nas listagens e nos detalhes: se nada mudou, a resposta é 304 sem corpo.
+# - Exportação: GET /notifications/export?format=csv|xlsx com os filtros da lista do dashboard; o CSV é
+#   enviado em streaming à medida que as linhas chegam do cursor do banco.
+# - Autenticação por token: Authorization: Bearer <token>, com os tokens válidos em API_TOKENS
+#   (separados por vírgula). Sem API_TOKENS configurado, todas as requisições são recusadas.
+#
+# Execução: uvicorn api:app --host 0.0.0.0 --port 8000
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+from datetime import date as dt_date_class, datetime, time as dt_time_class
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
+import psycopg2
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+
+from models import Notification, NotificationSummary
+from notificasanta import (add_history_entry, create_notification, fetch_summary_page, load_notification_detail,
+                           update_notification, DB_CONFIG, EXPORT_MIME_TYPES, FORM_DATA, MIN_TIMESTAMP)
+from notification_export import (EXPORT_FORMATS, export_filename, export_notifications, iter_csv_chunks,
+                                 iter_export_rows)
+
+API_TOKENS = {token.strip() for token in os.getenv("API_TOKENS", "").split(",") if token.strip()}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Campos descritivos que o PATCH aceita. Status, executores, aprovador, classificação e os demais campos
+# do fluxo só mudam pelas telas do app, que validam as transições e o formato dos JSONB.
+UPDATABLE_FIELDS = {
+    'title', 'description', 'location', 'occurrence_date', 'occurrence_time',
+    'reporting_department', 'reporting_department_complement',
+    'notified_department', 'notified_department_complement', 'event_shift',
+    'immediate_actions_taken', 'immediate_action_description',
+    'patient_involved', 'patient_id', 'patient_outcome_obito', 'additional_notes',
+}
+# Campos booleanos que o app grava a partir de "Sim"/"Não"
+YES_NO_FIELDS = {'immediate_actions_taken', 'patient_involved', 'patient_outcome_obito'}
+
+app = FastAPI(title="NotificaSanta API", version="1.0")
+
+
+def require_token(authorization: Optional[str] = Header(default=None)):
+    """Valida o token Bearer contra API_TOKENS."""
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    if not token or not any(hmac.compare_digest(token, valid) for valid in API_TOKENS):
+        raise HTTPException(status_code=401, detail="Token de API ausente ou inválido.")
+
+
+def _encode_cursor(summary: NotificationSummary) -> str:
+    created_at = summary.created_at.isoformat() if summary.created_at else ''
+    return base64.urlsafe_b64encode(f"{created_at}|{summary.id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at_str, id_str = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return (datetime.fromisoformat(created_at_str) if created_at_str else MIN_TIMESTAMP), int(id_str)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+
+def _parse_fields(fields: Optional[str], allowed: Tuple[str, ...]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos desconhecidos: {', '.join(unknown)}")
+    return requested
+
+
+def _select_fields(record_dict: Dict, fields: Optional[List[str]]) -> Dict:
+    if fields is None:
+        return record_dict
+    return {field: record_dict[field] for field in fields}
+
+
+def _json_response_with_etag(request: Request, payload: Any) -> Response:
+    """Serializa o payload e responde 304 se o ETag coincidir com If-None-Match."""
+    body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return Response(status_code=304, headers={'ETag': etag})
+    return Response(content=body, media_type='application/json', headers={'ETag': etag})
+
+
+@app.get("/notifications", dependencies=[Depends(require_token)])
+def list_notifications(request: Request,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                       cursor: Optional[str] = None,
+                       fields: Optional[str] = None,
+                       status: Optional[str] = None):
+    """Lista resumos de notificações, do mais recente para o mais antigo."""
+    selected_fields = _parse_fields(fields, NotificationSummary.__slots__)
+    statuses = _split_param(status)
+    cursor_key = _decode_cursor(cursor) if cursor else None
+    try:
+        # Um item a mais indica se existe próxima página
+        summaries = fetch_summary_page(statuses, cursor_key, limit + 1)
+    except psycopg2.Error:
+        raise HTTPException(status_code=500, detail="Erro ao carregar as notificações.")
+
+    page = summaries[:limit]
+    next_cursor = _encode_cursor(page[-1]) if len(summaries) > limit else None
+    return _json_response_with_etag(request, {
+        'items': [_select_fields(summary.to_dict(), selected_fields) for summary in page],
+        'next_cursor': next_cursor,
+    })
+
+
+def _split_param(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def _stream_csv(filters: Dict[str, Any]):
+    """Gera o CSV direto do cursor do banco; a conexão fica aberta até o fim da resposta."""
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        yield from iter_csv_chunks(iter_export_rows(conn, filters, FORM_DATA.prioridades))
+    finally:
+        conn.close()
+
+
+# Declarada antes de /notifications/{notification_id}, senão "export" seria lido como id
+@app.get("/notifications/export", dependencies=[Depends(require_token)])
+def export_notification_list(format: str = Query('csv'),
+                             status: Optional[str] = None,
+                             nnc: Optional[str] = None,
+                             priority: Optional[str] = None,
+                             date_start: Optional[dt_date_class] = None,
+                             date_end: Optional[dt_date_class] = None,
+                             search: Optional[str] = None,
+                             sort: str = 'created_at',
+                             ascending: bool = False):
+    """Lista filtrada em CSV (streaming) ou XLSX, com os mesmos filtros da lista do dashboard."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato indisponível: {format}")
+    filters = {
+        'statuses': _split_param(status), 'nncs': _split_param(nnc), 'priorities': _split_param(priority),
+        'date_start': date_start, 'date_end': date_end, 'search': search,
+        'sort_column': sort, 'sort_ascending': ascending,
+    }
+    headers = {'Content-Disposition': f'attachment; filename="{export_filename(format)}"'}
+    if format == 'csv':
+        return StreamingResponse(_stream_csv(filters), media_type=EXPORT_MIME_TYPES['csv'], headers=headers)
+
+    # O XLSX só fica pronto ao final (zip); é gravado num arquivo temporário e enviado de lá
+    handle = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        try:
+            with handle:
+                export_notifications(conn, filters, FORM_DATA.prioridades, format, handle)
+        finally:
+            conn.close()
+    except Exception:
+        handle.close()
+        os.remove(handle.name)
+        raise
+    return FileResponse(handle.name, media_type=EXPORT_MIME_TYPES['xlsx'], headers=headers,
+                        background=BackgroundTask(os.remove, handle.name))
+
+
+@app.get("/notifications/{notification_id}", dependencies=[Depends(require_token)])
+def get_notification(request: Request, notification_id: int, fields: Optional[str] = None):
+    """Notificação completa, com anexos, histórico e ações."""
+    selected_fields = _parse_fields(fields, Notification.__slots__)
+    notification = load_notification_detail(notification_id)
+    if notification is None:
+        raise HTTPException(status_code=404, detail="Notificação não encontrada.")
+    return _json_response_with_etag(request, _select_fields(notification.to_dict(), selected_fields))
+
+
+class NotificationCreate(BaseModel):
+    title: str
+    description: str
+    location: str = ''
+    occurrence_date: Optional[dt_date_class] = None
+    occurrence_time: Optional[dt_time_class] = None
+    reporting_department: str = ''
+    reporting_department_complement: str = ''
+    notified_department: str = ''
+    notified_department_complement: str = ''
+    event_shift: Optional[str] = None
+    immediate_actions_taken: bool = False
+    immediate_action_description: str = ''
+    patient_involved: bool = False
+    patient_id: str = ''
+    patient_outcome_obito: Optional[bool] = None
+    additional_notes: str = ''
+
+
+def _to_yes_no(value: Any) -> Any:
+    """Converte booleanos JSON para o "Sim"/"Não" esperado pelas funções do app; outros valores passam direto."""
+    if isinstance(value, bool):
+        return "Sim" if value else "Não"
+    return value
+
+
+@app.post("/notifications", status_code=201, dependencies=[Depends(require_token)])
+def post_notification(payload: NotificationCreate):
+    """Cria uma notificação (sem anexos), como o formulário público."""
+    data = payload.dict()
+    for field in YES_NO_FIELDS:
+        data[field] = _to_yes_no(data[field])
+    if data['event_shift'] is None:
+        data.pop('event_shift')
+    notification = create_notification(data)
+    if not notification:
+        raise HTTPException(status_code=500, detail="Erro ao criar a notificação.")
+    return jsonable_encoder(notification.to_dict())
+
+
+@app.patch("/notifications/{notification_id}", dependencies=[Depends(require_token)])
+def patch_notification(notification_id: int, updates: Dict[str, Any]):
+    """
+    Atualiza campos descritivos da notificação (UPDATABLE_FIELDS); o fluxo de trabalho não é alterado por aqui.
+    Booleanos e datas podem ser enviados no formato JSON.
+    """
+    unknown = sorted(set(updates) - UPDATABLE_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos não atualizáveis: {', '.join(unknown)}")
+    if not updates:
+        raise HTTPException(status_code=400, detail="Nenhum campo para atualizar.")
+    updates = dict(updates)
+    for field in YES_NO_FIELDS & set(updates):
+        updates[field] = _to_yes_no(updates[field])
+    try:
+        if updates.get('occurrence_date'):
+            updates['occurrence_date'] = dt_date_class.fromisoformat(updates['occurrence_date'])
+        if updates.get('occurrence_time'):
+            updates['occurrence_time'] = dt_time_class.fromisoformat(updates['occurrence_time'])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Data/hora da ocorrência em formato inválido (use ISO 8601).")
+    if load_notification_detail(notification_id) is None:
+        raise HTTPException(status_code=404, detail="Notificação não encontrada.")
+    notification = update_notification(notification_id, updates)
+    if not notification:
+        raise HTTPException(status_code=500, detail="Erro ao atualizar a notificação.")
+    return jsonable_encoder(notification.to_dict())
+
+
+class HistoryEntryCreate(BaseModel):
+    action: str
+    user: str
+    details: str = ''
+
+
+@app.post("/notifications/{notification_id}/history", status_code=201, dependencies=[Depends(require_token)])
+def post_history_entry(notification_id: int, payload: HistoryEntryCreate):
+    """Acrescenta uma entrada ao histórico da notificação."""
+    if load_notification_detail(notification_id) is None:
+        raise HTTPException(status_code=404, detail="Notificação não encontrada.")
+    if not add_history_entry(notification_id, payload.action, payload.user, payload.details):
+        raise HTTPException(status_code=500, detail="Erro ao registrar o histórico.")
+    return {'notification_id': notification_id, 'action': payload.action}
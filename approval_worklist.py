@@ -0,0 +1,90 @@
+# approval_worklist.py
+
+# Colunas e consultas da página de aprovação.
+# A ordem das pendentes dependia de ler classification['classification_timestamp'] de cada notificação
+# em Python, e "minhas aprovações encerradas" comparava os usernames gravados em approval/rejection_approval
+# percorrendo todas as notificações. Agora a classificação grava classified_at e a decisão do aprovador
+# grava approved_by/rejected_by (id do usuário), e a página faz duas consultas por índice.
+
+from typing import List
+
+from psycopg2 import sql
+
+# Deve rodar antes de ensure_archive_schema, para que as colunas cheguem ao arquivo e às views *_all
+APPROVAL_COLUMNS_DDL = """
+    ALTER TABLE notifications ADD COLUMN IF NOT EXISTS classified_at TIMESTAMPTZ;
+    ALTER TABLE notifications ADD COLUMN IF NOT EXISTS approved_by INTEGER REFERENCES users(id) ON DELETE SET NULL;
+    ALTER TABLE notifications ADD COLUMN IF NOT EXISTS rejected_by INTEGER REFERENCES users(id) ON DELETE SET NULL;
+    CREATE INDEX IF NOT EXISTS idx_notifications_pending_approval
+        ON notifications (approver, classified_at) WHERE status = 'aguardando_aprovacao';
+"""
+
+# Índices das aprovações encerradas, criados na tabela quente e na de arquivo
+_CLOSED_APPROVAL_INDEXES = (
+    ('approved_by', "status = 'aprovada'"),
+    ('rejected_by', "status = 'reprovada'"),
+)
+
+# Preenche as colunas novas a partir do que já estava gravado nos campos JSONB
+_BACKFILL_SQL = """
+    UPDATE {notifications} n SET
+        classified_at = (n.classification->>'classification_timestamp')::timestamptz,
+        approved_by = (SELECT u.id FROM users u WHERE u.username = n.approval->>'approved_by'),
+        rejected_by = (SELECT u.id FROM users u WHERE u.username = n.rejection_approval->>'rejected_by')
+    WHERE n.classification ? 'classification_timestamp' OR n.approval ? 'approved_by'
+       OR n.rejection_approval ? 'rejected_by'
+"""
+
+
+def add_approval_columns(cur) -> bool:
+    """Cria as colunas e o índice das pendentes. Retorna True se as colunas acabaram de ser criadas."""
+    cur.execute("""
+        SELECT EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'notifications' AND column_name = 'classified_at')
+    """)
+    already_present = cur.fetchone()[0]
+    cur.execute(APPROVAL_COLUMNS_DDL)
+    return not already_present
+
+
+def complete_approval_columns(cur, backfill: bool):
+    """
+    Depois de ensure_archive_schema: cria os índices das aprovações encerradas nas tabelas quente e de
+    arquivo e, se as colunas acabaram de ser criadas, preenche as duas tabelas a partir do JSONB.
+    """
+    for table in ('notifications', 'notifications_archive'):
+        for column, predicate in _CLOSED_APPROVAL_INDEXES:
+            # A tabela de arquivo criada depois do índice já o recebeu (LIKE ... INCLUDING ALL)
+            cur.execute("""
+                SELECT EXISTS (SELECT 1 FROM pg_indexes WHERE tablename = %s AND indexdef LIKE %s)
+            """, (table, f"%({column})%"))
+            if not cur.fetchone()[0]:
+                cur.execute(sql.SQL("CREATE INDEX {} ON {} ({}) WHERE " + predicate).format(
+                    sql.Identifier(f"idx_{table}_{column}"), sql.Identifier(table), sql.Identifier(column)))
+        if backfill:
+            cur.execute(sql.SQL(_BACKFILL_SQL).format(notifications=sql.Identifier(table)))
+
+
+def pending_approval_ids(cur, approver_id: int, priorities: List[str]) -> List[int]:
+    """
+    Notificações aguardando a aprovação de approver_id, na ordem da página: prioridade (na ordem de
+    priorities; sem prioridade conta como a primeira) e depois a data da classificação.
+    """
+    cur.execute("""
+        SELECT id FROM notifications
+        WHERE status = 'aguardando_aprovacao' AND approver = %s
+        ORDER BY COALESCE(array_position(%s::text[], COALESCE(classification->>'prioridade', %s)),
+                          cardinality(%s::text[]) + 1),
+                 classified_at NULLS FIRST, id
+    """, (approver_id, priorities, priorities[0], priorities))
+    return [row[0] for row in cur.fetchall()]
+
+
+def closed_approval_ids(cur, user_id: int) -> List[int]:
+    """Notificações encerradas que user_id aprovou ou reprovou, incluindo as arquivadas."""
+    cur.execute("""
+        SELECT id FROM notifications_all
+        WHERE (status = 'aprovada' AND approved_by = %s) OR (status = 'reprovada' AND rejected_by = %s)
+        ORDER BY id DESC
+    """, (user_id, user_id))
+    return [row[0] for row in cur.fetchall()]
@@ -0,0 +1,384 @@
+# attachment_pipeline.py
+
+# Pipeline de ingestão de anexos fora da requisição.
+# Antes do commit, o formulário reserva o nome único e grava o conteúdo recebido, sem processar, em
+# ATTACHMENTS_DIR/.incoming/<nome único>.upload (stage); para anexos da notificação, a linha em
+# notification_attachments entra com status 'pending' na mesma transação curta da notificação. Se a
+# transação falhar, o arquivo preparado é descartado (discard).
+# Depois do commit (submit), um pool de threads faz o trabalho caro: SHA-256, compressão e gravação num
+# temporário .part, movido para o destino final com os.replace (atômico no mesmo sistema de arquivos).
+# A linha do anexo passa para 'ready' e só então o arquivo preparado é apagado; qualquer erro marca a
+# linha como 'failed' e mantém o arquivo preparado.
+# Uma linha confirmada sempre tem o arquivo em disco (preparado ou final), então uma parada do processo
+# não perde anexos: recover(), executado ao iniciar, reprocessa os arquivos preparados que ficaram para
+# trás, marca como 'ready' as linhas cujo arquivo final já existe e como 'failed' as que não têm arquivo.
+# O envio do formulário paga só uma cópia sequencial do conteúdo, não a compressão.
+#
+# Os arquivos são guardados comprimidos (zstd, se o pacote zstandard estiver instalado, senão gzip),
+# exceto formatos que já são comprimidos (JPEG, PNG, ZIP/Office, etc.), detectados pela extensão e
+# pelos bytes iniciais. O arquivo comprimido recebe o sufixo do codec (.zst/.gz) após o nome único;
+# o nome único registrado no banco não muda. Leia sempre os anexos com open_attachment, que
+# descomprime em streaming.
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, Optional
+
+from psycopg2 import sql
+
+try:
+    import zstandard
+except ImportError:  # Sem zstandard, os anexos são comprimidos com gzip
+    zstandard = None
+
+INCOMING_DIRNAME = '.incoming'
+STAGED_SUFFIX = '.upload'
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+# recover() ignora arquivos preparados mais novos que isso (podem estar em processamento noutro processo)
+RECOVERY_GRACE_SECONDS = 120
+# Arquivos preparados sem linha no banco (transação que não chegou ao commit) são apagados depois disso
+ORPHAN_STAGED_MAX_AGE_SECONDS = 3600
+
+CODEC_NONE = 'none'
+CODEC_GZIP = 'gzip'
+CODEC_ZSTD = 'zstd'
+CODEC_SUFFIXES = {CODEC_ZSTD: '.zst', CODEC_GZIP: '.gz'}
+DEFAULT_CODEC = CODEC_ZSTD if zstandard is not None else CODEC_GZIP
+ZSTD_LEVEL = 6
+GZIP_LEVEL = 6
+# Se a compressão economizar menos que isso, o arquivo é guardado sem compressão
+MIN_COMPRESSION_SAVING = 0.05
+
+ALREADY_COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.mp3', '.mp4', '.m4a', '.mov', '.avi', '.mkv',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp',
+}
+ALREADY_COMPRESSED_SIGNATURES = (
+    b'\xff\xd8\xff',  # JPEG
+    b'\x89PNG',  # PNG
+    b'GIF8',  # GIF
+    b'RIFF',  # WEBP/AVI/WAV (WAV é raro em anexos; aceitamos a perda)
+    b'PK\x03\x04',  # ZIP, DOCX/XLSX/PPTX, ODF
+    b'\x1f\x8b',  # GZIP
+    b'\x28\xb5\x2f\xfd',  # ZSTD
+    b'7z\xbc\xaf',  # 7-Zip
+    b'Rar!',  # RAR
+)
+
+ATTACHMENT_STATUS_PENDING = 'pending'
+ATTACHMENT_STATUS_READY = 'ready'
+ATTACHMENT_STATUS_FAILED = 'failed'
+
+# Colunas de status/integridade dos anexos; executado junto com a criação das tabelas.
+# Linhas já existentes ficam como 'ready', pois foram gravadas de forma síncrona.
+ATTACHMENT_PIPELINE_DDL = """
+    ALTER TABLE notification_attachments ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'ready';
+    ALTER TABLE notification_attachments ADD COLUMN IF NOT EXISTS sha256 VARCHAR(64);
+    ALTER TABLE notification_attachments ADD COLUMN IF NOT EXISTS size_bytes BIGINT; -- tamanho original
+    ALTER TABLE notification_attachments ADD COLUMN IF NOT EXISTS stored_size_bytes BIGINT; -- tamanho em disco
+    ALTER TABLE notification_attachments ADD COLUMN IF NOT EXISTS codec VARCHAR(10) NOT NULL DEFAULT 'none';
+    CREATE INDEX IF NOT EXISTS idx_attachments_unique_name ON notification_attachments (unique_name);
+"""
+
+
+def build_unique_name(notification_id: int, original_name: str) -> str:
+    """Gera o nome único do arquivo no disco (mesmo formato usado desde a versão síncrona)."""
+    safe_original_name = "".join(c for c in original_name if c.isalnum() or c in ('.', '_', '-')).rstrip('.')
+    return f"{notification_id}_{uuid.uuid4().hex}_{safe_original_name}"
+
+
+def choose_codec(unique_name: str, head: bytes) -> str:
+    """Codec de armazenamento para um arquivo, a partir da extensão e dos primeiros bytes."""
+    if os.path.splitext(unique_name)[1].lower() in ALREADY_COMPRESSED_EXTENSIONS:
+        return CODEC_NONE
+    if head.startswith(ALREADY_COMPRESSED_SIGNATURES):
+        return CODEC_NONE
+    return DEFAULT_CODEC
+
+
+def open_attachment(attachments_dir: str, unique_name: str) -> BinaryIO:
+    """
+    Abre um anexo para leitura, descomprimindo em streaming conforme o sufixo encontrado no disco.
+    Enquanto o anexo não chega ao destino final, lê o arquivo preparado na área de entrada.
+    Levanta FileNotFoundError se o arquivo não existir em nenhuma das formas.
+    """
+    base_path = os.path.join(attachments_dir, unique_name)
+    if zstandard is not None and os.path.exists(base_path + CODEC_SUFFIXES[CODEC_ZSTD]):
+        return zstandard.ZstdDecompressor().stream_reader(open(base_path + CODEC_SUFFIXES[CODEC_ZSTD], 'rb'))
+    if os.path.exists(base_path + CODEC_SUFFIXES[CODEC_GZIP]):
+        return gzip.open(base_path + CODEC_SUFFIXES[CODEC_GZIP], 'rb')
+    if not os.path.exists(base_path):
+        staged_path = os.path.join(attachments_dir, INCOMING_DIRNAME, unique_name + STAGED_SUFFIX)
+        if os.path.exists(staged_path):
+            return open(staged_path, 'rb')
+    return open(base_path, 'rb')
+
+
+def stored_file_exists(attachments_dir: str, unique_name: str) -> bool:
+    """Se o anexo já está no destino final, em qualquer uma das formas (comprimido ou não)."""
+    base_path = os.path.join(attachments_dir, unique_name)
+    return any(os.path.exists(base_path + suffix) for suffix in ('', *CODEC_SUFFIXES.values()))
+
+
+def _iter_file_chunks(path: str) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _write_stored_file(chunks: Iterable[bytes], path: str, codec: str):
+    """Escreve o conteúdo em path com o codec indicado, em blocos, e força a gravação em disco."""
+    with open(path, 'wb') as f:
+        if codec == CODEC_ZSTD:
+            with zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f, closefd=False) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+        elif codec == CODEC_GZIP:
+            with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+        else:
+            for chunk in chunks:
+                f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# Ingestões em andamento no processo (nome único -> Future), compartilhadas por todos os pipelines,
+# para que a leitura de um anexo possa esperar a gravação sem precisar da instância do pipeline.
+_pending_lock = threading.Lock()
+_pending: Dict[str, Future] = {}
+
+
+def is_ingestion_pending(unique_name: str) -> bool:
+    with _pending_lock:
+        return unique_name in _pending
+
+
+def wait_for_ingestion(unique_name: str, timeout: Optional[float] = None) -> bool:
+    """Espera a gravação de um anexo terminar. Retorna False se ainda estiver em andamento após o timeout."""
+    with _pending_lock:
+        future = _pending.get(unique_name)
+    if future is None:
+        return True
+    try:
+        future.result(timeout=timeout)
+    except FutureTimeoutError:
+        return False
+    except Exception:
+        pass  # A falha já foi registrada no banco; quem lê o arquivo trata a ausência
+    return True
+
+
+def _forget_ingestion(unique_name: str):
+    with _pending_lock:
+        _pending.pop(unique_name, None)
+
+
+class AttachmentIngestionPipeline:
+    """
+    Grava anexos enviados em segundo plano.
+
+    connect: abre uma conexão nova, usada para marcar a linha do anexo como pronta/falha e em recover().
+    """
+
+    def __init__(self, attachments_dir: str, connect: Callable[[], Any],
+                 max_workers: int = 4):
+        self._attachments_dir = attachments_dir
+        self._incoming_dir = os.path.join(attachments_dir, INCOMING_DIRNAME)
+        self._connect = connect
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='attachment-ingest')
+        self.recovery_counts: Optional[Dict[str, int]] = None
+        self.recovery_error: Optional[BaseException] = None
+
+    def _staged_path(self, unique_name: str) -> str:
+        return os.path.join(self._incoming_dir, unique_name + STAGED_SUFFIX)
+
+    def stage(self, uploaded_file: Any, unique_name: str):
+        """
+        Grava o conteúdo recebido (UploadedFile do Streamlit), sem processar, na área de entrada.
+        Deve ser chamado antes do commit que registra o anexo; erros (OSError) são propagados.
+        """
+        os.makedirs(self._incoming_dir, exist_ok=True)
+        data = uploaded_file.getbuffer()  # memoryview do conteúdo já recebido, sem cópia
+        _write_stored_file((data[offset:offset + CHUNK_SIZE] for offset in range(0, len(data), CHUNK_SIZE)),
+                           self._staged_path(unique_name), CODEC_NONE)
+
+    def discard(self, unique_name: str):
+        """Apaga um arquivo preparado cuja transação não chegou ao commit."""
+        try:
+            os.remove(self._staged_path(unique_name))
+        except FileNotFoundError:
+            pass
+
+    def submit(self, unique_name: str, record_in_db: bool = True) -> Future:
+        """
+        Agenda o processamento de um arquivo preparado com stage(), depois do commit.
+        Com record_in_db=True, a linha correspondente em notification_attachments é atualizada ao final.
+        """
+        with _pending_lock:
+            future = _pending.get(unique_name)
+            if future is not None:  # Já em processamento (p. ex. recover() durante um envio)
+                return future
+            future = self._executor.submit(self._ingest, unique_name, record_in_db)
+            _pending[unique_name] = future
+        future.add_done_callback(lambda _f: _forget_ingestion(unique_name))
+        return future
+
+    def _ingest(self, unique_name: str, record_in_db: bool):
+        staged_path = self._staged_path(unique_name)
+        temp_path = os.path.join(self._incoming_dir, f"{unique_name}.{uuid.uuid4().hex}.part")
+        try:
+            original_size = os.path.getsize(staged_path)
+            digest = hashlib.sha256()
+            for chunk in _iter_file_chunks(staged_path):
+                digest.update(chunk)
+            with open(staged_path, 'rb') as f:
+                head = f.read(8)
+
+            codec = choose_codec(unique_name, head)
+            _write_stored_file(_iter_file_chunks(staged_path), temp_path, codec)
+            stored_size = os.path.getsize(temp_path)
+            if codec != CODEC_NONE and stored_size > original_size * (1 - MIN_COMPRESSION_SAVING):
+                # Conteúdo pouco compressível (p. ex. PDF de imagens já comprimidas): guarda sem compressão
+                codec = CODEC_NONE
+                _write_stored_file(_iter_file_chunks(staged_path), temp_path, codec)
+                stored_size = original_size
+
+            final_path = os.path.join(self._attachments_dir, unique_name + CODEC_SUFFIXES.get(codec, ''))
+            os.replace(temp_path, final_path)
+            if record_in_db:
+                self._mark(unique_name, ATTACHMENT_STATUS_READY, digest.hexdigest(), original_size, stored_size,
+                           codec)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if record_in_db:
+                try:
+                    self._set_status(unique_name, ATTACHMENT_STATUS_FAILED)
+                except Exception:
+                    pass  # A linha fica 'pending'; recover() trata na próxima inicialização
+            raise
+        # Só depois de a linha estar 'ready': até aqui, recover() consegue refazer o processamento
+        os.remove(staged_path)
+
+    def _mark(self, unique_name: str, status: str, sha256: Optional[str] = None, size_bytes: Optional[int] = None,
+              stored_size_bytes: Optional[int] = None, codec: str = CODEC_NONE):
+        conn = None
+        try:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE notification_attachments
+                    SET status = %s, sha256 = %s, size_bytes = %s, stored_size_bytes = %s, codec = %s
+                    WHERE unique_name = %s
+                """, (status, sha256, size_bytes, stored_size_bytes, codec, unique_name))
+            conn.commit()
+        finally:
+            if conn:
+                conn.close()
+
+    def _set_status(self, unique_name: str, status: str, cur=None):
+        """Muda só o status, na tabela quente e na de arquivo (mantém hash e tamanhos já gravados)."""
+        if cur is None:
+            conn = self._connect()
+            try:
+                with conn.cursor() as own_cur:
+                    self._set_status(unique_name, status, own_cur)
+                conn.commit()
+            finally:
+                conn.close()
+            return
+        for table in ('notification_attachments', 'notification_attachments_archive'):
+            cur.execute(sql.SQL("UPDATE {} SET status = %s WHERE unique_name = %s AND status <> %s").format(
+                sql.Identifier(table)), (status, unique_name, status))
+
+    def recover(self) -> Dict[str, int]:
+        """
+        Retoma o que uma parada do processo deixou para trás. Ignora arquivos preparados nos últimos
+        RECOVERY_GRACE_SECONDS, que podem estar sendo processados agora por outro processo.
+        - arquivo preparado com linha em notification_attachments ou referenciado por uma evidência:
+          processado de novo;
+        - arquivo preparado sem referência e antigo: transação que não chegou ao commit, apagado;
+        - linha sem arquivo preparado: 'ready' se o arquivo final existe, senão 'failed'.
+        Retorna contagens por situação. Erros de banco são propagados.
+        """
+        counts = {'resubmitted': 0, 'orphans_removed': 0, 'marked_ready': 0, 'marked_failed': 0}
+        now = time.time()
+        staged_names = set()
+        recent_names = set()
+        if os.path.isdir(self._incoming_dir):
+            for entry in os.scandir(self._incoming_dir):
+                if entry.name.endswith(STAGED_SUFFIX):
+                    name = entry.name[:-len(STAGED_SUFFIX)]
+                    if now - entry.stat().st_mtime < RECOVERY_GRACE_SECONDS:
+                        recent_names.add(name)
+                    else:
+                        staged_names.add(name)
+                elif entry.name.endswith('.part') and now - entry.stat().st_mtime >= RECOVERY_GRACE_SECONDS:
+                    os.remove(entry.path)  # Processamento interrompido; o arquivo preparado continua lá
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT unique_name, status FROM notification_attachments_all")
+                attachment_rows = cur.fetchall()
+                cur.execute("""
+                    SELECT e->>'unique_name' FROM notification_actions_all a,
+                         jsonb_array_elements(a.evidence_attachments) e
+                    WHERE jsonb_typeof(a.evidence_attachments) = 'array'
+                """)
+                evidence_names = {row[0] for row in cur.fetchall()}
+
+                attachment_names = set()
+                for unique_name, status in attachment_rows:
+                    attachment_names.add(unique_name)
+                    if unique_name in staged_names:
+                        self.submit(unique_name)
+                        counts['resubmitted'] += 1
+                    elif unique_name in recent_names or is_ingestion_pending(unique_name):
+                        continue
+                    elif stored_file_exists(self._attachments_dir, unique_name):
+                        if status != ATTACHMENT_STATUS_READY:
+                            self._set_status(unique_name, ATTACHMENT_STATUS_READY, cur)
+                            counts['marked_ready'] += 1
+                    elif status != ATTACHMENT_STATUS_FAILED:
+                        self._set_status(unique_name, ATTACHMENT_STATUS_FAILED, cur)
+                        counts['marked_failed'] += 1
+            conn.commit()
+        finally:
+            conn.close()
+
+        for unique_name in staged_names - attachment_names:
+            if unique_name in evidence_names:
+                self.submit(unique_name, record_in_db=False)
+                counts['resubmitted'] += 1
+            elif now - os.path.getmtime(self._staged_path(unique_name)) >= ORPHAN_STAGED_MAX_AGE_SECONDS:
+                self.discard(unique_name)
+                counts['orphans_removed'] += 1
+        return counts
+
+    def start_recovery(self, delay_seconds: float = RECOVERY_GRACE_SECONDS) -> threading.Thread:
+        """
+        Executa recover() numa thread depois de delay_seconds, para que tudo o que foi preparado antes
+        da parada já tenha passado do período de carência. Um erro fica em recovery_error.
+        """
+        def run():
+            time.sleep(delay_seconds)
+            try:
+                self.recovery_counts = self.recover()
+            except Exception as e:
+                self.recovery_error = e
+
+        thread = threading.Thread(target=run, name='attachment-recovery', daemon=True)
+        thread.start()
+        return thread
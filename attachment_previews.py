@@ -0,0 +1,141 @@
+# attachment_previews.py
+
+# Miniaturas de anexos para exibição inline (imagens reduzidas e primeira página de PDFs).
+# As miniaturas são geradas sob demanda, em um pool de threads, e guardadas em disco num diretório
+# ao lado de ATTACHMENTS_DIR. O cache tem um limite de tamanho total; quando ele é excedido, as
+# miniaturas usadas há mais tempo (mtime, atualizado a cada acesso) são removidas primeiro.
+# Pillow é necessário para gerar miniaturas e PyMuPDF (fitz) para os PDFs; sem eles, a pré-visualização
+# do tipo correspondente fica desativada e os anexos continuam disponíveis apenas para download.
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Optional, Set
+
+from attachment_pipeline import wait_for_ingestion
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow não instalado: sem pré-visualização
+    Image = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # PyMuPDF não instalado: sem pré-visualização de PDF
+    fitz = None
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+PDF_EXTENSIONS = {'.pdf'}
+THUMBNAIL_SIZE = (480, 480)
+THUMBNAIL_QUALITY = 80
+
+
+def preview_kind(file_name: str) -> Optional[str]:
+    """'image', 'pdf' ou None, conforme a extensão e as bibliotecas disponíveis."""
+    extension = os.path.splitext(file_name)[1].lower()
+    if Image is None:
+        return None
+    if extension in IMAGE_EXTENSIONS:
+        return 'image'
+    if extension in PDF_EXTENSIONS and fitz is not None:
+        return 'pdf'
+    return None
+
+
+class PreviewCache:
+    """
+    Cache em disco de miniaturas, com geração assíncrona e despejo LRU por tamanho total.
+
+    open_attachment: abre o arquivo original de um anexo (nome único) para leitura binária.
+    """
+
+    def __init__(self, cache_dir: str, open_attachment: Callable[[str], BinaryIO],
+                 max_bytes: int = 512 * 1024 * 1024, max_workers: int = 2):
+        self._cache_dir = cache_dir
+        self._open_attachment = open_attachment
+        self._max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='attachment-preview')
+        self._lock = threading.Lock()
+        self._in_progress: Set[str] = set()
+        self._failed: Set[str] = set()  # Evita tentar de novo, a cada rerun, arquivos que não geram miniatura
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+
+    def _preview_path(self, unique_name: str) -> str:
+        return os.path.join(self._cache_dir, f"{unique_name}.jpg")
+
+    def get(self, unique_name: str) -> Optional[str]:
+        """
+        Devolve o caminho da miniatura se ela já existir; caso contrário, agenda a geração e devolve None.
+        """
+        if preview_kind(unique_name) is None:
+            return None
+        preview_path = self._preview_path(unique_name)
+        try:
+            os.utime(preview_path)  # Marca o uso para o despejo LRU
+            return preview_path
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if unique_name in self._in_progress or unique_name in self._failed:
+                return None
+            self._in_progress.add(unique_name)
+        self._executor.submit(self._generate, unique_name)
+        return None
+
+    def _generate(self, unique_name: str):
+        preview_path = self._preview_path(unique_name)
+        temp_path = f"{preview_path}.part"
+        try:
+            wait_for_ingestion(unique_name)  # O original pode ainda estar sendo gravado
+            with self._open_attachment(unique_name) as source:
+                if preview_kind(unique_name) == 'pdf':
+                    image = self._render_pdf_first_page(source.read())
+                else:
+                    if not source.seekable():  # Leitor zstd em streaming: o Pillow precisa de seek
+                        source = io.BytesIO(source.read())
+                    image = Image.open(source)
+                    image.draft('RGB', THUMBNAIL_SIZE)  # JPEG: decodifica já em escala reduzida
+                    image = image.convert('RGB')
+                image.thumbnail(THUMBNAIL_SIZE)
+                image.save(temp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+            os.replace(temp_path, preview_path)
+            with self._lock:
+                self._total_bytes += os.path.getsize(preview_path)
+            self._evict_if_needed()
+        except Exception:
+            with self._lock:
+                self._failed.add(unique_name)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        finally:
+            with self._lock:
+                self._in_progress.discard(unique_name)
+
+    @staticmethod
+    def _render_pdf_first_page(pdf_bytes: bytes):
+        with fitz.open(stream=pdf_bytes, filetype='pdf') as document:
+            page = document[0]
+            zoom = THUMBNAIL_SIZE[0] / max(page.rect.width, 1)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+    def _evict_if_needed(self):
+        with self._lock:
+            if self._total_bytes <= self._max_bytes:
+                return
+            entries = sorted((entry for entry in os.scandir(self._cache_dir)
+                              if entry.is_file() and entry.name.endswith('.jpg')),
+                             key=lambda entry: entry.stat().st_mtime)
+            # Remove até 90% do limite, para não despejar a cada nova miniatura
+            target_bytes = int(self._max_bytes * 0.9)
+            for entry in entries:
+                if self._total_bytes <= target_bytes:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    self._total_bytes -= size
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,298 @@
+# bi_export.py
+
+# Exportação incremental para Parquet, para que o BI consulte arquivos e não o banco de produção.
+# Três conjuntos, particionados pelo mês de criação da notificação (estilo Hive, lido direto por
+# pyarrow/pandas, DuckDB, Spark e Power BI):
+#   <destino>/notifications/month=2025-01/part-0.parquet          (classificação JSONB em colunas próprias)
+#   <destino>/notification_history/month=2025-01/part-0.parquet   (histórico das notificações desse mês)
+#   <destino>/notification_actions/month=2025-01/part-0.parquet   (ações das notificações desse mês)
+# Histórico e ações seguem o mês da notificação-pai, então cada mês é uma unidade completa.
+#
+# Incremental: notificações mudam depois de criadas e não há coluna de "atualizado em", então a marca
+# d'água é uma impressão digital por mês (md5 de id + row_version de cada notificação e da contagem/último
+# id do histórico; ações já incrementam row_version). A cada execução só os meses cuja impressão mudou
+# são regravados, e os que deixaram de existir são apagados. As impressões ficam em _watermark.json.
+# Tudo é lido numa única transação REPEATABLE READ somente leitura, então arquivos e marca d'água
+# correspondem ao mesmo instante do banco. Cada arquivo é gravado num temporário oculto na mesma pasta e
+# trocado com os.replace (atômico): quem lê nunca vê um arquivo pela metade. A marca d'água é salva mês a
+# mês, então uma execução interrompida continua de onde parou.
+# patient_id fica de fora (dado pessoal); busca textual e anexos também.
+#
+# Execução: python bi_export.py [destino] [--full]   (destino padrão: BI_EXPORT_DIR ou ./bi_export)
+# Também disponível no painel de administração.
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from psycopg2 import sql
+
+from notification_export import classification_list_text, classification_text
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow não instalado: exportação indisponível
+    pa = None
+    pq = None
+
+BI_EXPORT_DIR = os.getenv("BI_EXPORT_DIR", "bi_export")
+BI_EXPORT_BATCH_ROWS = 5000
+WATERMARK_FILE = '_watermark.json'
+PART_FILE = 'part-0.parquet'
+
+# Impede duas exportações simultâneas (CLI e painel) gravando no mesmo destino
+_ADVISORY_LOCK_KEY = "bi_export"
+
+
+def _utc(expression: str) -> str:
+    return f"{expression} AT TIME ZONE 'UTC'"
+
+
+# (coluna, expressão SQL, tipo). Notificação com alias n, histórico/ações com alias c.
+NOTIFICATION_COLUMNS: Tuple[Tuple[str, str, str], ...] = (
+    ('id', 'n.id', 'int'),
+    ('title', 'n.title', 'text'),
+    ('description', 'n.description', 'text'),
+    ('status', 'n.status', 'text'),
+    ('created_at', _utc('n.created_at'), 'timestamp'),
+    ('occurrence_date', 'n.occurrence_date', 'date'),
+    ('occurrence_time', 'n.occurrence_time', 'time'),
+    ('location', 'n.location', 'text'),
+    ('event_shift', 'n.event_shift', 'text'),
+    ('reporting_department', 'n.reporting_department', 'text'),
+    ('reporting_department_complement', 'n.reporting_department_complement', 'text'),
+    ('notified_department', 'n.notified_department', 'text'),
+    ('notified_department_complement', 'n.notified_department_complement', 'text'),
+    ('immediate_actions_taken', 'n.immediate_actions_taken', 'bool'),
+    ('patient_involved', 'n.patient_involved', 'bool'),
+    ('patient_outcome_obito', 'n.patient_outcome_obito', 'bool'),
+    ('approver_id', 'n.approver', 'int'),
+    ('approved_by_id', 'n.approved_by', 'int'),
+    ('rejected_by_id', 'n.rejected_by', 'int'),
+    ('classified_at', _utc('n.classified_at'), 'timestamp'),
+    ('classification_nnc', classification_text('nnc'), 'text'),
+    ('classification_nivel_dano', classification_text('nivel_dano'), 'text'),
+    ('classification_prioridade', classification_text('prioridade'), 'text'),
+    ('classification_never_event', classification_text('never_event'), 'text'),
+    ('classification_is_sentinel_event', classification_text('is_sentinel_event'), 'text'),
+    ('classification_oms', classification_list_text('oms'), 'text'),
+    ('classification_event_type_main', classification_text('event_type_main'), 'text'),
+    ('classification_event_type_sub', classification_list_text('event_type_sub'), 'text'),
+    ('classification_classificador', classification_text('classificador'), 'text'),
+    ('classification_deadline_date', classification_text('deadline_date'), 'text'),
+    ('classification_requires_approval', classification_text('requires_approval'), 'text'),
+    ('row_version', 'n.row_version', 'int'),
+)
+
+HISTORY_COLUMNS: Tuple[Tuple[str, str, str], ...] = (
+    ('id', 'c.id', 'int'),
+    ('notification_id', 'c.notification_id', 'int'),
+    ('action_type', 'c.action_type', 'text'),
+    ('performed_by', 'c.performed_by', 'text'),
+    ('action_timestamp', _utc('c.action_timestamp'), 'timestamp'),
+    ('details', 'c.details', 'text'),
+)
+
+ACTION_COLUMNS: Tuple[Tuple[str, str, str], ...] = (
+    ('id', 'c.id', 'int'),
+    ('notification_id', 'c.notification_id', 'int'),
+    ('executor_id', 'c.executor_id', 'int'),
+    ('executor_name', 'c.executor_name', 'text'),
+    ('description', 'c.description', 'text'),
+    ('action_timestamp', _utc('c.action_timestamp'), 'timestamp'),
+    ('final_action_by_executor', 'c.final_action_by_executor', 'bool'),
+    ('evidence_description', 'c.evidence_description', 'text'),
+    ('evidence_attachments', 'c.evidence_attachments::text', 'text'),
+)
+
+# (pasta de saída, view de origem (None = a própria notificação), colunas)
+EXPORT_TABLES = (
+    ('notifications', None, NOTIFICATION_COLUMNS),
+    ('notification_history', 'notification_history_all', HISTORY_COLUMNS),
+    ('notification_actions', 'notification_actions_all', ACTION_COLUMNS),
+)
+
+# Meses no fuso da sessão; os limites de _month_bounds são comparados no mesmo fuso
+MONTH_FINGERPRINTS_SQL = """
+    SELECT to_char(n.created_at, 'YYYY-MM') AS month,
+           md5(string_agg(concat_ws(':', n.id, n.row_version, h.entries, h.last_id), ',' ORDER BY n.id))
+    FROM notifications_all n
+    LEFT JOIN (SELECT notification_id, count(*) AS entries, max(id) AS last_id
+               FROM notification_history_all GROUP BY notification_id) h ON h.notification_id = n.id
+    WHERE n.created_at IS NOT NULL
+    GROUP BY 1
+"""
+
+
+def _arrow_type(kind: str):
+    return {
+        'int': pa.int64(),
+        'text': pa.string(),
+        'bool': pa.bool_(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+        'date': pa.date32(),
+        'time': pa.time64('us'),
+    }[kind]
+
+
+def _month_bounds(month: str) -> Tuple[date, date]:
+    year, month_number = (int(part) for part in month.split('-'))
+    start = date(year, month_number, 1)
+    end = date(year + 1, 1, 1) if month_number == 12 else date(year, month_number + 1, 1)
+    return start, end
+
+
+def _month_query(source_view: Optional[str], columns) -> sql.Composed:
+    column_list = sql.SQL(', ').join(sql.SQL(expression) for _, expression, _ in columns)
+    if source_view is None:
+        return sql.SQL("""
+            SELECT {columns} FROM notifications_all n
+            WHERE n.created_at >= %s AND n.created_at < %s ORDER BY n.id
+        """).format(columns=column_list)
+    return sql.SQL("""
+        SELECT {columns} FROM {source} c JOIN notifications_all n ON n.id = c.notification_id
+        WHERE n.created_at >= %s AND n.created_at < %s ORDER BY c.notification_id, c.id
+    """).format(columns=column_list, source=sql.Identifier(source_view))
+
+
+def _replace_atomically(target_path: str, write: Callable[[str], Any]) -> Any:
+    """Grava via write(caminho_temporário) na mesma pasta do destino e troca com os.replace."""
+    directory = os.path.dirname(target_path)
+    os.makedirs(directory, exist_ok=True)
+    # Prefixo '.': leitores de datasets Parquet ignoram o temporário
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    os.close(fd)
+    try:
+        result = write(temp_path)
+        os.replace(temp_path, target_path)
+        return result
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _write_month(conn, output_dir: str, table: str, source_view: Optional[str], columns, month: str) -> int:
+    """Grava um mês de uma tabela, lendo do banco em lotes por um cursor nomeado. Retorna o número de linhas."""
+    schema = pa.schema([(name, _arrow_type(kind)) for name, _, kind in columns])
+
+    def write(temp_path: str) -> int:
+        count = 0
+        with conn.cursor(name=f"bi_export_{uuid.uuid4().hex}") as cur:
+            cur.itersize = BI_EXPORT_BATCH_ROWS
+            cur.execute(_month_query(source_view, columns), _month_bounds(month))
+            with pq.ParquetWriter(temp_path, schema, compression='snappy') as writer:
+                while True:
+                    rows = cur.fetchmany(BI_EXPORT_BATCH_ROWS)
+                    if not rows:
+                        break
+                    arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                    count += len(rows)
+        return count
+
+    return _replace_atomically(os.path.join(output_dir, table, f"month={month}", PART_FILE), write)
+
+
+def load_watermark(output_dir: str) -> Dict[str, Any]:
+    """Marca d'água da última exportação em output_dir ({'months': {mês: impressão}, 'exported_at': ...})."""
+    try:
+        with open(os.path.join(output_dir, WATERMARK_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {'months': {}, 'exported_at': None}
+
+
+def _save_watermark(output_dir: str, watermark: Dict[str, Any]):
+    def write(temp_path: str):
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(watermark, f, indent=2, sort_keys=True)
+
+    _replace_atomically(os.path.join(output_dir, WATERMARK_FILE), write)
+
+
+def export_to_parquet(conn, output_dir: str = BI_EXPORT_DIR, full: bool = False,
+                      progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Atualiza a exportação Parquet em output_dir. full=True regrava todos os meses.
+    Retorna {'months_exported': [...], 'months_removed': [...], 'rows': {tabela: linhas gravadas}}.
+    Erros de banco são propagados; a conexão termina sem transação aberta.
+    """
+    if pq is None:
+        raise RuntimeError("Exportação Parquet indisponível: instale o pacote pyarrow.")
+    watermark = load_watermark(output_dir)
+    previous = watermark['months']
+    # Meses já gravados, pela marca d'água e pelas pastas (que podem existir sem marca d'água, p. ex. se ela
+    # foi apagada): mesmo numa execução completa, os que sumiram do banco precisam ser removidos
+    for table, _, _ in EXPORT_TABLES:
+        table_dir = os.path.join(output_dir, table)
+        if os.path.isdir(table_dir):
+            for entry in os.scandir(table_dir):
+                if entry.is_dir() and entry.name.startswith('month='):
+                    previous.setdefault(entry.name[len('month='):], None)
+    if full:
+        previous = watermark['months'] = dict.fromkeys(previous)
+    summary = {'months_exported': [], 'months_removed': [], 'rows': {table: 0 for table, _, _ in EXPORT_TABLES}}
+
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (_ADVISORY_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                raise RuntimeError("Outra exportação para o BI já está em andamento.")
+            cur.execute(MONTH_FINGERPRINTS_SQL)
+            current = dict(cur.fetchall())
+
+        for month in sorted(current):
+            if previous.get(month) == current[month]:
+                continue
+            if progress:
+                progress(month)
+            for table, source_view, columns in EXPORT_TABLES:
+                summary['rows'][table] += _write_month(conn, output_dir, table, source_view, columns, month)
+            previous[month] = current[month]
+            _save_watermark(output_dir, watermark)
+            summary['months_exported'].append(month)
+
+        for month in sorted(set(previous) - set(current)):
+            for table, _, _ in EXPORT_TABLES:
+                shutil.rmtree(os.path.join(output_dir, table, f"month={month}"), ignore_errors=True)
+            del previous[month]
+            summary['months_removed'].append(month)
+
+        watermark['exported_at'] = datetime.now().isoformat(timespec='seconds')
+        _save_watermark(output_dir, watermark)
+    finally:
+        conn.rollback()
+        conn.set_session(isolation_level='DEFAULT', readonly='DEFAULT')
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Exporta notificações, histórico e ações para Parquet (BI).")
+    parser.add_argument('output_dir', nargs='?', default=BI_EXPORT_DIR, help="pasta de destino")
+    parser.add_argument('--full', action='store_true', help="regrava todos os meses, ignorando a marca d'água")
+    args = parser.parse_args(argv)
+
+    import psycopg2
+    from notificasanta import DB_CONFIG  # Importado aqui: notificasanta também importa este módulo
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        summary = export_to_parquet(conn, args.output_dir, full=args.full,
+                                    progress=lambda month: print(f"Exportando {month}...", flush=True))
+    finally:
+        conn.close()
+    print(f"Meses exportados: {len(summary['months_exported'])}; removidos: {len(summary['months_removed'])}")
+    for table, rows in summary['rows'].items():
+        print(f"  {table}: {rows} linhas")
+
+
+if __name__ == '__main__':
+    main()
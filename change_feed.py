@@ -0,0 +1,187 @@
+# change_feed.py
+
+# Índice em memória das notificações, mantido atualizado pelo feed de alterações do PostgreSQL.
+# Os triggers criados em init_database emitem pg_notify('notif_changes', <id da notificação>) a cada
+# INSERT/UPDATE/DELETE em notifications, notification_history e notification_actions.
+# Uma thread de escuta (LISTEN) apenas acumula os ids alterados; quem lê o índice busca de novo
+# somente esses ids. Assim, um rerun do Streamlit custa O(alterações) e não O(tabela).
+# O índice é compartilhado por todas as sessões do processo (ver get_notification_index).
+
+import select
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from models import NotificationSummary
+
+CHANGE_CHANNEL = 'notif_changes'
+
+# Função e triggers do feed de alterações; executados junto com a criação das tabelas.
+CHANGE_FEED_DDL = """
+    CREATE OR REPLACE FUNCTION notify_notification_change() RETURNS TRIGGER AS $BODY$
+    DECLARE
+        changed_id INTEGER;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            IF TG_TABLE_NAME = 'notifications' THEN
+                changed_id := OLD.id;
+            ELSE
+                changed_id := OLD.notification_id;
+            END IF;
+        ELSE
+            IF TG_TABLE_NAME = 'notifications' THEN
+                changed_id := NEW.id;
+            ELSE
+                changed_id := NEW.notification_id;
+            END IF;
+        END IF;
+        -- Dentro de uma transação, payloads iguais são entregues uma única vez
+        PERFORM pg_notify('notif_changes', changed_id::text);
+        RETURN NULL;
+    END;
+    $BODY$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_notifications_change_feed ON notifications;
+    CREATE TRIGGER trg_notifications_change_feed
+    AFTER INSERT OR UPDATE OR DELETE ON notifications
+    FOR EACH ROW EXECUTE FUNCTION notify_notification_change();
+
+    DROP TRIGGER IF EXISTS trg_history_change_feed ON notification_history;
+    CREATE TRIGGER trg_history_change_feed
+    AFTER INSERT OR UPDATE OR DELETE ON notification_history
+    FOR EACH ROW EXECUTE FUNCTION notify_notification_change();
+
+    DROP TRIGGER IF EXISTS trg_actions_change_feed ON notification_actions;
+    CREATE TRIGGER trg_actions_change_feed
+    AFTER INSERT OR UPDATE OR DELETE ON notification_actions
+    FOR EACH ROW EXECUTE FUNCTION notify_notification_change();
+"""
+
+
+def _created_at_sort_key(summary: NotificationSummary):
+    created_at = summary.created_at
+    return (created_at is not None, created_at)
+
+
+class NotificationIndex:
+    """
+    Resumos das notificações em memória, indexados por id.
+
+    connect: abre uma conexão nova e exclusiva para o LISTEN.
+    fetch_summaries: recebe uma lista de ids (ou None para todas) e devolve os resumos
+    em ordem de created_at decrescente; erros de banco devem ser propagados.
+    """
+
+    def __init__(self, connect: Callable[[], 'psycopg2.extensions.connection'],
+                 fetch_summaries: Callable[[Optional[List[int]]], List[NotificationSummary]],
+                 poll_timeout: float = 5.0, retry_interval: float = 5.0):
+        self._connect = connect
+        self._fetch_summaries = fetch_summaries
+        self._poll_timeout = poll_timeout
+        self._retry_interval = retry_interval
+
+        self._lock = threading.Lock()  # Protege o estado compartilhado com a thread de escuta
+        self._refresh_lock = threading.Lock()  # Evita que duas sessões atualizem o índice ao mesmo tempo
+        self._listening = False
+        self._needs_full_reload = True
+        self._dirty_ids: Set[int] = set()
+
+        self._by_id: Dict[int, NotificationSummary] = {}
+        self._ordered: List[NotificationSummary] = []
+        self._version = 0
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def version(self) -> int:
+        """Contador incrementado a cada alteração aplicada ao índice."""
+        return self._version
+
+    def start(self):
+        """Inicia a thread de escuta (uma única vez)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen_loop, name='notif-change-feed', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def mark_changed(self, notification_ids: Iterable[int]):
+        """Marca ids como alterados sem esperar o NOTIFY (p. ex. logo após uma escrita na mesma sessão)."""
+        with self._lock:
+            self._dirty_ids.update(notification_ids)
+
+    def summaries(self) -> List[NotificationSummary]:
+        """
+        Devolve os resumos em ordem de created_at decrescente, aplicando antes as alterações pendentes.
+        Sem a escuta ativa (conexão do LISTEN caiu ou ainda não subiu), recarrega tudo, como antes do índice.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                full_reload = self._needs_full_reload or not self._listening
+                dirty_ids = self._dirty_ids
+                self._dirty_ids = set()
+                self._needs_full_reload = False
+            try:
+                if full_reload:
+                    summaries = self._fetch_summaries(None)
+                    self._by_id = {summary.id: summary for summary in summaries}
+                    self._ordered = summaries
+                    self._version += 1
+                elif dirty_ids:
+                    refreshed = self._fetch_summaries(sorted(dirty_ids))
+                    for notification_id in dirty_ids:
+                        self._by_id.pop(notification_id, None)  # Ids que não voltaram foram excluídos
+                    for summary in refreshed:
+                        self._by_id[summary.id] = summary
+                    # A lista já está quase ordenada, então o sort (Timsort) é praticamente linear
+                    self._ordered = sorted(self._by_id.values(), key=_created_at_sort_key, reverse=True)
+                    self._version += 1
+            except Exception:
+                # Devolve as pendências para a próxima leitura antes de propagar o erro
+                with self._lock:
+                    self._needs_full_reload = self._needs_full_reload or full_reload
+                    self._dirty_ids.update(dirty_ids)
+                raise
+            return list(self._ordered)
+
+    def _listen_loop(self):
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANGE_CHANNEL}")
+                with self._lock:
+                    # Alterações feitas enquanto não havia escuta não chegaram: recarrega tudo uma vez
+                    self._listening = True
+                    self._needs_full_reload = True
+
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], self._poll_timeout) == ([], [], []):
+                        continue
+                    conn.poll()
+                    changed_ids = set()
+                    while conn.notifies:
+                        payload = conn.notifies.pop(0).payload
+                        if payload.isdigit():
+                            changed_ids.add(int(payload))
+                    if changed_ids:
+                        with self._lock:
+                            self._dirty_ids.update(changed_ids)
+            except (psycopg2.Error, OSError):
+                with self._lock:
+                    self._listening = False
+                self._stop_event.wait(self._retry_interval)
+            finally:
+                if conn:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+        with self._lock:
+            self._listening = False
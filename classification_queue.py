@@ -0,0 +1,91 @@
+# classification_queue.py
+
+# Fila de classificação inicial com reserva ("claim") por classificador.
+# Em vez de todos escolherem na mesma lista, cada classificador pede a "Próxima notificação": a reserva
+# é feita numa única instrução (UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED)), então duas
+# pessoas nunca recebem o mesmo item, mesmo pedindo ao mesmo tempo.
+# A reserva tem prazo (lease): enquanto o classificador trabalha ela é renovada; se ele abandonar a
+# página, o item volta sozinho para a fila quando o prazo vence.
+# Ordem da fila: casos com óbito, depois com paciente envolvido, depois os mais antigos (a prioridade
+# formal só é definida na própria classificação).
+
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+CLAIM_LEASE_MINUTES = 15
+
+# Executado junto com a criação das tabelas, antes de ensure_archive_schema
+CLASSIFICATION_QUEUE_DDL = """
+    ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_by INTEGER REFERENCES users(id) ON DELETE SET NULL;
+    ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMPTZ;
+    CREATE INDEX IF NOT EXISTS idx_notifications_classification_queue
+        ON notifications (created_at, id) WHERE status = 'pendente_classificacao';
+"""
+
+
+def claim_next_notification(conn, user_id: int,
+                            lease_minutes: int = CLAIM_LEASE_MINUTES) -> Optional[Tuple[int, datetime]]:
+    """
+    Reserva para user_id a próxima notificação livre da fila (ou a que ele já tem reservada) e faz commit.
+    Retorna (id, vencimento da reserva) ou None se não houver nada disponível.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE notifications
+            SET claimed_by = %(user_id)s, claim_expires_at = now() + make_interval(mins => %(lease)s)
+            WHERE id = (
+                SELECT id FROM notifications
+                WHERE status = 'pendente_classificacao'
+                  AND (claimed_by IS NULL OR claimed_by = %(user_id)s OR claim_expires_at < now())
+                ORDER BY claimed_by = %(user_id)s DESC NULLS LAST,
+                         patient_outcome_obito IS TRUE DESC, patient_involved IS TRUE DESC, created_at, id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, claim_expires_at
+        """, {'user_id': user_id, 'lease': lease_minutes})
+        row = cur.fetchone()
+    conn.commit()
+    return (row[0], row[1]) if row else None
+
+
+def renew_claim(conn, notification_id: int, user_id: int,
+                lease_minutes: int = CLAIM_LEASE_MINUTES) -> Optional[datetime]:
+    """
+    Estende a reserva, se ela ainda for de user_id e a notificação continuar pendente (mesmo com o prazo
+    vencido, desde que ninguém a tenha reservado depois). Retorna o novo vencimento ou None.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE notifications
+            SET claim_expires_at = now() + make_interval(mins => %s)
+            WHERE id = %s AND claimed_by = %s AND status = 'pendente_classificacao'
+            RETURNING claim_expires_at
+        """, (lease_minutes, notification_id, user_id))
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row else None
+
+
+def release_claim(conn, notification_id: int, user_id: int):
+    """Devolve a notificação à fila (só se a reserva ainda for de user_id)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE notifications SET claimed_by = NULL, claim_expires_at = NULL
+            WHERE id = %s AND claimed_by = %s
+        """, (notification_id, user_id))
+    conn.commit()
+
+
+def queue_counts(conn) -> Dict[str, int]:
+    """Quantas notificações pendentes estão livres e quantas estão reservadas por alguém."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT
+                COUNT(*) FILTER (WHERE claimed_by IS NULL OR claim_expires_at < now()),
+                COUNT(*) FILTER (WHERE claimed_by IS NOT NULL AND claim_expires_at >= now())
+            FROM notifications
+            WHERE status = 'pendente_classificacao'
+        """)
+        available, claimed = cur.fetchone()
+    return {'available': available, 'claimed': claimed}
@@ -6,6 +6,9 @@ from datetime import datetime, date as dt_date_class, time as dt_time_class
 # --- Diretórios de Dados e Arquivos (para anexos) ---
 DATA_DIR = "data"
 ATTACHMENTS_DIR = os.path.join(DATA_DIR, "attachments")
+PREVIEWS_DIR = os.path.join(DATA_DIR, "previews")  # Miniaturas dos anexos (cache com limite de tamanho)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")  # Folhas de estilo dos apps
+STYLESHEET_FILE = "streamlit_app.css"
 
 
 # Mapeamento de prazos para conclusão da notificação
@@ -0,0 +1,90 @@
+# detail_render_cache.py
+
+# Cache dos blocos de texto (markdown/HTML) montados por display_notification_full_details.
+# A chave inclui (notification_id, row_version): row_version é incrementado pelo banco a cada UPDATE da
+# notificação e a cada alteração de anexos ou ações (ROW_VERSION_DDL), então uma entrada nunca fica
+# desatualizada; versões antigas simplesmente deixam de ser pedidas e saem pelo LRU.
+# Notificações encerradas não mudam mais, então abrir os mesmos detalhes de novo não remonta nada.
+# Os widgets (pré-visualizações e botões de download dos anexos) continuam sendo renderizados a cada rerun.
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+# row_version na notificação; mudanças em anexos e ações também incrementam a versão da notificação-pai.
+# Deve rodar antes de ensure_archive_schema, para que a coluna chegue ao arquivo e às views *_all.
+ROW_VERSION_DDL = """
+    ALTER TABLE notifications ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT 0;
+
+    CREATE OR REPLACE FUNCTION bump_notification_row_version() RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.row_version := OLD.row_version + 1;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_notifications_row_version ON notifications;
+    CREATE TRIGGER trg_notifications_row_version
+        BEFORE UPDATE ON notifications
+        FOR EACH ROW EXECUTE FUNCTION bump_notification_row_version();
+
+    CREATE OR REPLACE FUNCTION touch_notification_row_version() RETURNS TRIGGER AS $$
+    BEGIN
+        -- O trigger BEFORE UPDATE acima faz o incremento
+        UPDATE notifications SET row_version = row_version
+        WHERE id = COALESCE(NEW.notification_id, OLD.notification_id);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_attachments_row_version ON notification_attachments;
+    CREATE TRIGGER trg_attachments_row_version
+        AFTER INSERT OR UPDATE OR DELETE ON notification_attachments
+        FOR EACH ROW EXECUTE FUNCTION touch_notification_row_version();
+
+    DROP TRIGGER IF EXISTS trg_actions_row_version ON notification_actions;
+    CREATE TRIGGER trg_actions_row_version
+        AFTER INSERT OR UPDATE OR DELETE ON notification_actions
+        FOR EACH ROW EXECUTE FUNCTION touch_notification_row_version();
+"""
+
+
+def _estimate_size(value: Any) -> int:
+    """Tamanho aproximado em memória de um bloco: strings e tuplas/listas aninhadas de strings."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+
+class DetailRenderCache:
+    """Cache LRU de blocos renderizados, limitado pelo tamanho estimado em memória."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Tuple[List[Tuple[str, Any]], int]]' = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, key: Hashable) -> Optional[List[Tuple[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, blocks: List[Tuple[str, Any]]):
+        size = _estimate_size(blocks)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (blocks, size)
+            self._total_bytes += size
+            while self._total_bytes > self._max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
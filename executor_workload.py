@@ -0,0 +1,90 @@
+# executor_workload.py
+
+# Carga de trabalho dos executores, para sugerir a atribuição no formulário de classificação.
+# Uma única consulta agregada, a partir de notification_executors (índice por executor_id), devolve para
+# cada executor ativo: quantas notificações abertas (classificada/em_execucao) ele ainda não concluiu,
+# quantas delas estão atrasadas ou vencem nos próximos dias e quantas notificações do setor notificado
+# ele já atendeu. A sugestão prioriza quem já atende o setor e, entre esses, os menos carregados.
+# Os usuários não têm setor cadastrado; o vínculo com o setor vem do histórico de atribuições.
+# O prazo (classification.deadline_date) é texto livre no JSONB: a consulta devolve os prazos dos itens
+# abertos como texto e a conversão para data é feita aqui, onde um valor inválido ('', 'N/A', 2024-02-30)
+# só deixa de contar como atrasado/perto do prazo em vez de derrubar a consulta inteira.
+
+import re
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DUE_SOON_DAYS = 3
+# Peso de cada item atrasado / perto do prazo na pontuação de carga, além da contagem de itens abertos
+OVERDUE_WEIGHT = 2
+DUE_SOON_WEIGHT = 1
+
+_ISO_DATE_PREFIX = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[T ]|$)')
+
+
+def parse_deadline_date(value: Optional[str]) -> Optional[date]:
+    """Data de um prazo no formato ISO (só a data ou data e hora); None se não for uma data válida."""
+    match = _ISO_DATE_PREFIX.match(value or '')
+    if not match:
+        return None
+    try:
+        return date(*(int(part) for part in match.groups()))
+    except ValueError:  # Data impossível, como 2024-02-30
+        return None
+
+
+def deadline_counts(deadlines: Iterable[Optional[str]], today: date) -> Tuple[int, int]:
+    """(atrasados, que vencem em até DUE_SOON_DAYS dias) entre os prazos informados; inválidos não contam."""
+    overdue = due_soon = 0
+    for deadline in filter(None, map(parse_deadline_date, deadlines)):
+        if deadline < today:
+            overdue += 1
+        elif deadline <= today + timedelta(days=DUE_SOON_DAYS):
+            due_soon += 1
+    return overdue, due_soon
+
+
+def executor_workload(cur, department: Optional[str] = None, today: Optional[date] = None) -> List[Dict]:
+    """
+    Executores ativos com a carga de trabalho atual, do mais indicado para o menos indicado.
+    Cada item: id, name, username, open_count, overdue_count, due_soon_count, department_count, load_score.
+    """
+    cur.execute("""
+        WITH open_items AS (
+            SELECT ne.executor_id, ne.notification_id, n.notified_department,
+                   n.status IN ('classificada', 'em_execucao') AND ne.concluded_at IS NULL AS is_open,
+                   n.classification->>'deadline_date' AS deadline_date
+            FROM notification_executors ne
+            JOIN notifications n ON n.id = ne.notification_id
+        )
+        SELECT u.id, u.name, u.username,
+               COUNT(o.notification_id) FILTER (WHERE o.is_open) AS open_count,
+               COALESCE(array_agg(o.deadline_date) FILTER (WHERE o.is_open AND o.deadline_date IS NOT NULL),
+                        '{}') AS open_deadlines,
+               COUNT(o.notification_id) FILTER (WHERE o.notified_department = %(department)s) AS department_count
+        FROM users u
+        LEFT JOIN open_items o ON o.executor_id = u.id
+        WHERE u.active AND 'executor' = ANY(u.roles)
+        GROUP BY u.id, u.name, u.username
+    """, {'department': department})
+    today = today or date.today()
+    workload = []
+    for user_id, name, username, open_count, open_deadlines, department_count in cur.fetchall():
+        overdue_count, due_soon_count = deadline_counts(open_deadlines, today)
+        workload.append({
+            'id': user_id, 'name': name, 'username': username,
+            'open_count': open_count, 'overdue_count': overdue_count,
+            'due_soon_count': due_soon_count, 'department_count': department_count,
+            'load_score': open_count + OVERDUE_WEIGHT * overdue_count + DUE_SOON_WEIGHT * due_soon_count,
+        })
+    workload.sort(key=lambda e: (e['department_count'] == 0, e['load_score'], e['open_count'], e['name'] or ''))
+    return workload
+
+
+def suggest_executors(workload: List[Dict], count: int = 1) -> List[Dict]:
+    """
+    Os executores menos carregados do setor (lista já ordenada por executor_workload).
+    Se ninguém atendeu o setor ainda, sugere os menos carregados em geral.
+    """
+    in_department = [e for e in workload if e['department_count'] > 0]
+    return (in_department or workload)[:count]
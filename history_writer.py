@@ -0,0 +1,62 @@
+# history_writer.py
+
+# Gravação em lote das entradas de notification_history.
+# Cada passo do fluxo (classificação, revisão, aprovação, execução) costumava abrir uma conexão, inserir
+# uma linha de histórico e fazer commit, além do commit da própria atualização da notificação.
+# O HistoryWriter acumula as entradas de uma ação do usuário e as grava com um único INSERT de várias
+# linhas (execute_values). Com um cursor existente, a gravação entra na transação do chamador (que faz o
+# commit); sem cursor, abre uma conexão própria e faz um único commit para o lote todo.
+
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+
+class HistoryWriter:
+    """
+    Buffer de entradas de histórico.
+
+    connect: abre uma conexão nova; só é usado por flush() quando nenhum cursor é informado.
+    """
+
+    def __init__(self, connect: Optional[Callable[[], Any]] = None):
+        self._connect = connect
+        self._entries: List[Tuple[int, str, str, datetime, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, notification_id: int, action: str, user: str, details: str = ""):
+        """Acumula uma entrada; o horário registrado é o do momento da chamada, não o do flush."""
+        self._entries.append((notification_id, action, user, datetime.now(), details))
+
+    def flush(self, cursor=None) -> int:
+        """
+        Grava as entradas acumuladas e esvazia o buffer. Retorna quantas foram gravadas.
+        Erros de banco são propagados; em caso de erro, as entradas continuam no buffer.
+        """
+        if not self._entries:
+            return 0
+        if cursor is not None:
+            self._insert(cursor)
+        else:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    self._insert(cur)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+        written = len(self._entries)
+        self._entries = []
+        return written
+
+    def _insert(self, cursor):
+        execute_values(cursor, """
+            INSERT INTO notification_history (notification_id, action_type, performed_by, action_timestamp, details)
+            VALUES %s
+        """, self._entries, page_size=len(self._entries))
@@ -0,0 +1,245 @@
+# intake.py
+
+# Endpoint público de recebimento de notificações (o mesmo conteúdo do formulário "Nova Notificação"),
+# pensado para picos de centenas de relatos por minuto, como nos simulados de incidentes.
+# A requisição é validada contra FORM_DATA, colocada numa fila em memória e confirmada na hora (202).
+# Os tamanhos máximos seguem as colunas do banco, e textos com o caractere NUL são recusados (422): um
+# relato confirmado com 202 precisa caber nas colunas.
+# Uma tarefa em segundo plano esvazia a fila em lotes: cada lote é uma única instrução (execute_values), um
+# INSERT de várias linhas em notifications que também cria as primeiras entradas de notification_history.
+# Se o banco estiver indisponível (erro de conexão), o lote é mantido e reenviado; se o lote for recusado
+# por um dado (DataError, IntegrityError ou qualquer outro erro), ele é regravado relato a relato e os que
+# falharem sozinhos são registrados no log (logger 'intake', com o conteúdo do relato) e descartados.
+# Com a fila cheia, o endpoint responde 503.
+# Anexos continuam sendo enviados pelo formulário do Streamlit.
+#
+# Execução: uvicorn intake:app --host 0.0.0.0 --port 8001
+
+import asyncio
+import json
+import logging
+from datetime import date as dt_date_class, datetime, time as dt_time_class
+from typing import List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+
+from notificasanta import DB_CONFIG, FORM_DATA
+
+QUEUE_MAX_SIZE = 5000
+BATCH_SIZE = 200
+BATCH_WAIT_SECONDS = 0.2  # Tempo máximo esperando o lote encher depois do primeiro item
+RETRY_BACKOFF_SECONDS = (1, 2, 5, 10, 30)
+# Erros de conexão: o mesmo lote é reenviado depois de um intervalo
+TRANSIENT_DB_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+logger = logging.getLogger('intake')
+
+app = FastAPI(title="NotificaSanta - Recebimento de Notificações", version="1.0")
+_queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+
+
+# max_length: tamanho das colunas VARCHAR em notifications
+class IntakeNotification(BaseModel):
+    title: str = Field(max_length=500)
+    description: str
+    location: str = Field(max_length=255)
+    occurrence_date: dt_date_class
+    occurrence_time: Optional[dt_time_class] = None
+    reporting_department: str = Field(max_length=255)
+    reporting_department_complement: str = Field('', max_length=255)
+    notified_department: str = Field(max_length=255)
+    notified_department_complement: str = Field('', max_length=255)
+    event_shift: str = Field(max_length=50)
+    immediate_actions_taken: bool
+    immediate_action_description: str = ''
+    patient_involved: bool
+    patient_id: str = Field('', max_length=255)
+    patient_outcome_obito: Optional[bool] = None
+    additional_notes: str = ''
+
+
+def validate_intake(notification: IntakeNotification) -> List[str]:
+    """Mesmas regras do envio final do formulário, com os valores permitidos de FORM_DATA."""
+    errors = []
+    # O PostgreSQL não aceita o caractere NUL em textos
+    for field_name, value in notification:
+        if isinstance(value, str) and '\x00' in value:
+            errors.append(f'Campo {field_name} contém caracteres inválidos.')
+    if not notification.title.strip():
+        errors.append('Título da Notificação é obrigatório.')
+    if not notification.description.strip():
+        errors.append('Descrição Detalhada é obrigatória.')
+    if not notification.location.strip():
+        errors.append('Local do Evento é obrigatório.')
+    if notification.reporting_department not in FORM_DATA.SETORES:
+        errors.append('Setor Notificante inválido.')
+    if notification.notified_department not in FORM_DATA.SETORES:
+        errors.append('Setor Notificado inválido.')
+    if notification.event_shift not in FORM_DATA.turnos:
+        errors.append('Turno do Evento inválido.')
+    if notification.immediate_actions_taken and not notification.immediate_action_description.strip():
+        errors.append('Descrição das ações imediatas é obrigatória quando há ações imediatas.')
+    if notification.patient_involved:
+        if not notification.patient_id.strip():
+            errors.append('Número do Atendimento/Prontuário é obrigatório quando paciente é afetado.')
+        if notification.patient_outcome_obito is None:
+            errors.append('Evolução para óbito é obrigatório quando paciente é afetado.')
+    return errors
+
+
+def _notification_row(notification: IntakeNotification, received_at: datetime) -> Tuple:
+    return (
+        notification.title.strip(),
+        notification.description.strip(),
+        notification.location.strip(),
+        notification.occurrence_date,
+        notification.occurrence_time,
+        notification.reporting_department,
+        notification.reporting_department_complement.strip(),
+        notification.notified_department,
+        notification.notified_department_complement.strip(),
+        notification.event_shift,
+        notification.immediate_actions_taken,
+        notification.immediate_action_description.strip() if notification.immediate_actions_taken else None,
+        notification.patient_involved,
+        notification.patient_id.strip() if notification.patient_involved else None,
+        notification.patient_outcome_obito if notification.patient_involved else None,
+        notification.additional_notes.strip(),
+        "pendente_classificacao",
+        received_at,
+    )
+
+
+# Lote inteiro numa instrução: a entrada de histórico de cada relato é montada a partir do que o próprio
+# INSERT devolve (id, título e created_at), então a ordem das linhas do RETURNING não importa
+INSERT_NOTIFICATIONS_SQL = """
+    WITH inserted AS (
+        INSERT INTO notifications (
+            title, description, location, occurrence_date, occurrence_time,
+            reporting_department, reporting_department_complement, notified_department,
+            notified_department_complement, event_shift, immediate_actions_taken,
+            immediate_action_description, patient_involved, patient_id, patient_outcome_obito,
+            additional_notes, status, created_at
+        ) VALUES %s
+        RETURNING id, title, created_at
+    )
+    INSERT INTO notification_history (notification_id, action_type, performed_by, action_timestamp, details)
+    SELECT id, 'Notificação criada', 'Sistema (Formulário Público)', created_at,
+           'Notificação enviada para classificação. Título: '
+           || CASE WHEN length(title) > 100 THEN left(title, 100) || '...' ELSE title END
+    FROM inserted
+    RETURNING notification_id
+"""
+
+
+def insert_batch(batch: List[Tuple[IntakeNotification, datetime]]) -> List[int]:
+    """Grava um lote de notificações e suas entradas iniciais de histórico com uma única instrução."""
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        with conn.cursor() as cur:
+            # page_size do tamanho do lote: uma só ida ao banco
+            rows = execute_values(cur, INSERT_NOTIFICATIONS_SQL,
+                                  [_notification_row(notification, received_at) for notification, received_at in batch],
+                                  page_size=len(batch), fetch=True)
+        notification_ids = [row[0] for row in rows]
+        conn.commit()
+        return notification_ids
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+async def _insert_with_retry(batch: List[Tuple[IntakeNotification, datetime]]):
+    """Grava o lote, reenviando enquanto o erro for de conexão; os demais erros são propagados."""
+    attempt = 0
+    while True:
+        try:
+            await asyncio.to_thread(insert_batch, batch)
+            return
+        except TRANSIENT_DB_ERRORS:
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS[min(attempt, len(RETRY_BACKOFF_SECONDS) - 1)])
+            attempt += 1
+
+
+def _dead_letter(notification: IntakeNotification, received_at: datetime, error: BaseException):
+    logger.error("Notificação recebida em %s descartada (%s: %s): %s", received_at.isoformat(),
+                 type(error).__name__, error, json.dumps(notification.dict(), default=str, ensure_ascii=False))
+
+
+async def _write_batch(batch: List[Tuple[IntakeNotification, datetime]]):
+    """
+    Grava o lote; se ele for recusado por algum relato, grava um a um (só para isolar o relato com
+    problema) e descarta os que falharem.
+    """
+    try:
+        await _insert_with_retry(batch)
+        return
+    except Exception as e:
+        if len(batch) == 1:
+            _dead_letter(batch[0][0], batch[0][1], e)
+            return
+    for item in batch:
+        try:
+            await _insert_with_retry([item])
+        except Exception as e:
+            _dead_letter(item[0], item[1], e)
+
+
+async def _batch_writer():
+    """Esvazia a fila em lotes de até BATCH_SIZE. Nenhum erro de gravação encerra a tarefa."""
+    while True:
+        batch = [await _queue.get()]
+        try:
+            deadline = asyncio.get_running_loop().time() + BATCH_WAIT_SECONDS
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            await _write_batch(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Erro inesperado ao gravar um lote de %d notificação(ões)", len(batch))
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+@app.on_event("startup")
+async def _start_writer():
+    global _queue, _writer_task
+    _queue = asyncio.Queue(maxsize=QUEUE_MAX_SIZE)
+    _writer_task = asyncio.create_task(_batch_writer())
+
+
+@app.on_event("shutdown")
+async def _drain_queue():
+    # Dá uma chance de gravar o que já foi confirmado antes de encerrar
+    try:
+        await asyncio.wait_for(_queue.join(), timeout=30)
+    except asyncio.TimeoutError:
+        pass
+    _writer_task.cancel()
+
+
+@app.post("/intake/notifications", status_code=202)
+async def receive_notification(notification: IntakeNotification):
+    """Valida e enfileira uma notificação; a gravação no banco acontece em lote logo em seguida."""
+    errors = validate_intake(notification)
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    try:
+        _queue.put_nowait((notification, datetime.now().astimezone()))
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Muitas notificações sendo recebidas. Tente novamente em instantes.")
+    return {'status': 'recebida'}
@@ -0,0 +1,182 @@
+# models.py
+
+# Registros tipados e compactos para os dados lidos do banco de dados.
+# Cada classe usa __slots__ (sem __dict__ por instância), o que reduz bastante a memória
+# ocupada por notificação em relação a um dicionário com ~30 chaves.
+# Os registros continuam aceitando o acesso no estilo dicionário (.get(), [] e 'in'),
+# para que o código existente das páginas funcione sem alterações durante a transição.
+# Datas e horas são mantidas como objetos nativos (datetime/date/time) do psycopg2;
+# a conversão para texto acontece apenas na exibição (ver format_datetime_display).
+
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional
+
+
+class _DictCompatRecord:
+    """Acesso compatível com dicionário para os registros com __slots__."""
+    __slots__ = ()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.__slots__:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.__slots__
+
+    def keys(self) -> List[str]:
+        return list(self.__slots__)
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.__slots__]
+
+    def to_dict(self) -> Dict:
+        """Converte o registro (e os registros filhos) em dicionários simples, p. ex. para JSON."""
+        result = {}
+        for key in self.__slots__:
+            value = getattr(self, key)
+            if isinstance(value, list):
+                value = [v.to_dict() if isinstance(v, _DictCompatRecord) else v for v in value]
+            elif isinstance(value, _DictCompatRecord):
+                value = value.to_dict()
+            result[key] = value
+        return result
+
+
+@dataclass
+class Attachment(_DictCompatRecord):
+    """Anexo de uma notificação (tabela notification_attachments)."""
+    __slots__ = ('unique_name', 'original_name', 'status')
+    unique_name: str
+    original_name: str
+    status: str  # 'pending', 'ready' ou 'failed' (ver attachment_pipeline)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'Attachment':
+        # Consultas antigas não trazem o status: anexos gravados de forma síncrona estão prontos
+        return cls(row[0], row[1], row[2] if len(row) > 2 else 'ready')
+
+
+@dataclass
+class HistoryEntry(_DictCompatRecord):
+    """Entrada do histórico de uma notificação (tabela notification_history)."""
+    __slots__ = ('action', 'user', 'timestamp', 'details')
+    action: str
+    user: Optional[str]
+    timestamp: Optional[datetime]
+    details: Optional[str]
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'HistoryEntry':
+        return cls(row[0], row[1], row[2], row[3])
+
+
+@dataclass
+class Action(_DictCompatRecord):
+    """Ação registrada por um executor (tabela notification_actions)."""
+    __slots__ = ('executor_id', 'executor_name', 'description', 'timestamp', 'final_action_by_executor',
+                 'evidence_description', 'evidence_attachments')
+    executor_id: Optional[int]
+    executor_name: Optional[str]
+    description: str
+    timestamp: Optional[datetime]
+    final_action_by_executor: bool
+    evidence_description: Optional[str]
+    evidence_attachments: Optional[List[Dict]]  # Já é JSONB, então vem como objeto Python (list/dict)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'Action':
+        return cls(*row[:7])
+
+
+@dataclass
+class NotificationSummary(_DictCompatRecord):
+    """Projeção resumida de uma notificação, usada pelas listas (ver load_notification_summaries)."""
+    __slots__ = ('id', 'title', 'location', 'status', 'created_at', 'occurrence_date',
+                 'reporting_department', 'notified_department', 'executors', 'approver',
+                 'classification', 'conclusion', 'approval', 'rejection_classification', 'rejection_approval')
+    id: int
+    title: str
+    location: Optional[str]
+    status: str
+    created_at: Optional[datetime]
+    occurrence_date: Optional[date]
+    reporting_department: Optional[str]
+    notified_department: Optional[str]
+    executors: Optional[List[int]]
+    approver: Optional[int]
+    classification: Optional[Dict]
+    conclusion: Optional[Dict]
+    approval: Optional[Dict]
+    rejection_classification: Optional[Dict]
+    rejection_approval: Optional[Dict]
+
+    @classmethod
+    def from_row(cls, column_names: List[str], row: tuple) -> 'NotificationSummary':
+        data = dict(zip(column_names, row))
+        return cls(**{key: data.get(key) for key in cls.__slots__})
+
+
+@dataclass
+class Notification(_DictCompatRecord):
+    """Notificação completa, com os campos JSONB e as listas das tabelas relacionadas."""
+    __slots__ = ('id', 'title', 'description', 'location', 'occurrence_date', 'occurrence_time',
+                 'reporting_department', 'reporting_department_complement', 'notified_department',
+                 'notified_department_complement', 'event_shift', 'immediate_actions_taken',
+                 'immediate_action_description', 'patient_involved', 'patient_id', 'patient_outcome_obito',
+                 'additional_notes', 'status', 'created_at',
+                 'classification', 'rejection_classification', 'review_execution', 'approval',
+                 'rejection_approval', 'rejection_execution_review', 'conclusion',
+                 'executors', 'approver', 'row_version', 'attachments', 'history', 'actions')
+    id: int
+    title: str
+    description: str
+    location: Optional[str]
+    occurrence_date: Optional[date]
+    occurrence_time: Optional[time]
+    reporting_department: Optional[str]
+    reporting_department_complement: Optional[str]
+    notified_department: Optional[str]
+    notified_department_complement: Optional[str]
+    event_shift: Optional[str]
+    immediate_actions_taken: Optional[bool]
+    immediate_action_description: Optional[str]
+    patient_involved: Optional[bool]
+    patient_id: Optional[str]
+    patient_outcome_obito: Optional[bool]
+    additional_notes: Optional[str]
+    status: str
+    created_at: Optional[datetime]
+    classification: Optional[Dict]
+    rejection_classification: Optional[Dict]
+    review_execution: Optional[Dict]
+    approval: Optional[Dict]
+    rejection_approval: Optional[Dict]
+    rejection_execution_review: Optional[Dict]
+    conclusion: Optional[Dict]
+    executors: Optional[List[int]]
+    approver: Optional[int]
+    row_version: Optional[int]  # Incrementado pelo banco a cada alteração (ver detail_render_cache)
+    attachments: List[Attachment]
+    history: List[HistoryEntry]
+    actions: List[Action]
+
+    @classmethod
+    def from_row(cls, column_names: List[str], row: tuple) -> 'Notification':
+        """Monta a notificação a partir de uma linha do cursor; as listas relacionadas começam vazias."""
+        data = dict(zip(column_names, row))
+        data['attachments'] = []
+        data['history'] = []
+        data['actions'] = []
+        return cls(**{key: data.get(key) for key in cls.__slots__})
@@ -2,16 +2,38 @@ import streamlit as st
 import json
 import hashlib
 import os
-from datetime import datetime, date as dt_date_class, time as dt_time_class, timedelta
-from typing import Dict, List, Optional, Any
-import uuid
+import tempfile
+from functools import lru_cache
+from datetime import datetime, date as dt_date_class, time as dt_time_class, timedelta, timezone
+from typing import Dict, List, Optional, Any, Tuple
 import pandas as pd
-import time as time_module
 import psycopg2
 from psycopg2 import sql  # Importa sql para usar na construção de queries dinâmicas
 from dotenv import load_dotenv
 from streamlit import fragment as st_fragment  # Mantido para compatibilidade com o código completo
 
+from models import Notification, NotificationSummary, Attachment, HistoryEntry, Action
+from change_feed import NotificationIndex, CHANGE_FEED_DDL
+from history_writer import HistoryWriter
+from notification_executors import ensure_executor_schema, execution_progress, executor_has_concluded
+from executor_workload import executor_workload, suggest_executors
+from stage_timings import STAGE_TIMINGS_DDL, STAGE_LABELS, backfill_stage_timings, lead_time_by_stage
+from single_flight import SingleFlight, make_key
+from result_cache import ResultCache, MemoryBackend, DiskBackend
+from stale_snapshot import StaleWhileRevalidate
+from approval_worklist import (add_approval_columns, complete_approval_columns, pending_approval_ids,
+                               closed_approval_ids)
+from classification_queue import (CLASSIFICATION_QUEUE_DDL, CLAIM_LEASE_MINUTES, claim_next_notification,
+                                  queue_counts, release_claim, renew_claim)
+from notification_archive import ensure_archive_schema, archive_closed_notifications, DEFAULT_ARCHIVE_AFTER_MONTHS
+from attachment_pipeline import (AttachmentIngestionPipeline, ATTACHMENT_PIPELINE_DDL, ATTACHMENT_STATUS_FAILED,
+                                 ATTACHMENT_STATUS_PENDING,
+                                 build_unique_name, open_attachment, wait_for_ingestion)
+from attachment_previews import PreviewCache, preview_kind
+from detail_render_cache import DetailRenderCache, ROW_VERSION_DDL
+from notification_export import EXPORT_FORMATS, export_filename, export_notifications
+from bi_export import BI_EXPORT_DIR, export_to_parquet, load_watermark
+
 DB_CONFIG = {
     "host": os.getenv("DB_HOST"),
     "database": os.getenv("DB_NAME"),
@@ -40,262 +62,21 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# CORREÇÃO DO ERRO 1.2: Sintaxe corrigida no bloco CSS dentro de st.markdown
-st.markdown(r"""
-<style>
-    /* Esconde botões e decorações padrão do Streamlit */
-    button[data-testid="stDeployButton"],
-    .stDeployButton,
-    footer,
-    #stDecoration,
-    .stAppDeployButton {
-        display: none !important;
-    }
-
-    /* Ajuste de margem superior para o container principal do Streamlit */
-    .reportview-container {
-        margin-top: -2em;
-    }
-
-    /* Permite que a sidebar seja aberta (linha originalmente comentada, mantida para contexto) */
-    /* .sidebar-hint {
-        /* display: none; */
-    /* } */
-
-    /* Garante que a Sidebar fique ACIMA de outros elementos fixos, se houver */
-    div[data-testid="stSidebar"] {
-        z-index: 9999 !important; /* Prioridade de empilhamento muito alta */
-    }
-    /* Linhas duplicadas e chaves } extras/malposicionadas removidas daqui e de blocos similares */
-
-    /* Adjust Streamlit's default margins for sidebar content */
-    /* This targets the internal container of the sidebar */
-    [data-testid="stSidebarContent"] {
-        padding-top: 10px; /* Reduced from default to move content higher */
-    }
-
-    /* Logo - Reduced size and moved up */
-    div[data-testid="stSidebar"] img {
-        transform: scale(0.6); /* Reduce size by 20% */
-        transform-origin: top center; /* Scale from the top center */
-        margin-top: -80px; /* Pull the image up */
-        margin-bottom: -20px; /* Reduce space below image */
-    }
-
-    /* Estilo do cabeçalho principal da aplicação */
-    .main-header {
-        text-align: center;
-        color: #2E86AB;
-        margin-bottom: 30px;
-    }
-
-    /* Novo Estilo para o Título Principal da Sidebar */
-    /* Usamos [data-testid="stSidebarContent"] para aumentar a especificidade e garantir a aplicação */
-    [data-testid="stSidebarContent"] .sidebar-main-title {
-        text-align: center !important; /* Centraliza o texto */
-        color: #00008B !important; /* Cor azul escuro para o título principal */
-        font-size: 1.76em !important; /* 2.2em * 0.8 = 1.76em */
-        font-weight: 700 !important; /* Negrito forte para o título */
-        text-transform: uppercase !important; /* Transforma todo o texto em maiúsculas */
-        letter-spacing: 2px !important; /* Aumenta o espaçamento entre as letras para um visual "minimalista" e "estiloso" */
-        text-shadow: 1px 1px 2px rgba(0, 0, 0, 0.2) !important; /* Sombra mais suave para profundidade */
-        margin-top: -30px !important; /* Move título principal para cima */
-    }
-
-    /* Novo Estilo para o Subtítulo da Sidebar */
-    /* Usamos [data-testid="stSidebarContent"] para aumentar a especificidade e garantir a aplicação */
-    [data-testid="stSidebarContent"] .sidebar-subtitle {
-        text-align: center !important; /* Centraliza o texto */
-        color: #333 !important; /* Cor mais suave para o subtítulo */
-        font-size: 0.72em !important; /* 0.9em * 0.8 = 0.72em */
-        font-weight: 400 !important; /* Peso de fonte médio */
-        text-transform: uppercase !important; /* Transforma todo o texto em maiúsculas, mantendo a consistência */
-        letter-spacing: 1.5px !important; /* Espaçamento entre letras para alinhamento visual */
-        margin-top: -30px !important; /* Pull closer to main title */
-        margin-bottom: 5px !important; /* Reduce margin below subtitle */
-    }
-
-    /* Estilo geral para cartões de notificação */
-    .notification-card {
-        border: 1px solid #ddd;
-        border-radius: 10px;
-        padding: 15px;
-        margin: 10px 0;
-        background-color: #f9f9f9;
-        color: #2E86AB; /* Cor do texto padrão para o cartão */
-    }
-
-    /* Cores e destaque para diferentes status de notificação */
-    .status-pendente_classificacao { color: #ff9800; font-weight: bold; } /* Laranja */
-    .status-classificada { color: #2196f3; font-weight: bold; } /* Azul */
-    .status-em_execucao { color: #9c27b0; font-weight: bold; } /* Roxo */
-    .status-aguardando_classificador { color: #ff5722; font-weight: bold; } /* Laranja avermelhado (Usado para Revisão Rejeitada) */
-    .status-revisao_classificador_execucao { color: #8BC34A; font-weight: bold; } /* Verde Lima - Novo Status */
-    .status-aguardando_aprovacao { color: #ffc107; font-weight: bold; } /* Amarelo */
-    .status-aprovada { color: #4caf50; font-weight: bold; } /* Verde */
-    .status-concluida { color: #4caf50; font-weight: bold; } /* Verde (mesmo que aprovada para simplificar) */
-    .status-rejeitada { color: #f44336; font-weight: bold; } /* Vermelho (Usado para Rejeição Inicial) */
-    .status-reprovada { color: #f44336; font-weight: bold; } /* Vermelho (Usado para Rejeição de Aprovação)*/
-    /* Estilo para o conteúdo da barra lateral */
-    .sidebar .sidebar-content {
-        background-color: #f0f2f6; /* Cinza claro */
-    }
-
-    /* Estilo para a caixa de informações do usuário na sidebar */
-    .user-info {
-        background-color: #e8f4fd; /* Azul claro */
-        padding: 10px;
-        border-radius: 5px;
-        margin-bottom: 20px;
-    }
+# O CSS fica em static/notificasanta.css, lido do disco uma vez por processo (st.cache_resource) e
+# injetado num bloco <style>. Um <link> para app/static/ não serve: o servidor de arquivos estáticos do
+# Streamlit envia .css como text/plain (com X-Content-Type-Options: nosniff) e o navegador ignora o estilo.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STYLESHEET_FILE = "notificasanta.css"
 
-    /* Estilo para seções de formulário */
-    .form-section {
-        background-color: #f8f9fa; /* Cinza bem claro */
-        padding: 15px;
-        border-radius: 8px;
-        margin: 10px 0;
-        border-left: 4px solid #2E86AB; /* Barra lateral azul */
-    }
 
-    /* Estilo para campos condicionais em formulários (ex: detalhes de ação imediata) */
-    .conditional-field {
-        background-color: #fff3cd; /* Amarelo claro */
-        padding: 10px;
-        border-radius: 5px;
-        border-left: 3px solid #ffc107; /* Barra lateral amarela */
-        margin: 10px 0;
-    }
+@st.cache_resource
+def stylesheet_style_tag(filename: str) -> str:
+    """Conteúdo de uma folha de estilos de STATIC_DIR num bloco <style>, lido uma vez por processo."""
+    with open(os.path.join(STATIC_DIR, filename), encoding='utf-8') as f:
+        return f"<style>\n{f.read()}</style>"
 
-    /* Estilo para campos obrigatórios */
-    .required-field {
-        color: #dc3545; /* Vermelho */
-        font-weight: bold;
-    }
 
-    /* Cores específicas para botões "Sim" e "Não" selecionados */
-    div.stButton > button[data-testid='stButton'][data-key*='_sim_step'][data-selected='true'] {
-        border-color: #4caf50; /* Verde */
-        color: #4caf50;
-    }
-    div.stButton > button[data-testid='stButton'][data-key*='_nao_step'][data-selected='true'] {
-        border-color: #f44336; /* Vermelho */
-        color: #f44336;
-    }
-
-    /* Negrito geral para labels dentro de blocos horizontais do Streamlit */
-    div[data-testid="stHorizontalBlock"] div[data-testid^="st"] label p {
-        font-weight: bold;
-    }
-
-    /* Estilo para cartões de métricas no dashboard */
-    .metric-card {
-        background-color: #ffffff;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 10px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        text-align: center;
-    }
-
-    .metric-card h4 {
-        margin-top: 0;
-        color: #333;
-    }
-
-    .metric-card p {
-        font-size: 1.8em;
-        font-weight: bold;
-        color: #2E86AB;
-        margin-bottom: 0;
-    }
-
-    /* Estilo para o rodapé da sidebar */
-    .sidebar-footer {
-        text-align: center;
-        margin-top: 20px; /* Adiciona um espaço acima do rodapé */
-        padding: 10px;
-        color: #888;
-        font-size: 0.75em;
-        border-top: 1px solid #eee; /* Linha divisória sutil */
-    }
-
-    /* Remove padding do container principal, pois o rodapé fixo foi removido */
-    div[data-testid="stAppViewContainer"] {
-        padding-bottom: 0px; /* Não é mais necessário padding na parte inferior */
-    }
-
-    /* Estilos para o fundo do cartão de notificação com base no status do prazo */
-    .notification-card.card-prazo-dentro {
-        background-color: #e6ffe6; /* Verde claro para "No Prazo" e "Prazo Próximo" */
-        border: 1px solid #4CAF50; /* Borda verde */
-    }
-
-    .notification-card.card-prazo-fora {
-        background-color: #ffe6e6; /* Vermelho claro para "Atrasada" */
-        border: 1px solid #F44336; /* Borda vermelha */
-    }
-
-    /* Estilos para status de prazo */
-    .deadline-ontrack { color: #4CAF50; font-weight: bold; } /* Verde */
-    .deadline-duesoon { color: #FFC107; font-weight: bold; } /* Amarelo */
-
-    /* Estilo para entrada de ação individual */
-    .action-entry-card {
-        border: 1px solid #cceeff; /* Azul claro */
-        border-left: 5px solid #2E86AB; /* Azul mais escuro para destaque */
-        border-radius: 8px;
-        padding: 12px;
-        margin-top: 10px;
-        margin-bottom: 10px;
-        background-color: #f0f8ff; /* Fundo azul muito claro */
-        box-shadow: 0 2px 5px rgba(0,0,0,0.05); /* Sombra suave */
-    }
-
-    .action-entry-card strong {
-        color: #2E86AB;
-    }
-
-    .action-entry-card em {
-        color: #555;
-    }
-
-    /* Estilo para "minhas" ações na execução */
-    .my-action-entry-card {
-        border: 1px solid #d4edda; /* Verde claro */
-        border-left: 5px solid #28a745; /* Verde para destaque */
-        border-radius: 8px;
-        padding: 12px;
-        margin-top: 10px;
-        margin-bottom: 10px;
-        background-color: #eaf7ed; /* Fundo verde muito claro */
-        box-shadow: 0 2px 5px rgba(0,0,0,0.05); /* Sombra suave */
-    }
-
-    .my-action-entry-card strong {
-        color: #28a745;
-    }
-
-    /* Estilo para a seção de evidências dentro de uma ação */
-    .evidence-section {
-        background-color: #ffffff; /* Fundo branco */
-        border-top: 1px dashed #cccccc; /* Linha tracejada superior */
-        margin-top: 10px;
-        padding-top: 10px;
-    }
-
-    .evidence-section h6 { /* Adicionado para subtítulos dentro das evidências */
-        color: #666;
-        margin-bottom: 5px;
-    }
-
-    options = {
-        'show_menu': False }
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}    
-
-</style>
-""", unsafe_allow_html=True)
+st.markdown(stylesheet_style_tag(STYLESHEET_FILE), unsafe_allow_html=True)
 
 # Mapeamento de prazos para conclusão da notificação
 DEADLINE_DAYS_MAPPING = {
@@ -469,6 +250,16 @@ class FORM_DATA:
 # --- Diretórios de Dados e Arquivos (para anexos) ---
 DATA_DIR = "data"
 ATTACHMENTS_DIR = os.path.join(DATA_DIR, "attachments")
+PREVIEWS_DIR = os.path.join(DATA_DIR, "previews")  # Miniaturas dos anexos (cache com limite de tamanho)
+# Arquivo SQLite do cache de resultados, para compartilhá-lo entre processos; sem ele, o cache fica em memória
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH")
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Validade dos agregados em cache. As chaves do cache não levam a versão do índice (contador deste processo,
+# que colidiria entre processos no cache em disco); escritas do app invalidam pelas tags, e as feitas
+# fora dele (API, intake) aparecem no máximo depois desse tempo
+ANALYTICS_CACHE_TTL_SECONDS = 60
+# Idade a partir da qual o dashboard dispara a atualização em segundo plano (continua mostrando a anterior)
+DASHBOARD_MAX_AGE_SECONDS = 60
 
 
 # --- Funções de Persistência e Banco de Dados ---
@@ -601,6 +392,25 @@ def init_database():
             CREATE INDEX IF NOT EXISTS idx_actions_executor_id ON notification_actions (executor_id);
             CREATE INDEX IF NOT EXISTS idx_actions_timestamp ON notification_actions (action_timestamp);
         """)
+        # Triggers do feed de alterações (pg_notify 'notif_changes') usados pelo índice em memória
+        cur.execute(CHANGE_FEED_DDL)
+        # Colunas de status/hash dos anexos gravados pelo pipeline de ingestão
+        cur.execute(ATTACHMENT_PIPELINE_DDL)
+        # row_version da notificação, usado como chave do cache de renderização dos detalhes
+        cur.execute(ROW_VERSION_DDL)
+        # Colunas de reserva da fila de classificação inicial
+        cur.execute(CLASSIFICATION_QUEUE_DDL)
+        # Executores por notificação (tabela normalizada mantida por triggers a partir de executors)
+        ensure_executor_schema(cur)
+        # Tempo por etapa do fluxo, usado nos indicadores de lead time
+        cur.execute(STAGE_TIMINGS_DDL)
+        # classified_at e approved_by/rejected_by, usados pela página de aprovação
+        approval_columns_added = add_approval_columns(cur)
+        # Tabelas de arquivo e views *_all (depois de todas as alterações de colunas acima)
+        ensure_archive_schema(cur)
+        # Na primeira vez, preenche o tempo por etapa a partir do histórico (depois do arquivo existir)
+        backfill_stage_timings(cur)
+        complete_approval_columns(cur, backfill=approval_columns_added)
 
         # Adiciona usuário admin padrão se não existir
         cur.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
@@ -689,6 +499,7 @@ def create_user(data: Dict) -> Optional[Dict]:
         new_user_raw = cur.fetchone()
         conn.commit()
         cur.close()
+        get_result_cache().invalidate('users')
 
         if new_user_raw:
             return {
@@ -745,6 +556,7 @@ def update_user(user_id: int, updates: Dict) -> Optional[Dict]:
         updated_user_raw = cur.fetchone()
         conn.commit()
         cur.close()
+        get_result_cache().invalidate('users', f'user:{user_id}')
 
         if updated_user_raw:
             return {
@@ -768,8 +580,21 @@ def update_user(user_id: int, updates: Dict) -> Optional[Dict]:
             conn.close()
 
 
-def load_notifications() -> List[Dict]:
-    """Carrega dados de notificação do banco de dados, incluindo dados relacionados."""
+def load_notifications() -> List[Notification]:
+    """
+    Carrega dados de notificação do banco de dados, incluindo dados relacionados.
+    Sessões que pedem a carga ao mesmo tempo compartilham uma única consulta (get_single_flight).
+    """
+    try:
+        return get_single_flight().do(make_key('load_notifications', watermark=_data_watermark()),
+                                      _query_notifications)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar notificações: {e}")
+        return []
+
+
+def _query_notifications() -> List[Notification]:
+    """Consulta completa de load_notifications. Erros de banco são propagados ao chamador."""
     conn = None
     try:
         conn = get_db_connection()
@@ -784,7 +609,7 @@ def load_notifications() -> List[Dict]:
                 classification, rejection_classification, review_execution, approval,
                 rejection_approval, rejection_execution_review, conclusion,
                 executors, approver
-            FROM notifications ORDER BY created_at DESC
+            FROM notifications_all ORDER BY created_at DESC
         """)
         notifications_raw = cur.fetchall()
 
@@ -792,14 +617,7 @@ def load_notifications() -> List[Dict]:
         column_names = [desc[0] for desc in cur.description]
         notifications = []
         for row in notifications_raw:
-            notification = dict(zip(column_names, row))
-            # Ajustar tipos de dados que não são serializáveis para JSON (datetime, date, time)
-            if notification.get('occurrence_date'):
-                notification['occurrence_date'] = notification['occurrence_date'].isoformat()
-            if notification.get('occurrence_time'):
-                notification['occurrence_time'] = notification['occurrence_time'].isoformat()
-            if notification.get('created_at'):
-                notification['created_at'] = notification['created_at'].isoformat()
+            notification = Notification.from_row(column_names, row)
 
             # Buscar dados de outras tabelas para compor a notificação completa
             notification['attachments'] = get_notification_attachments(notification['id'], conn, cur)
@@ -809,9 +627,366 @@ def load_notifications() -> List[Dict]:
             notifications.append(notification)
         cur.close()
         return notifications
+    finally:
+        if conn:
+            conn.close()
+
+
+def _summary_query(table: str, where: sql.Composable,
+                   order_by: sql.Composable = sql.SQL("created_at DESC")) -> sql.Composed:
+    """
+    Projeção resumida das notificações usada pelas listas (cards, filtros e contadores).
+    Descrição, observações, os JSONB completos e as tabelas relacionadas (anexos, histórico e ações)
+    não são trazidos aqui; use load_notification_detail quando a notificação for aberta.
+    Dos campos JSONB vêm apenas as chaves exibidas nos cards e usadas nos filtros.
+    """
+    return sql.SQL("""
+        SELECT
+            id, title, location, status, created_at, occurrence_date,
+            reporting_department, notified_department, executors, approver,
+            CASE WHEN classification IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                'prioridade', classification->'prioridade',
+                'deadline_date', classification->'deadline_date',
+                'nnc', classification->'nnc',
+                'event_type_main', classification->'event_type_main',
+                'classification_timestamp', classification->'classification_timestamp'
+            )) END AS classification,
+            CASE WHEN conclusion IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                'concluded_by', conclusion->'concluded_by',
+                'timestamp', conclusion->'timestamp'
+            )) END AS conclusion,
+            CASE WHEN approval IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                'approved_by', approval->'approved_by'
+            )) END AS approval,
+            CASE WHEN rejection_classification IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                'classified_by', rejection_classification->'classified_by'
+            )) END AS rejection_classification,
+            CASE WHEN rejection_approval IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                'rejected_by', rejection_approval->'rejected_by'
+            )) END AS rejection_approval
+        FROM {table} {where} ORDER BY {order_by}
+    """).format(table=sql.Identifier(table), where=where, order_by=order_by)
+
+
+def _fetch_notification_summaries(notification_ids: Optional[List[int]] = None) -> List[NotificationSummary]:
+    """
+    Resumos de todas as notificações, inclusive as arquivadas (índice em memória: dashboard, encerradas
+    e busca). Com notification_ids, busca apenas essas notificações. Erros de banco são propagados ao chamador.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        id_filter = sql.SQL("WHERE id = ANY(%s)") if notification_ids is not None else sql.SQL("")
+        cur.execute(_summary_query('notifications_all', id_filter),
+                    (notification_ids,) if notification_ids is not None else None)
+        column_names = [desc[0] for desc in cur.description]
+        notifications = [NotificationSummary.from_row(column_names, row) for row in cur.fetchall()]
+        cur.close()
+        return notifications
+    finally:
+        if conn:
+            conn.close()
+
+
+def load_worklist_summaries(statuses: List[str], executor_id: Optional[int] = None) -> List[NotificationSummary]:
+    """
+    Resumos dos itens abertos de uma fila de trabalho, lidos só da tabela quente (notifications):
+    os status das filas nunca chegam ao arquivo. Com executor_id, só as atribuídas a esse executor.
+    """
+    conditions = [sql.SQL("status = ANY(%s)")]
+    params: List[Any] = [list(statuses)]
+    if executor_id is not None:
+        conditions.append(sql.SQL("id IN (SELECT notification_id FROM notification_executors WHERE executor_id = %s)"))
+        params.append(executor_id)
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            cur.execute(_summary_query('notifications', sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions)),
+                        params)
+            column_names = [desc[0] for desc in cur.description]
+            return [NotificationSummary.from_row(column_names, row) for row in cur.fetchall()]
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar a fila de trabalho: {e}")
+        return []
+    finally:
+        if conn:
+            conn.close()
+
+
+def fetch_summary_page(statuses: Optional[List[str]], before: Optional[Tuple[datetime, int]],
+                       limit: int) -> List[NotificationSummary]:
+    """
+    Página da listagem por cursor (API): até limit resumos, por created_at e id decrescentes, a partir
+    de notifications_all. statuses (vazio = todos) e before = (created_at, id) do último item da página
+    anterior são aplicados no SQL, e o LIMIT desce pelo índice de created_at das tabelas quente e de arquivo.
+    Erros de banco são propagados ao chamador.
+    """
+    conditions = []
+    params: List[Any] = []
+    if statuses:
+        conditions.append(sql.SQL("status = ANY(%s)"))
+        params.append(list(statuses))
+    if before is not None:
+        conditions.append(sql.SQL("(created_at, id) < (%s, %s)"))
+        params.extend(before)
+    where = sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL("")
+    params.append(limit)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(_summary_query('notifications_all', where, sql.SQL("created_at DESC, id DESC"))
+                        + sql.SQL(" LIMIT %s"), params)
+            column_names = [desc[0] for desc in cur.description]
+            return [NotificationSummary.from_row(column_names, row) for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+@st.cache_resource
+def get_notification_index() -> NotificationIndex:
+    """Índice de resumos compartilhado por todas as sessões do processo, atualizado via LISTEN/NOTIFY."""
+    index = NotificationIndex(lambda: psycopg2.connect(**DB_CONFIG), _fetch_notification_summaries)
+    index.start()
+    return index
+
+
+@st.cache_resource
+def get_single_flight() -> SingleFlight:
+    """Agrupador das consultas pesadas idênticas e simultâneas, compartilhado por todas as sessões do processo."""
+    return SingleFlight()
+
+
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    """Cache de resultados invalidado pelas escritas (em memória, ou em disco com RESULT_CACHE_PATH)."""
+    if RESULT_CACHE_PATH:
+        return ResultCache(DiskBackend(RESULT_CACHE_PATH, RESULT_CACHE_MAX_BYTES))
+    return ResultCache(MemoryBackend(RESULT_CACHE_MAX_BYTES))
+
+
+def _data_watermark() -> int:
+    """Versão atual dos dados (índice de resumos já com as alterações pendentes aplicadas)."""
+    index = get_notification_index()
+    index.summaries()
+    return index.version
+
+
+def load_notification_summaries() -> List[NotificationSummary]:
+    """
+    Devolve a projeção resumida de todas as notificações a partir do índice em memória.
+    Apenas as notificações alteradas desde a última leitura são buscadas novamente no banco.
+    """
+    try:
+        return get_notification_index().summaries()
     except psycopg2.Error as e:
         st.error(f"Erro ao carregar notificações: {e}")
         return []
+
+
+def _compute_dashboard_snapshot(index: NotificationIndex, result_cache: ResultCache,
+                                single_flight: SingleFlight) -> Tuple[List[NotificationSummary], pd.DataFrame]:
+    """
+    Resumos das notificações (lista do dashboard) e snapshot analítico, em formato colunar, com apenas
+    as colunas usadas pelos indicadores.
+    Datas vêm como datetime64, status/setores/NNC/tipo principal como categorias e a prioridade
+    como um rank int8 (0 = sem prioridade, 1 = Baixa ... 4 = Crítica, na ordem de FORM_DATA.prioridades).
+    Os campos da classificação são extraídos no próprio SQL, sem montar dicionários em Python.
+    Roda também na thread de atualização em segundo plano, por isso recebe as dependências prontas e
+    não usa st.*; erros de banco são propagados. O DataFrame é compartilhado e não deve ser alterado no lugar.
+    """
+    summaries = index.summaries()
+    frame = result_cache.get_or_compute(
+        make_key('analytics_snapshot'), ('notifications',),
+        lambda: single_flight.do(make_key('analytics_snapshot', watermark=index.version), _query_analytics_snapshot),
+        ttl=ANALYTICS_CACHE_TTL_SECONDS)
+    return summaries, frame
+
+
+@st.cache_resource
+def get_dashboard_snapshot() -> StaleWhileRevalidate:
+    """Última versão dos dados do dashboard, compartilhada pelas sessões e atualizada em segundo plano."""
+    index, result_cache, single_flight = get_notification_index(), get_result_cache(), get_single_flight()
+    return StaleWhileRevalidate(lambda: _compute_dashboard_snapshot(index, result_cache, single_flight),
+                                DASHBOARD_MAX_AGE_SECONDS)
+
+
+def load_dashboard_snapshot(force_refresh: bool = False) -> Optional[tuple]:
+    """
+    (resumos, snapshot analítico, horário dos dados). Devolve na hora a última versão calculada; se ela
+    tiver mais de DASHBOARD_MAX_AGE_SECONDS, a atualização acontece em segundo plano.
+    force_refresh recalcula agora. Retorna None se não houver dados por erro de banco.
+    """
+    dashboard_snapshot = get_dashboard_snapshot()
+    try:
+        if force_refresh:
+            (summaries, frame), computed_at = dashboard_snapshot.refresh()
+        else:
+            (summaries, frame), computed_at = dashboard_snapshot.get()
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar dados para os indicadores: {e}")
+        return None
+    return summaries, frame, computed_at
+
+
+def _query_analytics_snapshot() -> pd.DataFrame:
+    """Consulta do snapshot analítico. Erros de banco são propagados ao chamador."""
+    conn = None
+    try:
+        # Conexão direta (sem st.error): pode rodar na thread de atualização do dashboard
+        conn = psycopg2.connect(**DB_CONFIG)
+        cur = conn.cursor()
+        # created_at::timestamp converte para o fuso da sessão e devolve datetimes sem tzinfo,
+        # que o pandas carrega direto como datetime64[ns]
+        cur.execute("""
+            SELECT
+                id, created_at::timestamp, occurrence_date, status,
+                notified_department, reporting_department,
+                classification->>'nnc', classification->>'event_type_main',
+                COALESCE(array_position(%s::text[], classification->>'prioridade'), 0)
+            FROM notifications_all ORDER BY created_at DESC
+        """, (FORM_DATA.prioridades,))
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        if conn:
+            conn.close()
+    return _analytics_frame(rows)
+
+
+def _analytics_frame(rows: list) -> pd.DataFrame:
+    """Monta o DataFrame tipado do snapshot a partir das linhas da consulta."""
+    columns = ['id', 'created_at', 'occurrence_date', 'status', 'notified_department',
+               'reporting_department', 'nnc', 'event_type_main', 'priority_rank']
+    snapshot = pd.DataFrame.from_records(rows, columns=columns)
+    snapshot['created_at'] = pd.to_datetime(snapshot['created_at'])
+    snapshot['occurrence_date'] = pd.to_datetime(snapshot['occurrence_date'])
+    return snapshot.astype({
+        'id': 'int64',
+        'status': 'category',
+        'notified_department': 'category',
+        'reporting_department': 'category',
+        'nnc': 'category',
+        'event_type_main': 'category',
+        'priority_rank': 'int8',
+    })
+
+
+# Colunas da notificação completa (load_notification_detail / load_notification_details)
+NOTIFICATION_DETAIL_COLUMNS = """
+    id, title, description, location, occurrence_date, occurrence_time,
+    reporting_department, reporting_department_complement, notified_department,
+    notified_department_complement, event_shift, immediate_actions_taken,
+    immediate_action_description, patient_involved, patient_id, patient_outcome_obito,
+    additional_notes, status, created_at,
+    classification, rejection_classification, review_execution, approval,
+    rejection_approval, rejection_execution_review, conclusion,
+    executors, approver, row_version
+"""
+
+# Tabelas relacionadas de várias notificações de uma vez: (consulta com notification_id na 1ª coluna, registro)
+_CHILD_QUERIES = {
+    'attachments': ("SELECT notification_id, unique_name, original_name, status FROM notification_attachments_all "
+                    "WHERE notification_id = ANY(%s)", Attachment.from_row),
+    'history': ("SELECT notification_id, action_type, performed_by, action_timestamp, details "
+                "FROM notification_history_all WHERE notification_id = ANY(%s) ORDER BY action_timestamp",
+                HistoryEntry.from_row),
+    'actions': ("SELECT notification_id, executor_id, executor_name, description, action_timestamp, "
+                "final_action_by_executor, evidence_description, evidence_attachments "
+                "FROM notification_actions_all WHERE notification_id = ANY(%s) ORDER BY action_timestamp",
+                Action.from_row),
+}
+
+
+def _fetch_children(cur, kind: str, notification_ids: List[int]) -> Dict[int, list]:
+    """Registros de uma tabela relacionada ('attachments', 'history' ou 'actions') agrupados por notificação."""
+    query, from_row = _CHILD_QUERIES[kind]
+    cur.execute(query, (list(notification_ids),))
+    grouped: Dict[int, list] = {}
+    for row in cur.fetchall():
+        grouped.setdefault(row[0], []).append(from_row(row[1:]))
+    return grouped
+
+
+def load_notification_details(notification_ids: List[int]) -> List[Notification]:
+    """
+    Várias notificações completas, na ordem de notification_ids (as inexistentes são omitidas), com uma
+    consulta por tabela numa única conexão, em vez de load_notification_detail para cada uma.
+    """
+    if not notification_ids:
+        return []
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {NOTIFICATION_DETAIL_COLUMNS} FROM notifications_all WHERE id = ANY(%s)",
+                        (list(notification_ids),))
+            column_names = [desc[0] for desc in cur.description]
+            by_id = {row[0]: Notification.from_row(column_names, row) for row in cur.fetchall()}
+            ids = list(by_id)
+            children = {kind: _fetch_children(cur, kind, ids) for kind in _CHILD_QUERIES}
+        for notification_id, notification in by_id.items():
+            for kind, grouped in children.items():
+                notification[kind] = grouped.get(notification_id, [])
+        return [by_id[i] for i in notification_ids if i in by_id]
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar as notificações: {e}")
+        return []
+    finally:
+        if conn:
+            conn.close()
+
+
+def load_notification_detail(notification_id: int) -> Optional[Notification]:
+    """
+    Carrega uma única notificação completa (todas as colunas, anexos, histórico e ações).
+    Usada quando o usuário abre os detalhes ou seleciona uma notificação para trabalhar.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(f"SELECT {NOTIFICATION_DETAIL_COLUMNS} FROM notifications_all WHERE id = %s", (notification_id,))
+        row = cur.fetchone()
+        if not row:
+            cur.close()
+            return None
+        notification = Notification.from_row([desc[0] for desc in cur.description], row)
+        notification['attachments'] = get_notification_attachments(notification_id, conn, cur)
+        notification['history'] = get_notification_history(notification_id, conn, cur)
+        notification['actions'] = get_notification_actions(notification_id, conn, cur)
+        cur.close()
+        return notification
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar a notificação {notification_id}: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def search_notification_ids(search_query: str) -> set:
+    """
+    Retorna os IDs das notificações cujo título ou descrição contém o termo buscado.
+    Permite filtrar as listas resumidas sem trazer a descrição completa para a aplicação.
+    """
+    if not search_query:
+        return set()
+    escaped_query = search_query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = f"%{escaped_query}%"
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM notifications_all WHERE title ILIKE %s OR description ILIKE %s",
+                    (pattern, pattern))
+        ids = {r[0] for r in cur.fetchall()}
+        cur.close()
+        return ids
+    except psycopg2.Error as e:
+        st.error(f"Erro ao buscar notificações: {e}")
+        return set()
     finally:
         if conn:
             conn.close()
@@ -824,15 +999,17 @@ def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None)
     """
     conn = None
     notification_id = None
+    pipeline = get_attachment_pipeline()
+    reserved_attachments = []
+    committed = False
     try:
         conn = get_db_connection()
         cur = conn.cursor()
 
         # Prepare main notification data
-        occurrence_date_iso = data.get('occurrence_date').isoformat() if isinstance(data.get('occurrence_date'),
-                                                                                    dt_date_class) else None
-        occurrence_time_str = data.get('occurrence_time').isoformat() if isinstance(data.get('occurrence_time'),
-                                                                                    dt_time_class) else None
+        # psycopg2 adapta date/time/datetime nativos; não é preciso converter para string
+        occurrence_date = data.get('occurrence_date') if isinstance(data.get('occurrence_date'), dt_date_class) else None
+        occurrence_time = data.get('occurrence_time') if isinstance(data.get('occurrence_time'), dt_time_class) else None
 
         cur.execute("""
             INSERT INTO notifications (
@@ -847,8 +1024,8 @@ def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None)
             data.get('title', '').strip(),
             data.get('description', '').strip(),
             data.get('location', '').strip(),
-            occurrence_date_iso,
-            occurrence_time_str,
+            occurrence_date,
+            occurrence_time,
             data.get('reporting_department', '').strip(),
             data.get('reporting_department_complement', '').strip(),
             data.get('notified_department', '').strip(),
@@ -863,21 +1040,20 @@ def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None)
                 'patient_outcome_obito') == "Não" else None) if data.get('patient_involved') == "Sim" else None,
             data.get('additional_notes', '').strip(),
             "pendente_classificacao",
-            datetime.now().isoformat()
+            datetime.now()
         ))
         notification_id = cur.fetchone()[0]
 
-        # Save initial attachments
-        if uploaded_files:
-            for file in uploaded_files:
-                # save_uploaded_file_to_disk salva o arquivo no sistema de arquivos
-                saved_file_info = save_uploaded_file_to_disk(file, notification_id)
-                if saved_file_info:
-                    # E adiciona o registro na tabela notification_attachments
-                    cur.execute("""
-                        INSERT INTO notification_attachments (notification_id, unique_name, original_name)
-                        VALUES (%s, %s, %s)
-                    """, (notification_id, saved_file_info['unique_name'], saved_file_info['original_name']))
+        # Anexos iniciais: o conteúdo recebido é gravado sem processar na área de entrada antes do commit,
+        # e a linha entra como 'pending'. Compressão e hash acontecem no pipeline, depois do commit.
+        for file in uploaded_files or []:
+            unique_name = build_unique_name(notification_id, file.name)
+            reserved_attachments.append(unique_name)
+            pipeline.stage(file, unique_name)
+            cur.execute("""
+                INSERT INTO notification_attachments (notification_id, unique_name, original_name, status)
+                VALUES (%s, %s, %s, %s)
+            """, (notification_id, unique_name, file.name, ATTACHMENT_STATUS_PENDING))
 
         # Add initial history entry
         add_history_entry(
@@ -892,96 +1068,370 @@ def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None)
         )
 
         conn.commit()
+        committed = True
+        # Não espera o NOTIFY: a próxima leitura desta sessão já enxerga a escrita
+        get_notification_index().mark_changed([notification_id])
+        get_result_cache().invalidate('notifications', f'notification:{notification_id}')
         cur.close()
 
+        for unique_name in reserved_attachments:
+            pipeline.submit(unique_name)
+
         # Recarregar a notificação completa para retornar
         # Isso é importante porque a notificação pode ter valores padrão ou triggers que a modificam
-        # (Chama load_notifications e filtra pelo ID)
-        all_notifications = load_notifications()  # Recarrega tudo para garantir consistência
-        created_notification = next((n for n in all_notifications if n['id'] == notification_id), None)
-        return created_notification
+        return load_notification_detail(notification_id)
+
+    except (psycopg2.Error, OSError) as e:
+        st.error(f"Erro ao criar notificação: {e}")
+        if conn:
+            conn.rollback()  # Rollback em caso de erro
+        if not committed:
+            for unique_name in reserved_attachments:
+                pipeline.discard(unique_name)
+        return {}  # Retorna um dicionário vazio em caso de falha grave
+    finally:
+        if conn:
+            conn.close()
+
+
+def _apply_notification_updates(cur, notification_id: int, updates: Dict) -> bool:
+    """
+    Executa o UPDATE de notifications com os campos de updates no cursor informado (sem commit).
+    Campos JSONB são serializados e booleanos "Sim"/"Não" convertidos. Retorna se havia algo a atualizar.
+    """
+    set_clauses = []
+    values = []
+
+    # Mapeamento para garantir que booleanos e datas/tempos sejam formatados corretamente para o DB
+    # E que dicionários sejam serializados para JSONB
+    column_mapping = {
+        'immediate_actions_taken': lambda x: True if x == "Sim" else False if x == "Não" else None,
+        'patient_involved': lambda x: True if x == "Sim" else False if x == "Não" else None,
+        'patient_outcome_obito': lambda x: (True if x == "Sim" else False if x == "Não" else None),
+        'occurrence_date': lambda x: x,  # date/time nativos são adaptados pelo psycopg2
+        'occurrence_time': lambda x: x,
+        'classification': lambda x: json.dumps(x) if x is not None else None,
+        'rejection_classification': lambda x: json.dumps(x) if x is not None else None,
+        'review_execution': lambda x: json.dumps(x) if x is not None else None,
+        'approval': lambda x: json.dumps(x) if x is not None else None,
+        'rejection_approval': lambda x: json.dumps(x) if x is not None else None,
+        'rejection_execution_review': lambda x: json.dumps(x) if x is not None else None,
+        'conclusion': lambda x: json.dumps(x) if x is not None else None,
+        'executors': lambda x: x  # psycopg2 lida bem com arrays Python para INTEGER[]
+    }
+
+    for key, value in updates.items():
+        if key not in ['id', 'created_at', 'attachments', 'actions',
+                       'history']:  # Não atualiza IDs ou listas complexas aqui
+            if key in column_mapping:
+                set_clauses.append(sql.Identifier(key) + sql.SQL(' = %s'))
+                values.append(column_mapping[key](value))
+            else:
+                set_clauses.append(sql.Identifier(key) + sql.SQL(' = %s'))
+                values.append(value)
+
+    if not set_clauses:
+        return False
+    query = sql.SQL("UPDATE notifications SET {} WHERE id = %s").format(
+        sql.SQL(', ').join(set_clauses)
+    )
+    values.append(notification_id)
+    cur.execute(query, values)
+    return True
+
+
+def update_notification(notification_id: int, updates: Dict, history: Optional[HistoryWriter] = None):
+    """
+    Atualiza um registro de notificação com novos dados no banco de dados.
+    Esta função é inteligente para lidar com campos JSONB e arrays,
+    além de campos simples.
+    As entradas acumuladas em history são gravadas na mesma transação (um único commit).
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        updated = _apply_notification_updates(cur, notification_id, updates)
+        if not updated and not history:
+            return None  # Nenhuma atualização para aplicar
+        if history:
+            history.flush(cur)
+        conn.commit()
+        # Não espera o NOTIFY: a próxima leitura desta sessão já enxerga a escrita
+        get_notification_index().mark_changed([notification_id])
+        get_result_cache().invalidate('notifications', f'notification:{notification_id}')
+        cur.close()
+
+        # Recarregar a notificação atualizada para retornar
+        return load_notification_detail(notification_id)
+
+    except psycopg2.Error as e:
+        st.error(f"Erro ao atualizar notificação: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def record_execution_action(notification_id: int, action_data: Dict, history: HistoryWriter,
+                            updates: Optional[Dict] = None) -> Optional[Tuple[bool, List[int]]]:
+    """
+    Passo de execução numa única transação: a ação do executor, as atualizações da notificação e o
+    histórico acumulado em history têm um só commit, e uma falha no meio não deixa a ação sem o resto.
+    Se a ação for a final do executor e todos tiverem concluído, o status passa a
+    'revisao_classificador_execucao' na mesma transação.
+    Retorna (todos os executores concluíram?, ids de quem ainda não concluiu), ou None em caso de erro.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        if not add_notification_action(notification_id, action_data, conn, cur):
+            conn.rollback()
+            return None
+        # O trigger da ação final já marcou concluded_at em notification_executors nesta transação
+        all_concluded, pending_executor_ids = execution_progress(cur, notification_id)
+        updates = dict(updates or {})
+        if action_data.get('final_action_by_executor') and all_concluded:
+            updates['status'] = 'revisao_classificador_execucao'
+        _apply_notification_updates(cur, notification_id, updates)
+        history.flush(cur)
+        conn.commit()
+        get_notification_index().mark_changed([notification_id])
+        get_result_cache().invalidate('notifications', f'notification:{notification_id}', 'notification_executors')
+        cur.close()
+        return all_concluded, pending_executor_ids
+    except psycopg2.Error as e:
+        st.error(f"Erro ao registrar a ação da notificação {notification_id}: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def load_worklist_counts(user_id: Optional[int]) -> Dict[str, int]:
+    """
+    Contadores das filas de trabalho para a barra lateral, numa única consulta agregada.
+    Lê só a tabela quente (as notificações em andamento nunca são arquivadas), usando os índices
+    de status, approver e notification_executors.
+    """
+    def query():
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT
+                    COUNT(*) FILTER (WHERE status = 'pendente_classificacao'),
+                    COUNT(*) FILTER (WHERE status = 'revisao_classificador_execucao'),
+                    COUNT(*) FILTER (WHERE status IN ('classificada', 'em_execucao') AND id IN (
+                        SELECT notification_id FROM notification_executors WHERE executor_id = %s)),
+                    COUNT(*) FILTER (WHERE status = 'aguardando_aprovacao' AND approver = %s)
+                FROM notifications
+                WHERE status IN ('pendente_classificacao', 'revisao_classificador_execucao', 'classificada',
+                                 'em_execucao', 'aguardando_aprovacao')
+            """, (user_id, user_id))
+            pending_classification, pending_review, my_executions, my_approvals = cur.fetchone()
+            cur.close()
+            return {
+                'pending_classification': pending_classification,
+                'pending_review': pending_review,
+                'my_executions': my_executions,
+                'my_approvals': my_approvals,
+            }
+        finally:
+            conn.close()
+
+    try:
+        # ttl cobre as notificações recebidas pela API/intake, que não passam pelas funções de escrita do app
+        return get_result_cache().get_or_compute(make_key('worklist_counts', user_id), ('notifications',),
+                                                 query, ttl=30)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar contadores de pendências: {e}")
+        return {}
+
+
+def load_approval_worklist(user_id: int) -> tuple:
+    """
+    (ids aguardando a aprovação do usuário, na ordem da página; ids das notificações que ele aprovou ou
+    reprovou), em duas consultas por índice.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            return (pending_approval_ids(cur, user_id, FORM_DATA.prioridades),
+                    closed_approval_ids(cur, user_id))
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar as notificações para aprovação: {e}")
+        return [], []
+    finally:
+        if conn:
+            conn.close()
+
+
+def load_lead_time_by_stage(start_date: dt_date_class, end_date: dt_date_class) -> List[Dict]:
+    """Lead time por etapa e setor (média, mediana e p90 em horas) das etapas encerradas no período."""
+    def query():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                return lead_time_by_stage(cur, datetime.combine(start_date, dt_time_class.min),
+                                          datetime.combine(end_date + timedelta(days=1), dt_time_class.min))
+        finally:
+            conn.close()
+
+    try:
+        # A versão do índice só entra na chave do single flight, que é deste processo
+        flight_key = make_key('lead_time_by_stage', start_date, end_date, watermark=_data_watermark())
+        return get_result_cache().get_or_compute(
+            make_key('lead_time_by_stage', start_date, end_date), ('notifications',),
+            lambda: get_single_flight().do(flight_key, query), ttl=ANALYTICS_CACHE_TTL_SECONDS)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar os indicadores de lead time: {e}")
+        return []
+
+
+def load_executor_workload(department: Optional[str] = None) -> List[Dict]:
+    """Executores ativos com a carga de trabalho atual, do mais indicado para o setor ao menos indicado."""
+    def query():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                return executor_workload(cur, department)
+        finally:
+            conn.close()
+
+    try:
+        return get_result_cache().get_or_compute(
+            make_key('executor_workload', department), ('notifications', 'notification_executors', 'users'),
+            query, ttl=60)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar a carga de trabalho dos executores: {e}")
+        return []
+
+
+EXPORT_MIME_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_dashboard_list(filters: Dict[str, Any], export_format: str) -> Optional[Tuple[str, int]]:
+    """
+    Grava a lista filtrada do dashboard num arquivo temporário (CSV ou XLSX) lendo as linhas do banco em
+    lotes. Retorna (caminho, linhas exportadas); o chamador remove o arquivo depois de usá-lo.
+    """
+    handle = tempfile.NamedTemporaryFile(delete=False, suffix=f".{export_format}")
+    conn = None
+    exported = False
+    try:
+        conn = get_db_connection()
+        with handle:
+            count = export_notifications(conn, filters, FORM_DATA.prioridades, export_format, handle)
+        exported = True
+        return handle.name, count
+    except (psycopg2.Error, OSError) as e:
+        st.error(f"Erro ao exportar as notificações: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+        # Qualquer falha (banco, disco ou geração do XLSX) remove o arquivo incompleto
+        if not exported:
+            handle.close()
+            os.remove(handle.name)
+
+
+def load_executor_has_concluded(notification_id: int, executor_id: int) -> bool:
+    """Se o executor já concluiu a parte dele na notificação."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            return executor_has_concluded(cur, notification_id, executor_id)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao verificar a conclusão do executor na notificação {notification_id}: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def claim_next_classification(user_id: int) -> Optional[tuple]:
+    """Reserva a próxima notificação da fila de classificação inicial. Retorna (id, vencimento) ou None."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        return claim_next_notification(conn, user_id)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao reservar a próxima notificação: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            conn.close()
 
+
+def renew_classification_claim(notification_id: int, user_id: int) -> Optional[datetime]:
+    """Renova a reserva de uma notificação; None se ela não for mais do usuário."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        return renew_claim(conn, notification_id, user_id)
     except psycopg2.Error as e:
-        st.error(f"Erro ao criar notificação: {e}")
+        st.error(f"Erro ao renovar a reserva da notificação {notification_id}: {e}")
         if conn:
-            conn.rollback()  # Rollback em caso de erro
-        return {}  # Retorna um dicionário vazio em caso de falha grave
+            conn.rollback()
+        return None
     finally:
         if conn:
             conn.close()
 
 
-def update_notification(notification_id: int, updates: Dict):
-    """
-    Atualiza um registro de notificação com novos dados no banco de dados.
-    Esta função é inteligente para lidar com campos JSONB e arrays,
-    além de campos simples.
-    """
+def release_classification_claim(notification_id: int, user_id: int):
+    """Devolve uma notificação reservada à fila de classificação."""
     conn = None
     try:
         conn = get_db_connection()
-        cur = conn.cursor()
-
-        set_clauses = []
-        values = []
-
-        # Mapeamento para garantir que booleanos e datas/tempos sejam formatados corretamente para o DB
-        # E que dicionários sejam serializados para JSONB
-        column_mapping = {
-            'immediate_actions_taken': lambda x: True if x == "Sim" else False if x == "Não" else None,
-            'patient_involved': lambda x: True if x == "Sim" else False if x == "Não" else None,
-            'patient_outcome_obito': lambda x: (True if x == "Sim" else False if x == "Não" else None),
-            'occurrence_date': lambda x: x.isoformat() if isinstance(x, dt_date_class) else x,
-            'occurrence_time': lambda x: x.isoformat() if isinstance(x, dt_time_class) else x,
-            'classification': lambda x: json.dumps(x) if x is not None else None,
-            'rejection_classification': lambda x: json.dumps(x) if x is not None else None,
-            'review_execution': lambda x: json.dumps(x) if x is not None else None,
-            'approval': lambda x: json.dumps(x) if x is not None else None,
-            'rejection_approval': lambda x: json.dumps(x) if x is not None else None,
-            'rejection_execution_review': lambda x: json.dumps(x) if x is not None else None,
-            'conclusion': lambda x: json.dumps(x) if x is not None else None,
-            'executors': lambda x: x  # psycopg2 lida bem com arrays Python para INTEGER[]
-        }
-
-        for key, value in updates.items():
-            if key not in ['id', 'created_at', 'attachments', 'actions',
-                           'history']:  # Não atualiza IDs ou listas complexas aqui
-                if key in column_mapping:
-                    set_clauses.append(sql.Identifier(key) + sql.SQL(' = %s'))
-                    values.append(column_mapping[key](value))
-                else:
-                    set_clauses.append(sql.Identifier(key) + sql.SQL(' = %s'))
-                    values.append(value)
-
-        if not set_clauses:
-            return None  # Nenhuma atualização para aplicar
-
-        query = sql.SQL("UPDATE notifications SET {} WHERE id = %s").format(
-            sql.SQL(', ').join(set_clauses)
-        )
-        values.append(notification_id)
-
-        cur.execute(query, values)
-        conn.commit()
-        cur.close()
-
-        # Recarregar a notificação atualizada para retornar (chama load_notifications e filtra)
-        all_notifications = load_notifications()
-        updated_notification = next((n for n in all_notifications if n['id'] == notification_id), None)
-        return updated_notification
-
+        release_claim(conn, notification_id, user_id)
     except psycopg2.Error as e:
-        st.error(f"Erro ao atualizar notificação: {e}")
+        st.error(f"Erro ao devolver a notificação {notification_id} à fila: {e}")
         if conn:
             conn.rollback()
-        return None
     finally:
         if conn:
             conn.close()
 
 
+def load_classification_queue_counts() -> Dict[str, int]:
+    """Notificações livres e reservadas na fila de classificação inicial."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        return queue_counts(conn)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar a fila de classificação: {e}")
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+
+def _drop_classification_claim_state(notification_id: Optional[int]):
+    """Limpa da sessão a reserva atual e o estado do formulário de classificação da notificação."""
+    st.session_state.get('initial_classification_state', {}).pop(notification_id, None)
+    st.session_state.pop('current_initial_classification_id', None)
+    st.session_state.pop('classification_claim', None)
+
+
 # Funções auxiliares para buscar dados relacionados (usadas por load_notifications)
-def get_notification_attachments(notification_id: int, conn=None, cur=None) -> List[Dict]:
+def get_notification_attachments(notification_id: int, conn=None, cur=None) -> List[Attachment]:
     """Busca anexos para uma notificação específica. Pode usar conexão e cursor existentes."""
     local_conn = conn
     local_cur = cur
@@ -990,10 +1440,10 @@ def get_notification_attachments(notification_id: int, conn=None, cur=None) -> L
             local_conn = get_db_connection()
             local_cur = local_conn.cursor()
 
-        local_cur.execute("SELECT unique_name, original_name FROM notification_attachments WHERE notification_id = %s",
+        local_cur.execute("SELECT unique_name, original_name, status FROM notification_attachments_all WHERE notification_id = %s",
                           (notification_id,))
         attachments_raw = local_cur.fetchall()
-        return [{"unique_name": att[0], "original_name": att[1]} for att in attachments_raw]
+        return [Attachment.from_row(att) for att in attachments_raw]
     except psycopg2.Error as e:
         st.error(f"Erro ao carregar anexos da notificação {notification_id}: {e}")
         return []
@@ -1002,7 +1452,7 @@ def get_notification_attachments(notification_id: int, conn=None, cur=None) -> L
         if not (conn and cur) and local_conn: local_conn.close()
 
 
-def get_notification_history(notification_id: int, conn=None, cur=None) -> List[Dict]:
+def get_notification_history(notification_id: int, conn=None, cur=None) -> List[HistoryEntry]:
     """Busca entradas de histórico para uma notificação. Pode usar conexão e cursor existentes."""
     local_conn = conn
     local_cur = cur
@@ -1012,18 +1462,10 @@ def get_notification_history(notification_id: int, conn=None, cur=None) -> List[
             local_cur = local_conn.cursor()
 
         local_cur.execute(
-            "SELECT action_type, performed_by, action_timestamp, details FROM notification_history WHERE notification_id = %s ORDER BY action_timestamp",
+            "SELECT action_type, performed_by, action_timestamp, details FROM notification_history_all WHERE notification_id = %s ORDER BY action_timestamp",
             (notification_id,))
         history_raw = local_cur.fetchall()
-        return [
-            {
-                "action": h[0],
-                "user": h[1],
-                "timestamp": h[2].isoformat() if h[2] else None,
-                "details": h[3]
-            }
-            for h in history_raw
-        ]
+        return [HistoryEntry.from_row(h) for h in history_raw]
     except psycopg2.Error as e:
         st.error(f"Erro ao carregar histórico da notificação {notification_id}: {e}")
         return []
@@ -1032,7 +1474,7 @@ def get_notification_history(notification_id: int, conn=None, cur=None) -> List[
         if not (conn and cur) and local_conn: local_conn.close()
 
 
-def get_notification_actions(notification_id: int, conn=None, cur=None) -> List[Dict]:
+def get_notification_actions(notification_id: int, conn=None, cur=None) -> List[Action]:
     """Busca ações de executores para uma notificação. Pode usar conexão e cursor existentes."""
     local_conn = conn
     local_cur = cur
@@ -1042,21 +1484,10 @@ def get_notification_actions(notification_id: int, conn=None, cur=None) -> List[
             local_cur = local_conn.cursor()
 
         local_cur.execute(
-            "SELECT executor_id, executor_name, description, action_timestamp, final_action_by_executor, evidence_description, evidence_attachments FROM notification_actions WHERE notification_id = %s ORDER BY action_timestamp",
+            "SELECT executor_id, executor_name, description, action_timestamp, final_action_by_executor, evidence_description, evidence_attachments FROM notification_actions_all WHERE notification_id = %s ORDER BY action_timestamp",
             (notification_id,))
         actions_raw = local_cur.fetchall()
-        return [
-            {
-                "executor_id": a[0],
-                "executor_name": a[1],
-                "description": a[2],
-                "timestamp": a[3].isoformat() if a[3] else None,
-                "final_action_by_executor": a[4],
-                "evidence_description": a[5],
-                "evidence_attachments": a[6]  # Já é JSONB, então vem como objeto Python (list/dict)
-            }
-            for a in actions_raw
-        ]
+        return [Action.from_row(a) for a in actions_raw]
     except psycopg2.Error as e:
         st.error(f"Erro ao carregar ações da notificação {notification_id}: {e}")
         return []
@@ -1065,6 +1496,23 @@ def get_notification_actions(notification_id: int, conn=None, cur=None) -> List[
         if not (conn and cur) and local_conn: local_conn.close()
 
 
+def load_actions_by_notification(notification_ids: List[int]) -> Dict[int, List[Action]]:
+    """Ações de executores de várias notificações numa única consulta, agrupadas por notificação."""
+    if not notification_ids:
+        return {}
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            return _fetch_children(cur, 'actions', notification_ids)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar ações das notificações: {e}")
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+
 def add_history_entry(notification_id: int, action: str, user: str, details: str = "", conn=None, cursor=None):
     """
     Adiciona uma entrada ao histórico de uma notificação.
@@ -1077,13 +1525,14 @@ def add_history_entry(notification_id: int, action: str, user: str, details: str
             local_conn = get_db_connection()
             local_cur = local_conn.cursor()
 
-        local_cur.execute("""
-            INSERT INTO notification_history (notification_id, action_type, performed_by, action_timestamp, details)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (notification_id, action, user, datetime.now().isoformat(), details))
+        history = HistoryWriter()
+        history.add(notification_id, action, user, details)
+        history.flush(local_cur)
 
         if not (conn and cursor):  # Se for uma transação separada, faça commit aqui
             local_conn.commit()
+            # Com a transação do chamador, quem invalida é ele, depois do próprio commit
+            get_result_cache().invalidate(f'notification:{notification_id}')
         return True
     except psycopg2.Error as e:
         st.error(f"Erro ao adicionar entrada de histórico para notificação {notification_id}: {e}")
@@ -1126,6 +1575,9 @@ def add_notification_action(notification_id: int, action_data: Dict, conn=None,
         ))
         if not (conn and cur):
             local_conn.commit()
+            # A ação final do executor altera notification_executors (concluded_at) via trigger.
+            # Com a transação do chamador, quem invalida é ele, depois do próprio commit
+            get_result_cache().invalidate(f'notification:{notification_id}', 'notification_executors')
         return True
     except psycopg2.Error as e:
         st.error(f"Erro ao adicionar ação para notificação {notification_id}: {e}")
@@ -1137,29 +1589,58 @@ def add_notification_action(notification_id: int, action_data: Dict, conn=None,
         if local_conn and not (conn and cur): local_conn.close()
 
 
-def save_uploaded_file_to_disk(uploaded_file: Any, notification_id: int) -> Optional[Dict]:
-    """Salva um arquivo enviado para o diretório de anexos no disco e retorna suas informações."""
-    if uploaded_file is None:
-        return None
-    original_name = uploaded_file.name
-    safe_original_name = "".join(c for c in original_name if c.isalnum() or c in ('.', '_', '-')).rstrip('.')
-    unique_filename = f"{notification_id}_{uuid.uuid4().hex}_{safe_original_name}"
-    file_path = os.path.join(ATTACHMENTS_DIR, unique_filename)
+@st.cache_resource
+def get_attachment_pipeline() -> AttachmentIngestionPipeline:
+    """
+    Pipeline de ingestão de anexos compartilhado pelo processo (gravação em disco em segundo plano).
+    Ao ser criado, retoma em segundo plano os anexos que uma parada anterior deixou sem processar.
+    """
+    pipeline = AttachmentIngestionPipeline(ATTACHMENTS_DIR, lambda: psycopg2.connect(**DB_CONFIG))
+    pipeline.start_recovery()
+    return pipeline
+
+
+def reserve_evidence_attachments(uploaded_files: List[Any], notification_id: int) -> List[Dict]:
+    """
+    Reserva nomes únicos para os arquivos de evidência e grava o conteúdo na área de entrada do pipeline.
+    Retorna a lista {unique_name, original_name} a ser salva em notification_actions.evidence_attachments;
+    depois do commit da ação, chame submit_evidence_attachments (ou discard_evidence_attachments se falhar).
+    Levanta OSError se não for possível gravar.
+    """
+    pipeline = get_attachment_pipeline()
+    reserved = []
     try:
-        os.makedirs(ATTACHMENTS_DIR, exist_ok=True)  # Garante que o diretório exista
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        return {"unique_name": unique_filename, "original_name": original_name}
-    except Exception as e:
-        st.error(f"Erro ao salvar o anexo {original_name} no disco: {e}")
-        return None
+        for file in uploaded_files:
+            unique_name = build_unique_name(notification_id, file.name)
+            reserved.append({"unique_name": unique_name, "original_name": file.name})
+            pipeline.stage(file, unique_name)
+    except OSError:
+        discard_evidence_attachments(reserved)
+        raise
+    return reserved
+
+
+def submit_evidence_attachments(reserved: List[Dict]):
+    """Agenda o processamento das evidências depois do commit da ação (não têm linha em notification_attachments)."""
+    pipeline = get_attachment_pipeline()
+    for attachment in reserved:
+        pipeline.submit(attachment["unique_name"], record_in_db=False)
+
+
+def discard_evidence_attachments(reserved: List[Dict]):
+    pipeline = get_attachment_pipeline()
+    for attachment in reserved:
+        pipeline.discard(attachment["unique_name"])
 
 
 def get_attachment_data(unique_filename: str) -> Optional[bytes]:
-    """Lê o conteúdo de um arquivo de anexo do disco."""
-    file_path = os.path.join(ATTACHMENTS_DIR, unique_filename)
+    """Lê o conteúdo de um arquivo de anexo do disco (descomprimindo, se ele estiver guardado comprimido)."""
+    # Anexos recém-enviados podem ainda estar sendo gravados pelo pipeline de ingestão
+    if not wait_for_ingestion(unique_filename, timeout=5):
+        st.info(f"⏳ O anexo {unique_filename} ainda está sendo processado. Atualize a página em instantes.")
+        return None
     try:
-        with open(file_path, "rb") as f:
+        with open_attachment(ATTACHMENTS_DIR, unique_filename) as f:
             return f.read()
     except FileNotFoundError:
         st.warning(f"Anexo não encontrado no caminho: {unique_filename}")
@@ -1169,6 +1650,37 @@ def get_attachment_data(unique_filename: str) -> Optional[bytes]:
         return None
 
 
+@st.cache_resource
+def get_preview_cache() -> PreviewCache:
+    """Cache de miniaturas dos anexos, compartilhado pelo processo (gerado sob demanda em segundo plano)."""
+    return PreviewCache(PREVIEWS_DIR, lambda unique_name: open_attachment(ATTACHMENTS_DIR, unique_name))
+
+
+@st.cache_resource
+def get_detail_render_cache() -> DetailRenderCache:
+    """Cache dos blocos de texto dos detalhes das notificações, compartilhado pelo processo."""
+    return DetailRenderCache()
+
+
+def display_attachment_status(status: Optional[str], original_name: str):
+    """Avisa quando um anexo ainda está em processamento ou quando a gravação falhou."""
+    if status == ATTACHMENT_STATUS_PENDING:
+        st.caption(f"⏳ {original_name}: arquivo em processamento.")
+    elif status == ATTACHMENT_STATUS_FAILED:
+        st.warning(f"⚠️ {original_name}: falha ao gravar o arquivo; ele pode estar indisponível.")
+
+
+def display_attachment_preview(unique_name: str, original_name: str):
+    """Mostra a miniatura de um anexo (imagem ou PDF), se o tipo tiver pré-visualização."""
+    if preview_kind(unique_name) is None:
+        return
+    preview_path = get_preview_cache().get(unique_name)
+    if preview_path:
+        st.image(preview_path, caption=original_name, width=240)
+    else:
+        st.caption(f"🖼️ Gerando pré-visualização de {original_name}...")
+
+
 # --- Funções de Autenticação e Autorização ---
 
 def hash_password(password: str) -> str:
@@ -1213,9 +1725,38 @@ def check_permission(required_role: str) -> bool:
 
 
 def get_users_by_role(role: str) -> List[Dict]:
-    """Retorna usuários ativos com uma função específica."""
-    users = load_users()  # Carrega usuários do DB
-    return [user for user in users if role in user.get('roles', []) and user.get('active', True)]
+    """
+    Retorna usuários ativos com uma função específica (sem o hash da senha).
+    O resultado fica no cache de resultados até a próxima criação/alteração de usuário.
+    """
+    def query():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, username, name, email, roles, active, created_at FROM users
+                    WHERE active AND %s = ANY(roles) ORDER BY name
+                """, (role,))
+                return [
+                    {
+                        "id": u[0],
+                        "username": u[1],
+                        "name": u[2],
+                        "email": u[3],
+                        "roles": u[4],
+                        "active": u[5],
+                        "created_at": u[6].isoformat() if u[6] else None
+                    }
+                    for u in cur.fetchall()
+                ]
+        finally:
+            conn.close()
+
+    try:
+        return get_result_cache().get_or_compute(make_key('users_by_role', role), ('users',), query)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar usuários: {e}")
+        return []
 
 
 # --- Funções Auxiliares/Utilitárias ---
@@ -1255,48 +1796,53 @@ def get_deadline_status(deadline_date_str: Optional[str], completion_timestamp_s
         return {"text": UI_TEXTS.text_na, "class": ""}  # Formato inválido de data
 
 
-def format_date_time_summary(date_val: Any, time_val: Any) -> str:
-    """Formata data e hora opcional para exibição."""
-    date_part_formatted = UI_TEXTS.text_na
-    time_part_formatted = ''
+# created_at é TIMESTAMPTZ (datetime com fuso); chave de ordenação para valores ausentes
+MIN_TIMESTAMP = datetime.min.replace(tzinfo=timezone.utc)
 
-    if isinstance(date_val, dt_date_class):  # Corrigido: usa dt_date_class
+
+@lru_cache(maxsize=4096)
+def format_datetime_display(value: Any, fmt: str = '%d/%m/%Y %H:%M:%S') -> str:
+    """
+    Formata datetime/date/time para exibição, com cache por (valor, formato).
+    Também aceita as strings ISO gravadas dentro dos campos JSONB (ex.: classification_timestamp);
+    se a string não for uma data válida, ela é exibida como está.
+    """
+    if value is None or value == '':
+        return UI_TEXTS.text_na
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value.strftime(fmt)
+
+
+@lru_cache(maxsize=4096)
+def format_date_time_summary(date_val: Any, time_val: Any) -> str:
+    """Formata data e hora opcional para exibição. O resultado fica em cache por par (data, hora)."""
+    if date_val is None:
+        date_part_formatted = 'Não informada'
+    elif isinstance(date_val, dt_date_class):
         date_part_formatted = date_val.strftime('%d/%m/%Y')
     elif isinstance(date_val, str) and date_val:
         try:
-            date_part_formatted = datetime.fromisoformat(date_val).date().strftime('%d/%m/%Y')
+            date_part_formatted = datetime.fromisoformat(date_val).strftime('%d/%m/%Y')
         except ValueError:
             date_part_formatted = 'Data inválida'
-    elif date_val is None:
-        date_part_formatted = 'Não informada'
+    else:
+        date_part_formatted = UI_TEXTS.text_na
 
-    if isinstance(time_val, dt_time_class):  # Corrigido: usa dt_time_class
+    time_part_formatted = ''
+    if isinstance(time_val, dt_time_class):
         time_part_formatted = f" às {time_val.strftime('%H:%M')}"
     elif isinstance(time_val, str) and time_val and time_val.lower() != 'none':
+        # Strings de hora vêm de dados antigos; "00:00:00" indica hora não informada
         try:
-            time_str_part = time_val.split('.')[0]
-            try:
-                time_obj = datetime.strptime(time_str_part, '%H:%M:%S').time()
-                # CORREÇÃO: Tratar o caso de "00:00:00" para evitar que seja exibido para campos de hora vazios
-                if time_obj == datetime.strptime("00:00:00", '%H:%M:%S').time():
-                    time_part_formatted = ''
-                else:
-                    time_part_formatted = f" às {time_obj.strftime('%H:%M')}"
-            except ValueError:
-                try:
-                    time_obj = datetime.strptime("00:00", '%H:%M').time()
-                    if time_obj == datetime.strptime("00:00", '%H:%M').time():
-                        time_part_formatted = ''
-                    else:
-                        time_part_formatted = f" às {time_obj.strftime('%H:%M')}"
-                except ValueError:
-                    time_part_formatted = f" às {time_val}"
-                    time_obj = None
-
+            time_obj = dt_time_class.fromisoformat(time_val.split('.')[0])
+            if time_obj != dt_time_class(0, 0):
+                time_part_formatted = f" às {time_obj.strftime('%H:%M')}"
         except ValueError:
-            time_part_formatted = f" às {time_val}"
-    elif time_val is None:
-        time_part_formatted = ''
+            pass
 
     return f"{date_part_formatted}{time_part_formatted}"
 
@@ -1394,6 +1940,7 @@ def show_sidebar():
             st.markdown("### 📋 Menu Principal")
 
             user_roles = st.session_state.user.get('roles', [])
+            worklist_counts = load_worklist_counts(st.session_state.user.get('id'))
 
             if st.button("📝 Nova Notificação", key="nav_create_notif", use_container_width=True):
                 st.session_state.page = 'create_notification'
@@ -1416,8 +1963,11 @@ def show_sidebar():
                     st.rerun()
 
             if 'classificador' in user_roles or 'admin' in user_roles:
-                if st.button("🔍 Classificação/Revisão", key="nav_classification",
-                             use_container_width=True):
+                classification_badge = (f" ({worklist_counts['pending_classification']} · "
+                                        f"{worklist_counts['pending_review']})") if worklist_counts else ""
+                if st.button(f"🔍 Classificação/Revisão{classification_badge}", key="nav_classification",
+                             use_container_width=True,
+                             help="Pendentes de classificação · aguardando revisão da execução"):
                     st.session_state.page = 'classification'
                     _reset_form_state()
                     if 'initial_classification_state' in st.session_state: st.session_state.pop(
@@ -1432,7 +1982,9 @@ def show_sidebar():
                     st.rerun()
 
             if 'executor' in user_roles or 'admin' in user_roles:
-                if st.button("⚡ Execução", key="nav_execution", use_container_width=True):
+                execution_badge = f" ({worklist_counts['my_executions']})" if worklist_counts else ""
+                if st.button(f"⚡ Execução{execution_badge}", key="nav_execution", use_container_width=True,
+                             help="Notificações atribuídas a você aguardando ou em execução"):
                     st.session_state.page = 'execution'
                     _reset_form_state()
                     if 'initial_classification_state' in st.session_state: st.session_state.pop(
@@ -1447,7 +1999,9 @@ def show_sidebar():
                     st.rerun()
 
             if 'aprovador' in user_roles or 'admin' in user_roles:
-                if st.button("✅ Aprovação", key="nav_approval", use_container_width=True):
+                approval_badge = f" ({worklist_counts['my_approvals']})" if worklist_counts else ""
+                if st.button(f"✅ Aprovação{approval_badge}", key="nav_approval", use_container_width=True,
+                             help="Notificações aguardando a sua aprovação"):
                     st.session_state.page = 'approval'
                     _reset_form_state()
                     if 'initial_classification_state' in st.session_state: st.session_state.pop(
@@ -1511,130 +2065,119 @@ def show_sidebar():
         """, unsafe_allow_html=True)
 
 
-def display_notification_full_details(notification: Dict, user_id_logged_in: Optional[int] = None,
-                                      user_username_logged_in: Optional[str] = None):
-    st.markdown("###    Detalhes da Notificação")
-    col_det1, col_det2 = st.columns(2)
-    with col_det1:
-        st.markdown("**📝 Evento Reportado Original**")
-        st.write(f"**Título:** {notification.get('title', UI_TEXTS.text_na)}")
-        st.write(f"**Local:** {notification.get('location', UI_TEXTS.text_na)}")
-        occurrence_datetime_summary = format_date_time_summary(notification.get('occurrence_date'),
-                                                               notification.get('occurrence_time'))
-        st.write(f"**Data/Hora Ocorrência:** {occurrence_datetime_summary}")
-        st.write(f"**Setor Notificante:** {notification.get('reporting_department', UI_TEXTS.text_na)}")
-        if notification.get('immediate_actions_taken') and notification.get('immediate_action_description'):
-            st.write(
-                f"**Ações Imediatas Reportadas:** {notification.get('immediate_action_description', UI_TEXTS.text_na)[:100]}...")
-
-    with col_det2:
-        st.markdown("**⏱️ Informações de Gestão e Classificação**")
-        classif = notification.get('classification') or {}
-        st.write(f"**Classificação NNC:** {classif.get('nnc', UI_TEXTS.text_na)}")
-        if classif.get('nivel_dano'): st.write(f"**Nível de Dano:** {classif.get('nivel_dano', UI_TEXTS.text_na)}")
-        st.write(f"**Prioridade:** {classif.get('prioridade', UI_TEXTS.text_na)}")
-        st.write(f"**Never Event:** {classif.get('never_event', UI_TEXTS.text_na)}")
-        st.write(f"**Evento Sentinela:** {'Sim' if classif.get('is_sentinel_event') else 'Não'}")
-        st.write(f"**Tipo Principal:** {classif.get('event_type_main', UI_TEXTS.text_na)}")
-        sub_type_display_closed = ''
-        if classif.get('event_type_sub'):
-            if isinstance(classif['event_type_sub'], list):
-                sub_type_display_closed = ', '.join(classif['event_type_sub'])
-            else:
-                sub_type_display_closed = str(classif['event_type_sub'])
-        if sub_type_display_closed: st.write(f"**Especificação:** {sub_type_display_closed}")
-        st.write(f"**Classificação OMS:** {', '.join(classif.get('oms', [UI_TEXTS.text_na]))}")
-        st.write(f"**Classificado por:** {classif.get('classificador', UI_TEXTS.text_na)}")
-
-        # Exibição do Prazo e Status
-        deadline_date_str = classif.get('deadline_date')
-        if deadline_date_str:
-            deadline_date_formatted = datetime.fromisoformat(deadline_date_str).strftime('%d/%m/%Y')
-            completion_timestamp_str = (notification.get('conclusion') or {}).get('timestamp')
-            # Em seguida, passe-o para a função get_deadline_status
-            deadline_status = get_deadline_status(deadline_date_str, completion_timestamp_str)
-            st.markdown(
-                f"**Prazo de Conclusão:** {deadline_date_formatted} (<span class='{deadline_status['class']}'>{deadline_status['text']}</span>)",
-                unsafe_allow_html=True)
+def _build_notification_detail_blocks(notification: Dict, user_id_logged_in: Optional[int] = None,
+                                      user_username_logged_in: Optional[str] = None) -> List[tuple]:
+    """
+    Monta os blocos de texto dos detalhes de uma notificação, sem chamar o Streamlit.
+    Cada bloco é (tipo, conteúdo); anexos e evidências entram como listas de (unique_name, original_name),
+    renderizadas a cada exibição porque criam widgets.
+    """
+    blocks = [('markdown', "###    Detalhes da Notificação")]
+
+    reported_lines = [
+        "**📝 Evento Reportado Original**",
+        f"**Título:** {notification.get('title', UI_TEXTS.text_na)}",
+        f"**Local:** {notification.get('location', UI_TEXTS.text_na)}",
+        f"**Data/Hora Ocorrência:** {format_date_time_summary(notification.get('occurrence_date'), notification.get('occurrence_time'))}",
+        f"**Setor Notificante:** {notification.get('reporting_department', UI_TEXTS.text_na)}",
+    ]
+    if notification.get('immediate_actions_taken') and notification.get('immediate_action_description'):
+        reported_lines.append(
+            f"**Ações Imediatas Reportadas:** {notification.get('immediate_action_description', UI_TEXTS.text_na)[:100]}...")
+
+    classif = notification.get('classification') or {}
+    management_lines = [
+        "**⏱️ Informações de Gestão e Classificação**",
+        f"**Classificação NNC:** {classif.get('nnc', UI_TEXTS.text_na)}",
+    ]
+    if classif.get('nivel_dano'):
+        management_lines.append(f"**Nível de Dano:** {classif.get('nivel_dano', UI_TEXTS.text_na)}")
+    management_lines += [
+        f"**Prioridade:** {classif.get('prioridade', UI_TEXTS.text_na)}",
+        f"**Never Event:** {classif.get('never_event', UI_TEXTS.text_na)}",
+        f"**Evento Sentinela:** {'Sim' if classif.get('is_sentinel_event') else 'Não'}",
+        f"**Tipo Principal:** {classif.get('event_type_main', UI_TEXTS.text_na)}",
+    ]
+    sub_type_display_closed = ''
+    if classif.get('event_type_sub'):
+        if isinstance(classif['event_type_sub'], list):
+            sub_type_display_closed = ', '.join(classif['event_type_sub'])
         else:
-            st.write(f"**Prazo de Conclusão:** {UI_TEXTS.deadline_days_nan}")
+            sub_type_display_closed = str(classif['event_type_sub'])
+    if sub_type_display_closed:
+        management_lines.append(f"**Especificação:** {sub_type_display_closed}")
+    management_lines += [
+        f"**Classificação OMS:** {', '.join(classif.get('oms', [UI_TEXTS.text_na]))}",
+        f"**Classificado por:** {classif.get('classificador', UI_TEXTS.text_na)}",
+    ]
+    # O status do prazo depende da data de hoje, então só os parâmetros entram no bloco
+    deadline = (classif.get('deadline_date'), (notification.get('conclusion') or {}).get('timestamp'))
+    blocks.append(('columns', ("\n\n".join(reported_lines), "\n\n".join(management_lines), deadline)))
 
-    st.markdown("**📝 Descrição Completa do Evento**")
-    st.info(notification.get('description', UI_TEXTS.text_na))
+    blocks.append(('markdown', "**📝 Descrição Completa do Evento**"))
+    blocks.append(('info', notification.get('description', UI_TEXTS.text_na)))
     if classif.get('notes'):
-        st.markdown("**📋 Orientações / Observações do Classificador**")
-        st.success(classif.get('notes', UI_TEXTS.text_na))
+        blocks.append(('markdown', "**📋 Orientações / Observações do Classificador**"))
+        blocks.append(('success', classif.get('notes', UI_TEXTS.text_na)))
 
     if notification.get('actions'):
-        st.markdown("#### ⚡ Histórico de Ações")
-        for action in sorted(notification['actions'], key=lambda x: x.get('timestamp', '')):
+        blocks.append(('markdown', "#### ⚡ Histórico de Ações"))
+        for action in notification['actions']:  # Já vêm ordenadas por action_timestamp do banco
             action_type = "🏁 CONCLUSÃO (Executor)" if action.get('final_action_by_executor') else "📝 AÇÃO Registrada"
-            action_timestamp = action.get('timestamp', UI_TEXTS.text_na)
-            if action_timestamp != UI_TEXTS.text_na:
-                try:
-                    action_timestamp = datetime.fromisoformat(action_timestamp).strftime('%d/%m/%Y %H:%M:%S')
-                except ValueError:
-                    pass
+            action_timestamp = format_datetime_display(action.get('timestamp'))
 
             if user_id_logged_in and action.get('executor_id') == user_id_logged_in:
-                st.markdown(f"""
+                blocks.append(('html', f"""
                 <div class='my-action-entry-card'>
                     <strong>{action_type}</strong> - por <strong>VOCÊ ({action.get('executor_name', UI_TEXTS.text_na)})</strong> em {action_timestamp}
                     <br>
                     <em>{action.get('description', UI_TEXTS.text_na)}</em>
                 </div>
-                """, unsafe_allow_html=True)
+                """))
             else:
-                st.markdown(f"""
+                blocks.append(('html', f"""
                 <div class='action-entry-card'>
                     <strong>{action_type}</strong> - por <strong>{action.get('executor_name', UI_TEXTS.text_na)}</strong> em {action_timestamp}
                     <br>
                     <em>{action.get('description', UI_TEXTS.text_na)}</em>
                 </div>
-                """, unsafe_allow_html=True)
+                """))
 
-            # NOVO: Exibir evidências se disponível e for uma ação final
+            # Evidências da ação final do executor, se houver
             if action.get('final_action_by_executor'):
-                evidence_desc = action.get('evidence_description', '').strip()
-                evidence_atts = action.get('evidence_attachments', [])
+                evidence_desc = (action.get('evidence_description') or '').strip()
+                evidence_atts = action.get('evidence_attachments') or []
                 if evidence_desc or evidence_atts:
-                    st.markdown(f"""<div class='evidence-section'>""", unsafe_allow_html=True)
-                    st.markdown("<h6>Evidências da Conclusão:</h6>", unsafe_allow_html=True)
+                    blocks.append(('html', "<div class='evidence-section'>"))
+                    blocks.append(('html', "<h6>Evidências da Conclusão:</h6>"))
                     if evidence_desc:
-                        st.info(evidence_desc)
+                        blocks.append(('info', evidence_desc))
                     if evidence_atts:
-                        for attach_info in evidence_atts:
-                            unique_name = attach_info.get('unique_name')
-                            original_name = attach_info.get('original_name')
-                            if unique_name and original_name:
-                                file_content = get_attachment_data(unique_name)
-                                if file_content:
-                                    st.download_button(
-                                        label=f"Baixar Evidência: {original_name}",
-                                        data=file_content,
-                                        file_name=original_name,
-                                        mime="application/octet-stream",
-                                        key=f"download_action_evidence_{notification['id']}_{unique_name}"
-                                    )
-                                else:
-                                    st.write(f"Anexo: {original_name} (arquivo não encontrado ou corrompido)")
-                    st.markdown(f"""</div>""", unsafe_allow_html=True)
+                        blocks.append(('evidence', [
+                            (attach_info.get('unique_name'), attach_info.get('original_name'))
+                            for attach_info in evidence_atts
+                            if attach_info.get('unique_name') and attach_info.get('original_name')
+                        ]))
+                    blocks.append(('html', "</div>"))
 
-            st.markdown("---")
+            blocks.append(('markdown', "---"))
 
     if notification.get('review_execution'):
-        st.markdown("#### 🛠️ Revisão de Execução")
         review_exec = notification['review_execution']
-        st.write(f"**Decisão:** {review_exec.get('decision', UI_TEXTS.text_na)}")
-        st.write(f"**Revisado por:** {review_exec.get('reviewed_by', UI_TEXTS.text_na)}")
-        st.write(f"**Observações:** {review_exec.get('notes', UI_TEXTS.text_na)}")
+        review_lines = [
+            "#### 🛠️ Revisão de Execução",
+            f"**Decisão:** {review_exec.get('decision', UI_TEXTS.text_na)}",
+            f"**Revisado por:** {review_exec.get('reviewed_by', UI_TEXTS.text_na)}",
+            f"**Observações:** {review_exec.get('notes', UI_TEXTS.text_na)}",
+        ]
         if review_exec.get('rejection_reason'):
-            st.write(f"**Motivo Rejeição:** {review_exec.get('rejection_reason', UI_TEXTS.text_na)}")
+            review_lines.append(f"**Motivo Rejeição:** {review_exec.get('rejection_reason', UI_TEXTS.text_na)}")
+        blocks.append(('markdown', "\n\n".join(review_lines)))
     if notification.get('approval'):
-        st.markdown("#### ✅ Aprovação Final")
+        blocks.append(('markdown', "#### ✅ Aprovação Final"))
         approval_info = notification['approval']
         if user_username_logged_in and approval_info.get('approved_by') == user_username_logged_in:
-            st.markdown(f"""
+            blocks.append(('html', f"""
             <div style='background-color: #e6ffe6; padding: 10px; border-radius: 5px; border-left: 3px solid #4CAF50;'>
                 <strong>Decisão:</strong> {approval_info.get('decision', UI_TEXTS.text_na)}
                 <br>
@@ -1642,73 +2185,162 @@ def display_notification_full_details(notification: Dict, user_id_logged_in: Opt
                 <br>
                 <strong>Observações:</strong> {approval_info.get('notes', UI_TEXTS.text_na)}
             </div>
-            """, unsafe_allow_html=True)
+            """))
         else:
-            st.write(f"**Decisão:** {approval_info.get('decision', UI_TEXTS.text_na)}")
-            st.write(f"**Aprovado por:** {approval_info.get('approved_by', UI_TEXTS.text_na)}")
-            st.write(f"**Observações:** {approval_info.get('notes', UI_TEXTS.text_na)}")
+            blocks.append(('markdown', "\n\n".join([
+                f"**Decisão:** {approval_info.get('decision', UI_TEXTS.text_na)}",
+                f"**Aprovado por:** {approval_info.get('approved_by', UI_TEXTS.text_na)}",
+                f"**Observações:** {approval_info.get('notes', UI_TEXTS.text_na)}",
+            ])))
 
     if notification.get('rejection_classification'):
-        st.markdown("#### ❌ Rejeição na Classificação Inicial")
         rej_classif = notification['rejection_classification']
-        st.write(f"**Motivo:** {rej_classif.get('reason', UI_TEXTS.text_na)}")
-        st.write(f"**Rejeitado por:** {rej_classif.get('classified_by', UI_TEXTS.text_na)}")
+        blocks.append(('markdown', "\n\n".join([
+            "#### ❌ Rejeição na Classificação Inicial",
+            f"**Motivo:** {rej_classif.get('reason', UI_TEXTS.text_na)}",
+            f"**Rejeitado por:** {rej_classif.get('classified_by', UI_TEXTS.text_na)}",
+        ])))
 
     if notification.get('rejection_approval'):
-        st.markdown("#### ⛔ Reprovada na Aprovação")
+        blocks.append(('markdown', "#### ⛔ Reprovada na Aprovação"))
         rej_appr = notification['rejection_approval']
         if user_username_logged_in and rej_appr.get('rejected_by') == user_username_logged_in:
-            st.markdown(f"""
+            blocks.append(('html', f"""
             <div style='background-color: #ffe6e6; padding: 10px; border-radius: 5px; border-left: 3px solid #f44336;'>
                 <strong>Motivo:</strong> {rej_appr.get('reason', UI_TEXTS.text_na)}
                 <br>
                 <strong>Reprovado por:</strong> VOCÊ ({rej_appr.get('rejected_by', UI_TEXTS.text_na)})
             </div>
-            """, unsafe_allow_html=True)
+            """))
         else:
-            st.write(f"**Motivo:** {rej_appr.get('reason', UI_TEXTS.text_na)}")
-            st.write(f"**Reprovado por:** {rej_appr.get('rejected_by', UI_TEXTS.text_na)}")
+            blocks.append(('markdown', "\n\n".join([
+                f"**Motivo:** {rej_appr.get('reason', UI_TEXTS.text_na)}",
+                f"**Reprovado por:** {rej_appr.get('rejected_by', UI_TEXTS.text_na)}",
+            ])))
 
     if notification.get('rejection_execution_review'):
-        st.markdown("#### 🔄 Execução Rejeitada (Revisão do Classificador)")
+        blocks.append(('markdown', "#### 🔄 Execução Rejeitada (Revisão do Classificador)"))
         rej_exec_review = notification['rejection_execution_review']
         if user_username_logged_in and rej_exec_review.get('reviewed_by') == user_username_logged_in:
-            st.markdown(f"""
+            blocks.append(('html', f"""
             <div style='background-color: #ffe6e6; padding: 10px; border-radius: 5px; border-left: 3px solid #f44336;'>
                 <strong>Motivo:</strong> {rej_exec_review.get('reason', UI_TEXTS.text_na)}
                 <br>
                 <strong>Rejeitado por:</strong> VOCÊ ({rej_exec_review.get('reviewed_by', UI_TEXTS.text_na)})
             </div>
-            """, unsafe_allow_html=True)
+            """))
         else:
-            st.write(f"**Motivo:** {rej_exec_review.get('reason', UI_TEXTS.text_na)}")
-            st.write(f"**Rejeitado por:** {rej_exec_review.get('reviewed_by', UI_TEXTS.text_na)}")
+            blocks.append(('markdown', "\n\n".join([
+                f"**Motivo:** {rej_exec_review.get('reason', UI_TEXTS.text_na)}",
+                f"**Rejeitado por:** {rej_exec_review.get('reviewed_by', UI_TEXTS.text_na)}",
+            ])))
 
     if notification.get('attachments'):
-        st.markdown("#### 📎 Anexos")
+        attachments = []
         for attach_info in notification['attachments']:
-            unique_name_to_use = None
-            original_name_to_use = None
-            if isinstance(attach_info, dict) and 'unique_name' in attach_info and 'original_name' in attach_info:
-                unique_name_to_use = attach_info['unique_name']
-                original_name_to_use = attach_info['original_name']
+            if isinstance(attach_info, (dict, Attachment)) and 'unique_name' in attach_info and 'original_name' in attach_info:
+                attachments.append((attach_info['unique_name'], attach_info['original_name'], attach_info.get('status')))
             elif isinstance(attach_info, str):  # Fallback para compatibilidade antiga
-                unique_name_to_use = attach_info
-                original_name_to_use = attach_info
-            if unique_name_to_use:
-                file_content = get_attachment_data(unique_name_to_use)
+                attachments.append((attach_info, attach_info, None))
+        blocks.append(('markdown', "#### 📎 Anexos"))
+        blocks.append(('attachments', [attachment for attachment in attachments if attachment[0]]))
+
+    blocks.append(('markdown', "---"))
+    return blocks
+
+
+def display_notification_full_details(notification: Dict, user_id_logged_in: Optional[int] = None,
+                                      user_username_logged_in: Optional[str] = None):
+    """
+    Exibe os detalhes completos de uma notificação.
+    Os blocos de texto ficam no cache de renderização, com chave pela versão da linha e pelo usuário
+    (que muda os destaques "VOCÊ"); anexos, downloads e o status do prazo são renderizados a cada vez.
+    """
+    notification_id = notification.get('id')
+    row_version = notification.get('row_version')
+    cache_key = (notification_id, row_version, user_id_logged_in, user_username_logged_in)
+    render_cache = get_detail_render_cache()
+    blocks = render_cache.get(cache_key) if row_version is not None else None
+    if blocks is None:
+        blocks = _build_notification_detail_blocks(notification, user_id_logged_in, user_username_logged_in)
+        if row_version is not None:
+            render_cache.put(cache_key, blocks)
+
+    for kind, content in blocks:
+        if kind == 'markdown':
+            st.markdown(content)
+        elif kind == 'html':
+            st.markdown(content, unsafe_allow_html=True)
+        elif kind == 'info':
+            st.info(content)
+        elif kind == 'success':
+            st.success(content)
+        elif kind == 'columns':
+            reported_md, management_md, (deadline_date_str, completion_timestamp_str) = content
+            col_det1, col_det2 = st.columns(2)
+            with col_det1:
+                st.markdown(reported_md)
+            with col_det2:
+                st.markdown(management_md)
+                if deadline_date_str:
+                    deadline_date_formatted = format_datetime_display(deadline_date_str, '%d/%m/%Y')
+                    deadline_status = get_deadline_status(deadline_date_str, completion_timestamp_str)
+                    st.markdown(
+                        f"**Prazo de Conclusão:** {deadline_date_formatted} (<span class='{deadline_status['class']}'>{deadline_status['text']}</span>)",
+                        unsafe_allow_html=True)
+                else:
+                    st.write(f"**Prazo de Conclusão:** {UI_TEXTS.deadline_days_nan}")
+        elif kind == 'evidence':
+            for unique_name, original_name in content:
+                display_attachment_preview(unique_name, original_name)
+                file_content = get_attachment_data(unique_name)
+                if file_content:
+                    st.download_button(
+                        label=f"Baixar Evidência: {original_name}",
+                        data=file_content,
+                        file_name=original_name,
+                        mime="application/octet-stream",
+                        key=f"download_action_evidence_{notification_id}_{unique_name}"
+                    )
+                else:
+                    st.write(f"Anexo: {original_name} (arquivo não encontrado ou corrompido)")
+        elif kind == 'attachments':
+            for unique_name, original_name, status in content:
+                display_attachment_status(status, original_name)
+                display_attachment_preview(unique_name, original_name)
+                file_content = get_attachment_data(unique_name)
                 if file_content:
                     st.download_button(
-                        label=f"Baixar {original_name_to_use}",
+                        label=f"Baixar {original_name}",
                         data=file_content,
-                        file_name=original_name_to_use,
+                        file_name=original_name,
                         mime="application/octet-stream",
-                        key=f"download_closed_{notification['id']}_{unique_name_to_use}"
+                        key=f"download_closed_{notification_id}_{unique_name}"
                     )
                 else:
-                    st.write(f"Anexo: {original_name_to_use} (arquivo não encontrado ou corrompido)")
+                    st.write(f"Anexo: {original_name} (arquivo não encontrado ou corrompido)")
 
-    st.markdown("---")
+
+def display_notification_details_on_demand(notification_summary: Dict, key_prefix: str,
+                                           user_id_logged_in: Optional[int] = None,
+                                           user_username_logged_in: Optional[str] = None):
+    """
+    Exibe os detalhes completos de uma notificação listada a partir do seu resumo.
+    O conteúdo de um st.expander é executado mesmo fechado, então a carga completa
+    (load_notification_detail) só acontece depois que o usuário pede os detalhes.
+    """
+    notification_id = notification_summary.get('id')
+    loaded_key = f"details_loaded_{key_prefix}_{notification_id}"
+    if not st.session_state.get(loaded_key):
+        if not st.button("📄 Carregar detalhes completos", key=f"btn_{loaded_key}"):
+            return
+        st.session_state[loaded_key] = True
+
+    notification = load_notification_detail(notification_id)
+    if notification:
+        display_notification_full_details(notification, user_id_logged_in, user_username_logged_in)
+    else:
+        st.warning(f"⚠️ Não foi possível carregar os detalhes da notificação #{notification_id}.")
 
 
 @st_fragment
@@ -1736,14 +2368,16 @@ def show_create_notification():
                 ✅ Notificação Enviada com Sucesso! 😊
             </h1>
             <p style="font-size: 1.2em; color: #555;">
-                Obrigado pela sua participação! Voltando para um novo formulário...
+                Obrigado pela sua participação!
             </p>
         </div>
         """, unsafe_allow_html=True)
-        time_module.sleep(2)
-        _reset_form_state()  # Limpa o formulário para uma nova notificação
-        st.session_state.form_step = 1 # Reinicia a aplicação para a primeira etapa do formulário
-        st.rerun() # CORREÇÃO: Força o re-render
+        # Sem espera bloqueante: o envio termina na hora e o usuário inicia o próximo formulário quando quiser
+        if st.button("📝 Enviar Nova Notificação", key="create_new_after_success", use_container_width=True):
+            _reset_form_state()  # Limpa o formulário para uma nova notificação
+            st.session_state.form_step = 1 # Reinicia a aplicação para a primeira etapa do formulário
+            st.rerun() # CORREÇÃO: Força o re-render
+        return
 # Se não estiver na etapa de sucesso, exibe as etapas normais do formulário
     st.markdown(f"### Etapa {st.session_state.form_step}") # CORREÇÃO: Acessa diretamente
 
@@ -2122,11 +2756,12 @@ def show_classification():
     st.info(
         "📋 Nesta área, você pode realizar a classificação inicial de novas notificações e revisar a execução das ações concluídas pelos responsáveis.")
 
-    all_notifications = load_notifications()  # Carrega do DB
-    pending_initial_classification = [n for n in all_notifications if n.get('status') == "pendente_classificacao"]
-    pending_execution_review = [n for n in all_notifications if n.get('status') == "revisao_classificador_execucao"]
+    # Filas abertas direto da tabela quente; as encerradas (inclusive arquivadas) vêm do índice de resumos
+    open_notifications = load_worklist_summaries(['pendente_classificacao', 'revisao_classificador_execucao'])
+    pending_initial_classification = [n for n in open_notifications if n.get('status') == "pendente_classificacao"]
+    pending_execution_review = [n for n in open_notifications if n.get('status') == "revisao_classificador_execucao"]
     closed_statuses = ['aprovada', 'rejeitada', 'reprovada', 'concluida']
-    closed_notifications = [n for n in all_notifications if n.get('status') in closed_statuses]
+    closed_notifications = [n for n in load_notification_summaries() if n.get('status') in closed_statuses]
 
     if not pending_initial_classification and not pending_execution_review and not closed_notifications:
         st.info(
@@ -2144,42 +2779,49 @@ def show_classification():
         if not pending_initial_classification:
             st.info("✅ Não há notificações aguardando classificação inicial no momento.")
         else:
-            st.markdown("#### 📋 Selecionar Notificação para Classificação Inicial")
-            notification_options_initial = [UI_TEXTS.selectbox_default_notification_select] + [
-                f"#{n['id']} | Criada em: {n.get('created_at', UI_TEXTS.text_na)[:10]} | {n.get('title', 'Sem título')[:60]}..."
-                for n in pending_initial_classification
-            ]
-
-            pending_initial_ids_str = ",".join(str(n['id']) for n in pending_initial_classification)
-            selectbox_key_initial = f"classify_selectbox_initial_{pending_initial_ids_str}"
-            if selectbox_key_initial not in st.session_state or st.session_state[
-                selectbox_key_initial] not in notification_options_initial:
-                previous_selection = st.session_state.get(selectbox_key_initial, notification_options_initial[0])
-                if previous_selection in notification_options_initial:
-                    st.session_state[selectbox_key_initial] = previous_selection
+            st.markdown("#### 📋 Fila de Classificação Inicial")
+            user_id_logged_in = st.session_state.user.get('id')
+            claim = st.session_state.get('classification_claim')
+            if claim and datetime.now(timezone.utc) > claim['expires_at'] - timedelta(minutes=CLAIM_LEASE_MINUTES / 2):
+                # Renova a reserva só depois da metade do prazo, para não escrever no banco a cada rerun
+                new_expires_at = renew_classification_claim(claim['id'], user_id_logged_in)
+                if new_expires_at:
+                    claim['expires_at'] = new_expires_at
                 else:
-                    st.session_state[selectbox_key_initial] = notification_options_initial[0]
-
-            selected_option_initial = st.selectbox(
-                "Escolha uma notificação para analisar e classificar inicial:",
-                options=notification_options_initial,
-                index=notification_options_initial.index(st.session_state[selectbox_key_initial]),
-                key=selectbox_key_initial,
-                help="Selecione na lista a notificação pendente que você deseja classificar.")
-            notification_id_initial = None
-            notification_initial = None
-
-            if selected_option_initial != UI_TEXTS.selectbox_default_notification_select:
-                try:
-                    parts = selected_option_initial.split('#')
-                    if len(parts) > 1:
-                        id_part = parts[1].split(' |')[0]
-                        notification_id_initial = int(id_part)
-                        notification_initial = next(
-                            (n for n in all_notifications if n.get('id') == notification_id_initial), None)
-                except (IndexError, ValueError):
-                    st.error("Erro ao processar a seleção da notificação para classificação inicial.")
-                    notification_initial = None
+                    st.warning(
+                        f"⚠️ A reserva da notificação #{claim['id']} expirou e ela foi assumida por outro classificador ou já foi tratada.")
+                    _drop_classification_claim_state(claim['id'])
+                    claim = None
+
+            if not claim:
+                queue_counts_initial = load_classification_queue_counts()
+                if queue_counts_initial:
+                    st.write(
+                        f"**{queue_counts_initial['available']}** notificação(ões) livre(s) na fila · "
+                        f"**{queue_counts_initial['claimed']}** em análise por outros classificadores.")
+                if st.button("▶️ Próxima notificação", key="claim_next_classification_btn", use_container_width=True,
+                             help="Reserva para você a próxima notificação da fila (óbito e paciente envolvido primeiro, depois as mais antigas)."):
+                    new_claim = claim_next_classification(user_id_logged_in)
+                    if new_claim:
+                        st.session_state.classification_claim = {'id': new_claim[0], 'expires_at': new_claim[1]}
+                        st.rerun()
+                    else:
+                        st.info("✅ Nenhuma notificação livre na fila no momento.")
+
+            notification_id_initial = claim['id'] if claim else None
+            notification_initial = load_notification_detail(notification_id_initial) if notification_id_initial else None
+            if claim:
+                col_claim_info, col_claim_release = st.columns([3, 1])
+                with col_claim_info:
+                    st.caption(
+                        f"🔒 Notificação #{claim['id']} reservada para você até "
+                        f"{format_datetime_display(claim['expires_at'].astimezone(), '%H:%M')} "
+                        f"(a reserva é renovada enquanto você trabalha nela).")
+                with col_claim_release:
+                    if st.button("↩️ Devolver à fila", key="release_classification_claim_btn", use_container_width=True):
+                        release_classification_claim(claim['id'], user_id_logged_in)
+                        _drop_classification_claim_state(claim['id'])
+                        st.rerun()
             if notification_id_initial and (
                     st.session_state.get('current_initial_classification_id') != notification_id_initial):
                 # Se uma nova notificação foi selecionada, inicializa seu estado de classificação
@@ -2272,13 +2914,16 @@ def show_classification():
                             unique_name_to_use = None
                             original_name_to_use = None
                             if isinstance(attach_info,
-                                          dict) and 'unique_name' in attach_info and 'original_name' in attach_info:
+                                          (dict, Attachment)) and 'unique_name' in attach_info and 'original_name' in attach_info:
                                 unique_name_to_use = attach_info['unique_name']
                                 original_name_to_use = attach_info['original_name']
                             elif isinstance(attach_info, str):
                                 unique_name_to_use = attach_info
                                 original_name_to_use = attach_info
                             if unique_name_to_use:
+                                display_attachment_status(
+                                    None if isinstance(attach_info, str) else attach_info.get('status'), original_name_to_use)
+                                display_attachment_preview(unique_name_to_use, original_name_to_use)
                                 file_content = get_attachment_data(unique_name_to_use)
                                 if file_content:
                                     st.download_button(
@@ -2553,16 +3198,56 @@ def show_classification():
                         st.markdown("<span class='required-field'>* Campo obrigatório</span>", unsafe_allow_html=True)
                         st.markdown("---")
 
-                        executors = get_users_by_role('executor')
+                        # A mesma consulta agregada traz os executores ativos e a carga de cada um
+                        selected_notified_department = current_data.get('temp_notified_department')
+                        if selected_notified_department == UI_TEXTS.selectbox_default_department_select:
+                            selected_notified_department = None
+                        executors = load_executor_workload(selected_notified_department)
                         executor_options = {
                             f"{e.get('name', UI_TEXTS.text_na)} ({e.get('username', UI_TEXTS.text_na)})": e['id']
                             for e in executors
                         }
+                        executors_multiselect_key = f"executors_multiselect_{notification_id_initial}_step7_initial_refactored"
+
+                        suggested_executors = suggest_executors(executors)
+                        if suggested_executors:
+                            suggested_names = [
+                                f"{e.get('name', UI_TEXTS.text_na)} ({e.get('username', UI_TEXTS.text_na)})"
+                                for e in suggested_executors
+                            ]
+                            suggestion_details = "; ".join(
+                                f"**{name}** — {e['open_count']} em aberto, {e['overdue_count']} atrasada(s), "
+                                f"{e['due_soon_count']} vencendo em breve"
+                                for name, e in zip(suggested_names, suggested_executors)
+                            )
+                            suggestion_scope = (f"no setor {selected_notified_department}"
+                                                if selected_notified_department and suggested_executors[0]['department_count']
+                                                else "entre todos os executores")
+                            st.info(f"💡 Sugestão de menor carga {suggestion_scope}: {suggestion_details}")
+
+                            def _assign_suggested_executors(names=suggested_names, data=current_data,
+                                                            widget_key=executors_multiselect_key):
+                                data['executores_selecionados'] = list(names)
+                                # Remove o estado do widget para que ele seja recriado com a nova seleção padrão
+                                st.session_state.pop(widget_key, None)
+
+                            st.button("✨ Atribuir sugestão", key=f"assign_suggested_executors_{notification_id_initial}",
+                                      on_click=_assign_suggested_executors)
+                            with st.expander("📊 Carga de trabalho dos executores"):
+                                st.dataframe(pd.DataFrame([{
+                                    'Executor': f"{e.get('name', UI_TEXTS.text_na)} ({e.get('username', UI_TEXTS.text_na)})",
+                                    'Em aberto': e['open_count'],
+                                    'Atrasadas': e['overdue_count'],
+                                    'Vencendo em breve': e['due_soon_count'],
+                                    'Já atendeu o setor': e['department_count'],
+                                } for e in executors]), hide_index=True, use_container_width=True)
 
                         executor_display_options = [UI_TEXTS.multiselect_instruction_placeholder] + list(
                             executor_options.keys())
+                        # executores_selecionados guarda os rótulos exibidos (o submit os converte para ids)
                         default_executor_selection = [
                             name for name, uid in executor_options.items() if
+                            name in current_data.get('executores_selecionados', []) or
                             uid in current_data.get('executores_selecionados', [])
                         ]
                         if not default_executor_selection or not any(
@@ -2572,7 +3257,7 @@ def show_classification():
                             UI_TEXTS.multiselect_assign_executors_label,
                             options=executor_display_options,
                             default=default_executor_selection,
-                            key=f"executors_multiselect_{notification_id_initial}_step7_initial_refactored",
+                            key=executors_multiselect_key,
                             help="Selecione os usuários que serão responsáveis pela execução das ações corretivas/preventivas.")
                         current_data['executores_selecionados'] = [
                             opt for opt in selected_executor_names_raw if
@@ -2667,10 +3352,9 @@ def show_classification():
                     if current_step <= 7:
                         if st.button("🚫 Cancelar Classificação", use_container_width=True,
                                      key=f"cancel_btn_{notification_id_initial}_step{current_step}_initial_refactored"):
-                            st.session_state.initial_classification_state.pop(notification_id_initial,
-                                                                              None)
-                            st.session_state.pop('current_initial_classification_id', None)
-                            st.info(f"A classificação inicial da notificação #{notification_id_initial} foi cancelada.")
+                            release_classification_claim(notification_id_initial, st.session_state.user.get('id'))
+                            _drop_classification_claim_state(notification_id_initial)
+                            st.info(f"A classificação inicial da notificação #{notification_id_initial} foi cancelada e voltou para a fila.")
                             st.rerun() # CORREÇÃO: Força o re-render
                 with col_next_submit_initial:
                     if current_step < 7 and current_data.get('procede') != 'Não':
@@ -2813,20 +3497,23 @@ def show_classification():
                                             "classification": None,  # Limpa classificação
                                             "executors": [],  # Limpa executores
                                             "approver": None,  # Limpa aprovador
+                                            "claimed_by": None,  # Encerra a reserva da fila
+                                            "claim_expires_at": None,
                                             "rejection_classification": {  # Adiciona motivo da rejeição
                                                 "reason": current_data.get('motivo_rejeicao'),
                                                 "classified_by": user_username,
                                                 "timestamp": datetime.now().isoformat()
                                             }
                                         }
-                                        update_notification(notification_id_initial, updates)  # Atualiza no DB
-                                        add_history_entry(  # Adiciona histórico no DB
+                                        history = HistoryWriter()
+                                        history.add(
                                             notification_id_initial, "Notificação rejeitada na Classificação Inicial",
                                             user_name,
                                             f"Motivo da rejeição: {current_data.get('motivo_rejeicao', '')[:200]}..." if len(
                                                 current_data.get('motivo_rejeicao',
                                                                  '')) > 200 else f"Motivo da rejeição: {current_data.get('motivo_rejeicao', '')}"
                                         )
+                                        update_notification(notification_id_initial, updates, history=history)  # Atualiza no DB, com o histórico
                                         st.success(f"✅ Notificação #{notification_id_initial} rejeitada com sucesso!")
                                         st.info(
                                             "Você será redirecionado para a lista atualizada de notificações pendentes.")
@@ -2885,6 +3572,8 @@ def show_classification():
                                         updates = {
                                             "status": "classificada",
                                             "classification": classification_data_to_save,
+                                            "classified_at": datetime.fromisoformat(
+                                                classification_data_to_save["classification_timestamp"]),
                                             "rejection_classification": None,
                                             "executors": selected_executor_ids_for_db,
                                             "approver": current_data.get('approver_selecionado') if current_data.get(
@@ -2892,9 +3581,11 @@ def show_classification():
                                             # Adicionado para salvar o setor notificado ajustado
                                             "notified_department": current_data.get('temp_notified_department'),
                                             "notified_department_complement": current_data.get(
-                                                'temp_notified_department_complement')
+                                                'temp_notified_department_complement'),
+                                            # Encerra a reserva da fila
+                                            "claimed_by": None,
+                                            "claim_expires_at": None
                                         }
-                                        update_notification(notification_id_initial, updates)  # Atualiza no DB
                                         details_hist = f"Classificação NNC: {classification_data_to_save['nnc']}, Prioridade: {classification_data_to_save.get('prioridade', UI_TEXTS.text_na)}"
                                         if classification_data_to_save["nnc"] == "Evento com dano" and \
                                                 classification_data_to_save["nivel_dano"]:
@@ -2931,22 +3622,22 @@ def show_classification():
                                         details_hist += f", Setor Notificado: {notified_dept_hist}"
                                         if notified_comp_hist:
                                             details_hist += f" ({notified_comp_hist})"
-                                        add_history_entry(  # Adiciona histórico no DB
+                                        history = HistoryWriter()
+                                        history.add(
                                             notification_id_initial, "Notificação classificada e atribuída",
                                             user_name, details_hist
                                         )
+                                        update_notification(notification_id_initial, updates, history=history)  # Atualiza no DB, com o histórico
                                         st.success(
                                             f"✅ Notificação #{notification_id_initial} classificada e atribuída com sucesso!")
                                         st.info(
                                             "A notificação foi movida para a fase de execução e atribuída aos responsáveis.")
-                                    st.session_state.initial_classification_state.pop(notification_id_initial,
-                                                                                      None)
-                                    st.session_state.pop('current_initial_classification_id', None)
+                                    _drop_classification_claim_state(notification_id_initial)
                                     st.rerun() # CORREÇÃO: Força o re-render
 
             else:
-                if pending_initial_classification:
-                    st.info(f"👆 Selecione uma notificação da lista acima para visualizar e iniciar a classificação.")
+                if pending_initial_classification and not claim:
+                    st.info(f"👆 Use \"Próxima notificação\" para reservar e classificar o próximo item da fila.")
 
     with tab_review_exec:
         st.markdown("### Notificações Aguardando Revisão da Execução")
@@ -2985,8 +3676,7 @@ def show_classification():
                     if len(parts) > 1:
                         id_part = parts[1].split(' |')[0]
                         notification_id_review = int(id_part)
-                        notification_review = next(
-                            (n for n in all_notifications if n.get('id') == notification_id_review), None)
+                        notification_review = load_notification_detail(notification_id_review)
                 except (IndexError, ValueError):
                     st.error("Erro ao processar a seleção da notificação para revisão.")
                     notification_review = None
@@ -3077,7 +3767,7 @@ def show_classification():
                     st.write(f"**Classificado por:** {classif_review.get('classificador', UI_TEXTS.text_na)}")
 # Exibição do Prazo e Status na Revisão
                     if deadline_date_str:
-                        deadline_date_formatted = datetime.fromisoformat(deadline_date_str).strftime('%d/%m/%Y')
+                        deadline_date_formatted = format_datetime_display(deadline_date_str, '%d/%m/%Y')
                         st.markdown(
                             f"**Prazo de Conclusão:** {deadline_date_formatted} (<span class='{deadline_status['class']}'>{deadline_status['text']}</span>)",
                             unsafe_allow_html=True)
@@ -3085,17 +3775,11 @@ def show_classification():
                         st.write(f"**Prazo de Conclusão:** {UI_TEXTS.deadline_days_nan}")
                 st.markdown("---")
                 st.markdown("#### ⚡ Ações Executadas pelos Responsáveis")
-                if notification.get('actions'):
-                    for action in sorted(notification['actions'], key=lambda x: x.get('timestamp', '')):
+                if notification_review.get('actions'):
+                    for action in notification_review['actions']:  # Já vêm ordenadas por action_timestamp do banco
                         action_type = "🏁 CONCLUSÃO (Executor)" if action.get(
                             'final_action_by_executor') else "📝 AÇÃO Registrada"
-                        action_timestamp = action.get('timestamp', UI_TEXTS.text_na)
-                        if action_timestamp != UI_TEXTS.text_na:
-                            try:
-                                action_timestamp = datetime.fromisoformat(action_timestamp).strftime(
-                                    '%d/%m/%Y %H:%M:%S')
-                            except ValueError:
-                                pass
+                        action_timestamp = format_datetime_display(action.get('timestamp'))
                         st.markdown(f"""
                                    <strong>{action_type}</strong> - por <strong>{action.get('executor_name', UI_TEXTS.text_na)}</strong> em {action_timestamp}
                                    <br>
@@ -3115,6 +3799,7 @@ def show_classification():
                                         unique_name = attach_info.get('unique_name')
                                         original_name = attach_info.get('original_name')
                                         if unique_name and original_name:
+                                            display_attachment_preview(unique_name, original_name)
                                             file_content = get_attachment_data(unique_name)
                                             if file_content:
                                                 st.download_button(
@@ -3150,13 +3835,16 @@ def show_classification():
                         unique_name_to_use = None
                         original_name_to_use = None
                         if isinstance(attach_info,
-                                      dict) and 'unique_name' in attach_info and 'original_name' in attach_info:
+                                      (dict, Attachment)) and 'unique_name' in attach_info and 'original_name' in attach_info:
                             unique_name_to_use = attach_info['unique_name']
                             original_name_to_use = attach_info['original_name']
                         elif isinstance(attach_info, str):
                             unique_name_to_use = attach_info
                             original_name_to_use = attach_info
                         if unique_name_to_use:
+                            display_attachment_status(
+                                None if isinstance(attach_info, str) else attach_info.get('status'), original_name_to_use)
+                            display_attachment_preview(unique_name_to_use, original_name_to_use)
                             file_content = get_attachment_data(unique_name_to_use)
                             if file_content:
                                 st.download_button(
@@ -3230,6 +3918,7 @@ def show_classification():
                             if review_decision_state == "Rejeitar Conclusão":
                                 review_details_to_save['rejection_reason'] = current_review_data.get(
                                     'rejection_reason_review')
+                            history = HistoryWriter()
                             if review_decision_state == "Aceitar Conclusão":
                                 original_classification = notification_review.get('classification', {})
                                 requires_approval_after_execution = original_classification.get('requires_approval')
@@ -3239,7 +3928,7 @@ def show_classification():
                                         'status': new_status,
                                         'review_execution': review_details_to_save
                                     }
-                                    add_history_entry(
+                                    history.add(
                                         notification_id_review, "Revisão de Execução: Conclusão Aceita",
                                         user_name,
                                         f"Execução aceita pelo classificador. Encaminhada para aprovação superior." + (
@@ -3259,7 +3948,7 @@ def show_classification():
                                         },
                                         'approver': None  # Remove aprovador se não precisa de aprovação
                                     }
-                                    add_history_entry(
+                                    history.add(
                                         notification_id_review, "Revisão de Execução: Conclusão Aceita e Finalizada",
                                         user_name,
                                         f"Execução revisada e aceita pelo classificador. Ciclo de gestão do evento concluído (não requeria aprovação superior)." + (
@@ -3273,6 +3962,7 @@ def show_classification():
                                     'approver': None,
                                     'executors': [],
                                     'classification': None,
+                                    'classified_at': None,
                                     'review_execution': None,  # Limpa revisão
                                     'approval': None,
                                     'conclusion': None,
@@ -3282,7 +3972,7 @@ def show_classification():
                                         'timestamp': datetime.now().isoformat()
                                     }
                                 }
-                                add_history_entry(
+                                history.add(
                                     notification_id_review,
                                     "Revisão de Execução: Conclusão Rejeitada e Reclassificação Necessária",
                                     user_name,
@@ -3294,7 +3984,7 @@ def show_classification():
                                     f"⚠️ Execução da Notificação #{notification_id_review} rejeitada! Devolvida para classificação inicial para reanálise e reatribuição.")
                                 st.info(
                                     "A notificação foi movida para o status 'pendente_classificacao' e aparecerá na aba 'Pendentes Classificação Inicial' para que a equipe de classificação possa reclassificá-la e redefinir o fluxo.")
-                            update_notification(notification_id_review, updates)  # Atualiza no DB
+                            update_notification(notification_id_review, updates, history=history)  # Atualiza no DB, com o histórico
                             st.session_state.review_classification_state.pop(notification_id_review, None)
                             st.session_state.pop('current_review_classification_id', None)
                             st.rerun() # CORREÇÃO: Força o re-render
@@ -3316,11 +4006,11 @@ def show_classification():
             ).lower()
             filtered_closed_notifications = []
             if search_query:
+                matching_ids = search_notification_ids(search_query)
                 for notif in closed_notifications:
                     if search_query.isdigit() and int(search_query) == notif.get('id'):
                         filtered_closed_notifications.append(notif)
-                    elif (search_query in notif.get('title', '').lower() or
-                          search_query in notif.get('description', '').lower()):
+                    elif notif.get('id') in matching_ids:
                         filtered_closed_notifications.append(notif)
             else:
                 filtered_closed_notifications = closed_notifications
@@ -3329,16 +4019,10 @@ def show_classification():
                 st.warning(
                     "⚠️ Nenhuma notificação encontrada com os critérios de busca especificados.")
             else:
-                filtered_closed_notifications.sort(key=lambda x: x.get('created_at', ''), reverse=True)
                 st.markdown(f"**Notificações Encontradas ({len(filtered_closed_notifications)})**:")
                 for notification in filtered_closed_notifications:
                     status_class = f"status-{notification.get('status', UI_TEXTS.text_na).replace('_', '-')}"
-                    created_at_str = notification.get('created_at', UI_TEXTS.text_na)
-                    if created_at_str != UI_TEXTS.text_na:
-                        try:
-                            created_at_str = datetime.fromisoformat(created_at_str).strftime('%d/%m/%Y %H:%M:%S')
-                        except ValueError:
-                            pass
+                    created_at_str = format_datetime_display(notification.get('created_at'))
                     concluded_by = UI_TEXTS.text_na
                     if notification.get('conclusion') and notification['conclusion'].get('concluded_by'):
                         concluded_by = notification['conclusion']['concluded_by']
@@ -3376,8 +4060,9 @@ def show_classification():
                             """, unsafe_allow_html=True)
                     with st.expander(
                             f"👁️ Visualizar Detalhes - Notificação #{notification.get('id', UI_TEXTS.text_na)}"):
-                        display_notification_full_details(notification, st.session_state.user.get('id'),
-                                                          st.session_state.user.get('username'))
+                        display_notification_details_on_demand(notification, "classif_closed",
+                                                               st.session_state.user.get('id'),
+                                                               st.session_state.user.get('username'))
 
 
 @st_fragment
@@ -3389,7 +4074,6 @@ def show_execution():
     st.markdown("<h1 class='main-header'>⚡ Execução de Notificações</h1>", unsafe_allow_html=True)
     st.info(
         "Nesta página, você pode visualizar as notificações atribuídas a você, registrar as ações executadas e marcar sua parte como concluída.")
-    all_notifications = load_notifications()  # Carrega do DB
     user_id_logged_in = st.session_state.user.get('id')
     user_username_logged_in = st.session_state.user.get('username')
 
@@ -3399,27 +4083,12 @@ def show_execution():
         for user in all_users
     }
 
-    user_active_notifications = []
     active_execution_statuses = ['classificada', 'em_execucao']
-    for notification in all_notifications:
-        is_assigned_to_current_user = False
-        assigned_executors_raw = notification.get('executors', [])
-        for executor_entry in assigned_executors_raw:  # assigned_executors_raw agora é uma lista de IDs inteiros
-            if isinstance(executor_entry, int) and executor_entry == user_id_logged_in:
-                is_assigned_to_current_user = True
-                break
-            # Remover ou ajustar a lógica para o caso de string se os IDs estiverem sempre em int
-            # elif isinstance(executor_entry, str):
-            #     resolved_id = display_name_to_id_map.get(executor_entry)
-            #     if resolved_id == user_id_logged_in:
-            #         is_assigned_to_current_user = True
-            #         break
-
-        if is_assigned_to_current_user and notification.get('status') in active_execution_statuses:
-            user_active_notifications.append(notification)
+    # Fila aberta do executor direto da tabela quente; as encerradas (inclusive arquivadas) vêm do índice
+    user_active_notifications = load_worklist_summaries(active_execution_statuses, executor_id=user_id_logged_in)
     closed_statuses = ['aprovada', 'rejeitada', 'reprovada', 'concluida']
     closed_my_exec_notifications = [
-        n for n in all_notifications
+        n for n in load_notification_summaries()
         if n.get('status') in closed_statuses and user_id_logged_in in n.get('executors', [])
         # IDs dos executores são inteiros
     ]
@@ -3437,9 +4106,11 @@ def show_execution():
         priority_order = {p: i for i, p in enumerate(FORM_DATA.prioridades)}
         user_active_notifications.sort(key=lambda x: (
             priority_order.get(x.get('classification', {}).get('prioridade', 'Baixa'), len(FORM_DATA.prioridades)),
-            datetime.fromisoformat(x.get('created_at', '1900-01-01T00:00:00')).timestamp()
+            x.get('created_at') or MIN_TIMESTAMP
         ))
 
+        # Ações de todos os cards numa única consulta: servem ao histórico e à checagem de conclusão
+        actions_by_notification = load_actions_by_notification([n['id'] for n in user_active_notifications])
         for notification in user_active_notifications:
             status_class = f"status-{notification.get('status', UI_TEXTS.text_na).replace('_', '-')}"
             classif_info = notification.get('classification') or {}
@@ -3465,24 +4136,19 @@ def show_execution():
 # --- NOVO CARD EXPANSÍVEL: Detalhes Completos da Notificação e Classificação ---
             with st.expander(
                     f"✨ Ver Detalhes Completos e Classificação - Notificação #{notification.get('id', UI_TEXTS.text_na)}"):
-                display_notification_full_details(notification, user_id_logged_in, user_username_logged_in)
+                display_notification_details_on_demand(notification, "exec_active", user_id_logged_in,
+                                                       user_username_logged_in)
             # --- FIM DO NOVO CARD EXPANSÍVEL ---
+            notif_actions = actions_by_notification.get(notification.get('id'), [])
 # NOVO: Card para exibir ações recentes para esta notificação
-            if notification.get('actions'):
+            if notif_actions:
                 st.markdown("#### ⚡ Histórico de Ações Realizadas")
                 with st.expander(
                         f"Ver histórico de ações para Notificação #{notification.get('id', UI_TEXTS.text_na)}"):
-                    sorted_actions = sorted(notification['actions'], key=lambda x: x.get('timestamp', ''))
-                    for action in sorted_actions:
+                    for action in notif_actions:  # Já vêm ordenadas por action_timestamp do banco
                         action_type = "🏁 CONCLUSÃO (Executor)" if action.get(
                             'final_action_by_executor') else "   AÇÃO Registrada"
-                        action_timestamp = action.get('timestamp', UI_TEXTS.text_na)
-                        if action_timestamp != UI_TEXTS.text_na:
-                            try:
-                                action_timestamp = datetime.fromisoformat(action_timestamp).strftime(
-                                    '%d/%m/%Y %H:%M:%S')
-                            except ValueError:
-                                pass
+                        action_timestamp = format_datetime_display(action.get('timestamp'))
                         if user_id_logged_in and action.get('executor_id') == user_id_logged_in:
                             st.markdown(f"""
                             <div class='my-action-entry-card'>
@@ -3513,6 +4179,7 @@ def show_execution():
                                         unique_name = attach_info.get('unique_name')
                                         original_name = attach_info.get('original_name')
                                         if unique_name and original_name:
+                                            display_attachment_preview(unique_name, original_name)
                                             file_content = get_attachment_data(unique_name)
                                             if file_content:
                                                 st.download_button(
@@ -3530,8 +4197,6 @@ def show_execution():
             # FIM DO NOVO CARD DE HISTÓRICO DE AÇÕES
             executor_has_already_concluded_their_part = False
             if user_id_logged_in:
-                # Agora buscando as ações do DB
-                notif_actions = get_notification_actions(notification.get('id'))
                 for action_entry in notif_actions:
                     if action_entry.get('executor_id') == user_id_logged_in and action_entry.get(
                             'final_action_by_executor') == True:
@@ -3605,22 +4270,13 @@ def show_execution():
                             for error in validation_errors: st.warning(error)
                         else:
                             # Recarrega a notificação para ter a versão mais atualizada antes de modificar
-                            current_notification_in_list = next(
-                                (n for n in load_notifications() if n.get('id') == notification.get('id')), None)
+                            current_notification_in_list = load_notification_detail(notification.get('id'))
                             if not current_notification_in_list:
                                 st.error(
                                     "Erro interno: Notificação não encontrada na lista principal para atualização.")
                             else:
                                 # Re-verificação de conclusão final do executor diretamente no DB
-                                recheck_executor_already_concluded = False
-                                notif_actions_db = get_notification_actions(notification.get('id'))
-                                for existing_action_recheck in notif_actions_db:
-                                    if existing_action_recheck.get(
-                                            'executor_id') == user_id_logged_in and existing_action_recheck.get(
-                                        'final_action_by_executor') == True:
-                                        recheck_executor_already_concluded = True
-                                        break
-                                if recheck_executor_already_concluded:
+                                if load_executor_has_concluded(notification.get('id'), user_id_logged_in):
                                     st.error(
                                         "❌ Sua parte nesta notificação já foi marcada como concluída anteriormente. Operação abortada.")
                                     st.session_state[action_choice_key] = UI_TEXTS.selectbox_default_acao_realizar
@@ -3630,16 +4286,18 @@ def show_execution():
                                     saved_evidence_attachments = []
                                     if st.session_state[
                                         action_choice_key] == "Concluir Minha Parte" and uploaded_evidence_files:
-                                        for file in uploaded_evidence_files:
-                                            # Salva o arquivo no disco
-                                            saved_file_info = save_uploaded_file_to_disk(file, notification.get('id'))
-                                            if saved_file_info:
-                                                saved_evidence_attachments.append(saved_file_info)
+                                        # Conteúdo gravado na área de entrada; o processamento segue depois do commit
+                                        try:
+                                            saved_evidence_attachments = reserve_evidence_attachments(
+                                                uploaded_evidence_files, notification.get('id'))
+                                        except OSError as e:
+                                            st.error(f"❌ Erro ao gravar os arquivos de evidência: {e}")
+                                            st.stop()
                                     action_data_to_add = {
                                         'executor_id': user_id_logged_in,
                                         'executor_name': user_username_logged_in,
                                         'description': action_description_state,
-                                        'timestamp': datetime.now().isoformat(),
+                                        'timestamp': datetime.now(),
                                         'final_action_by_executor': st.session_state[
                                                                         action_choice_key] == "Concluir Minha Parte",
                                         'evidence_description': evidence_description_state if st.session_state[
@@ -3647,52 +4305,45 @@ def show_execution():
                                         'evidence_attachments': saved_evidence_attachments if st.session_state[
                                             action_choice_key] == "Concluir Minha Parte" else None
                                     }
-# Adiciona a ação no banco de dados
-                                    add_notification_action(notification['id'], action_data_to_add)
-                                    if st.session_state[action_choice_key] == "Registrar Ação":
+                                    is_final_action = st.session_state[action_choice_key] == "Concluir Minha Parte"
+                                    history = HistoryWriter()
+                                    updates_to_status = {}
+                                    if is_final_action:
+                                        history.add(
+                                            notification['id'],
+                                            "Execução concluída (por executor)",
+                                            user_username_logged_in,
+                                            f"Executor {user_username_logged_in} concluiu sua parte das ações."
+                                        )
+                                    else:
+                                        history.add(notification['id'],
+                                                    "Ação registrada (Execução)",
+                                                    user_username_logged_in,
+                                                    f"Registrou ação: {action_description_state[:100]}..." if len(
+                                                        action_description_state) > 100 else f"Registrou ação: {action_description_state}")
                                         if current_notification_in_list.get('status') == 'classificada':
-                                            # Atualiza o status no DB
-                                            update_notification(notification['id'], {'status': 'em_execucao'})
-                                        add_history_entry(notification['id'],
-                                                          "Ação registrada (Execução)",
-                                                          user_username_logged_in,
-                                                          f"Registrou ação: {action_description_state[:100]}..." if len(
-                                                              action_description_state) > 100 else f"Registrou ação: {action_description_state}")
+                                            updates_to_status['status'] = 'em_execucao'
+                                    # Ação, status e histórico gravados numa única transação
+                                    progress = record_execution_action(notification['id'], action_data_to_add,
+                                                                       history, updates_to_status)
+                                    if progress is None:
+                                        discard_evidence_attachments(saved_evidence_attachments)
+                                        st.stop()
+                                    submit_evidence_attachments(saved_evidence_attachments)
+                                    if not is_final_action:
                                         st.toast("✅ Ação registrada com sucesso!", icon="🎉")
-                                    elif st.session_state[action_choice_key] == "Concluir Minha Parte":
-                                        # Recarrega as ações para ter a lista atualizada do DB
-                                        all_actions_for_notif = get_notification_actions(notification['id'])
-                                        all_assigned_executors_ids = set(
-                                            current_notification_in_list.get('executors', []))
-                                        executors_who_concluded_ids = set(
-                                            a.get('executor_id') for a in all_actions_for_notif if
-                                            a.get('final_action_by_executor'))
-                                        all_executors_concluded = all_assigned_executors_ids.issubset(
-                                            executors_who_concluded_ids) and len(all_assigned_executors_ids) > 0
-                                        updates_to_status = {}
+                                    else:
+                                        all_executors_concluded, remaining_executors_ids = progress
                                         if all_executors_concluded:
-                                            updates_to_status['status'] = 'revisao_classificador_execucao'
                                             st.toast(
                                                 "✅ Todos os executores concluíram suas partes. Notificação encaminhada para revisão!",
                                                 icon="🏁")
                                         else:
                                             st.toast("✅ Sua execução foi concluída nesta notificação!", icon="✅")
-                                        history_details = f"Executor {user_username_logged_in} concluiu sua parte das ações."
-                                        add_history_entry(
-                                            notification['id'],
-                                            "Execução concluída (por executor)",
-                                            user_username_logged_in,
-                                            history_details
-                                        )
-# Atualiza apenas o status se necessário
-                                        if updates_to_status:
-                                            update_notification(notification['id'], updates_to_status)
                                         st.success(
                                             f"✅ Sua execução foi concluída nesta notificação! Status atual: '{current_notification_in_list['status'].replace('_', ' ').title()}'.")
                                         if not all_executors_concluded:
                                             users_list_exec = load_users()
-                                            remaining_executors_ids = list(
-                                                all_assigned_executors_ids - executors_who_concluded_ids)
                                             remaining_executors_names = [u.get('name', UI_TEXTS.text_na) for u in
                                                                          users_list_exec if
                                                                          u.get('id') in remaining_executors_ids]
@@ -3738,20 +4389,20 @@ def show_execution():
                                 if new_executor_name_to_add:
                                     new_executor_id = executor_options[new_executor_name_to_add]
                                     # Recarrega a notificação para ter a versão mais atualizada antes de modificar
-                                    current_notification_in_list = next(
-                                        (n for n in load_notifications() if n.get('id') == notification.get('id')), None)
+                                    current_notification_in_list = load_notification_detail(notification.get('id'))
                                     if current_notification_in_list:
                                         # Adiciona o novo executor à lista existente (no Python)
                                         updated_executors = current_notification_in_list.get('executors', []) + [
                                             new_executor_id]
                                         # Atualiza no DB
-                                        update_notification(notification.get('id'), {'executors': updated_executors})
-
-                                        add_history_entry(
+                                        history = HistoryWriter()
+                                        history.add(
                                             notification.get('id'), "Executor adicionado (durante execução)",
                                             user_username_logged_in,
                                             f"Adicionado o executor: {new_executor_name_to_add}"
                                         )
+                                        update_notification(notification.get('id'), {'executors': updated_executors},
+                                                            history=history)
                                         st.success(
                                             f"✅ {new_executor_name_to_add} adicionado como executor para esta notificação.")
                                         st.rerun() # CORREÇÃO: Força o re-render
@@ -3776,11 +4427,11 @@ def show_execution():
             ).lower()
             filtered_closed_my_exec_notifications = []
             if search_query_exec_closed:
+                matching_ids = search_notification_ids(search_query_exec_closed)
                 for notif in closed_my_exec_notifications:
                     if search_query_exec_closed.isdigit() and int(search_query_exec_closed) == notif.get('id'):
                         filtered_closed_my_exec_notifications.append(notif)
-                    elif (search_query_exec_closed in notif.get('title', '').lower() or
-                          search_query_exec_closed in notif.get('description', '').lower()):
+                    elif notif.get('id') in matching_ids:
                         filtered_closed_my_exec_notifications.append(notif)
             else:
                 filtered_closed_my_exec_notifications = closed_my_exec_notifications
@@ -3788,17 +4439,10 @@ def show_execution():
                 st.warning(
                     "⚠️ Nenhuma notificação encontrada com os critérios de busca especificados em suas ações encerradas.")
             else:
-                filtered_closed_my_exec_notifications.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-
                 st.markdown(f"**Notificações Encontradas ({len(filtered_closed_my_exec_notifications)})**:")
                 for notification in filtered_closed_my_exec_notifications:
                     status_class = f"status-{notification.get('status', UI_TEXTS.text_na).replace('_', '-')}"
-                    created_at_str = notification.get('created_at', UI_TEXTS.text_na)
-                    if created_at_str != UI_TEXTS.text_na:
-                        try:
-                            created_at_str = datetime.fromisoformat(created_at_str).strftime('%d/%m/%Y %H:%M:%S')
-                        except ValueError:
-                            pass
+                    created_at_str = format_datetime_display(notification.get('created_at'))
                     concluded_by = UI_TEXTS.text_na
                     if notification.get('conclusion') and notification['conclusion'].get('concluded_by'):
                         concluded_by = notification['conclusion']['concluded_by']
@@ -3829,7 +4473,8 @@ def show_execution():
                             """, unsafe_allow_html=True)
                     with st.expander(
                             f"  ️ Visualizar Detalhes - Notificação #{notification.get('id', UI_TEXTS.text_na)}"):
-                        display_notification_full_details(notification, user_id_logged_in, user_username_logged_in)
+                        display_notification_details_on_demand(notification, "exec_closed", user_id_logged_in,
+                                                               user_username_logged_in)
 
 
 @st_fragment
@@ -3842,22 +4487,15 @@ def show_approval():
     st.markdown("<h1 class='main-header'>✅ Aprovação de Notificações</h1>", unsafe_allow_html=True)
     st.info(
         "📋 Analise as notificações que foram concluídas pelos executores e revisadas/aceitas pelo classificador, e que requerem sua aprovação final.")
-    all_notifications = load_notifications()  # Carrega do DB
     user_id_logged_in = st.session_state.user.get('id')
-    user_username_logged_in = st.session_state.user.get('username')
-    pending_approval = [n for n in all_notifications if
-                        n.get('status') == 'aguardando_aprovacao' and n.get('approver') == user_id_logged_in]
+    pending_ids, closed_ids = load_approval_worklist(user_id_logged_in)
+    # As pendentes do aprovador (já na ordem de prioridade e classificação) são analisadas por completo
+    # na página, então carregam o detalhe, todas de uma vez
+    pending_approval = load_notification_details(pending_ids)
 
-    closed_statuses = ['aprovada', 'rejeitada', 'reprovada', 'concluida']
-    closed_my_approval_notifications = [
-        n for n in all_notifications
-        if n.get('status') in closed_statuses and (
-                (n.get('status') == 'aprovada' and (n.get('approval') or {}).get(
-                    'approved_by') == user_username_logged_in) or
-                (n.get('status') == 'reprovada' and (n.get('rejection_approval') or {}).get(
-                    'rejected_by') == user_username_logged_in)
-        )
-    ]
+    # As encerradas usam o resumo do índice em memória
+    summaries_by_id = {n['id']: n for n in load_notification_summaries()} if closed_ids else {}
+    closed_my_approval_notifications = [summaries_by_id[i] for i in closed_ids if i in summaries_by_id]
 
     if not pending_approval and not closed_my_approval_notifications:
         st.info("✅ Não há notificações aguardando sua aprovação ou que foram encerradas por você no momento.")
@@ -3870,14 +4508,6 @@ def show_approval():
     )
 
     with tab_pending_approval:
-        priority_order = {p: i for i, p in enumerate(FORM_DATA.prioridades)}
-        pending_approval.sort(key=lambda x: (
-            priority_order.get(x.get('classification', {}).get('prioridade', 'Baixa'), len(FORM_DATA.prioridades)),
-            datetime.fromisoformat(
-                x.get('classification', {}).get('classification_timestamp',
-                                                '1900-01-01T00:00:00')).timestamp() if x.get(
-                'classification', {}).get('classification_timestamp') else 0
-        ))
         for notification in pending_approval:
             status_class = f"status-{notification.get('status', UI_TEXTS.text_na).replace('_', '-')}"
             classif_info = notification.get('classification') or {}
@@ -3950,16 +4580,11 @@ def show_approval():
                     st.write(f"**Classificado por:** {classif.get('classificador', UI_TEXTS.text_na)}")
                     classification_timestamp_str = classif.get('classification_timestamp', UI_TEXTS.text_na)
                     if classification_timestamp_str != UI_TEXTS.text_na:
-                        try:
-                            classification_timestamp_str = datetime.fromisoformat(
-                                classification_timestamp_str).strftime(
-                                '%d/%m/%Y %H:%M:%S')
-                        except ValueError:
-                            pass
+                        classification_timestamp_str = format_datetime_display(classification_timestamp_str)
                         st.write(f"**Classificado em:** {classification_timestamp_str}")
 # Exibição do Prazo e Status na Aprovação
                     if deadline_date_str:
-                        deadline_date_formatted = datetime.fromisoformat(deadline_date_str).strftime('%d/%m/%Y')
+                        deadline_date_formatted = format_datetime_display(deadline_date_str, '%d/%m/%Y')
                         st.markdown(
                             f"**Prazo de Conclusão:** {deadline_date_formatted} (<span class='{deadline_status['class']}'>{deadline_status['text']}</span>)",
                             unsafe_allow_html=True)
@@ -3984,16 +4609,10 @@ def show_approval():
                 st.markdown("---")
                 st.markdown("#### ⚡ Ações Executadas pelos Responsáveis")
                 if notification.get('actions'):
-                    for action in sorted(notification['actions'], key=lambda x: x.get('timestamp', '')):
+                    for action in notification['actions']:  # Já vêm ordenadas por action_timestamp do banco
                         action_type = "🏁 CONCLUSÃO (Executor)" if action.get(
                             'final_action_by_executor') else "📝 AÇÃO Registrada"
-                        action_timestamp = action.get('timestamp', UI_TEXTS.text_na)
-                        if action_timestamp != UI_TEXTS.text_na:
-                            try:
-                                action_timestamp = datetime.fromisoformat(action_timestamp).strftime(
-                                    '%d/%m/%Y %H:%M:%S')
-                            except ValueError:
-                                pass
+                        action_timestamp = format_datetime_display(action.get('timestamp'))
                         st.markdown(f"""
                             <strong>{action_type}</strong> - por <strong>{action.get('executor_name', UI_TEXTS.text_na)}</strong> em {action_timestamp}
                             <br>
@@ -4013,6 +4632,7 @@ def show_approval():
                                         unique_name = attach_info.get('unique_name')
                                         original_name = attach_info.get('original_name')
                                         if unique_name and original_name:
+                                            display_attachment_preview(unique_name, original_name)
                                             file_content = get_attachment_data(unique_name)
                                             if file_content:
                                                 st.download_button(
@@ -4048,11 +4668,7 @@ def show_approval():
                     reviewed_by_display = review_exec_info.get('reviewed_by', UI_TEXTS.text_na)
                     review_timestamp_str = review_exec_info.get('timestamp', UI_TEXTS.text_na)
                     if review_timestamp_str != UI_TEXTS.text_na:
-                        try:
-                            review_timestamp_str = datetime.fromisoformat(review_timestamp_str).strftime(
-                                '%d/%m/%Y %H:%M:%S')
-                        except ValueError:
-                            pass
+                        review_timestamp_str = format_datetime_display(review_timestamp_str)
                         st.write(f"**Decisão da Revisão:** {review_decision_display}")
                     st.write(f"**Revisado por (Classificador):** {reviewed_by_display} em {review_timestamp_str}")
                     if review_decision_display == 'Rejeitada' and review_exec_info.get('rejection_reason'):
@@ -4068,13 +4684,16 @@ def show_approval():
                         unique_name_to_use = None
                         original_name_to_use = None
                         if isinstance(attach_info,
-                                      dict) and 'unique_name' in attach_info and 'original_name' in attach_info:
+                                      (dict, Attachment)) and 'unique_name' in attach_info and 'original_name' in attach_info:
                             unique_name_to_use = attach_info['unique_name']
                             original_name_to_use = attach_info['original_name']
                         elif isinstance(attach_info, str):
                             unique_name_to_use = attach_info
                             original_name_to_use = attach_info
                         if unique_name_to_use:
+                            display_attachment_status(
+                                None if isinstance(attach_info, str) else attach_info.get('status'), original_name_to_use)
+                            display_attachment_preview(unique_name_to_use, original_name_to_use)
                             file_content = get_attachment_data(unique_name_to_use)
                             if file_content:
                                 st.download_button(
@@ -4147,6 +4766,7 @@ def show_approval():
                                         'notes': approval_notes or None,
                                         'approved_at': datetime.now().isoformat()
                                     },
+                                    'approved_by': user_id_logged_in,
                                     'conclusion': {
                                         'concluded_by': user_username,
                                         'notes': approval_notes or "Notificação aprovada superiormente.",
@@ -4155,13 +4775,14 @@ def show_approval():
                                     },
                                     'approver': None
                                 }
-                                update_notification(notification['id'], updates)  # Atualiza no DB
-                                add_history_entry(notification['id'], "Notificação aprovada e finalizada",
-                                                  user_name,
-                                                  f"Aprovada superiormente." + (
-                                                      f" Obs: {approval_notes[:150]}..." if approval_notes and len(
-                                                          approval_notes) > 150 else (
-                                                          f" Obs: {approval_notes}" if approval_notes else "")))
+                                history = HistoryWriter()
+                                history.add(notification['id'], "Notificação aprovada e finalizada",
+                                            user_name,
+                                            f"Aprovada superiormente." + (
+                                                f" Obs: {approval_notes[:150]}..." if approval_notes and len(
+                                                    approval_notes) > 150 else (
+                                                    f" Obs: {approval_notes}" if approval_notes else "")))
+                                update_notification(notification['id'], updates, history=history)  # Atualiza no DB, com o histórico
                                 st.success(
                                     f"✅ Notificação #{notification['id']} aprovada e finalizada com sucesso! O ciclo de gestão do evento foi concluído.")
                             elif current_approval_data['decision'] == "Reprovar":
@@ -4174,13 +4795,15 @@ def show_approval():
                                         'reason': approval_notes,
                                         'rejected_at': datetime.now().isoformat()
                                     },
+                                    'rejected_by': user_id_logged_in,
                                     'approver': None
                                 }
-                                update_notification(notification['id'], updates)  # Atualiza no DB
-                                add_history_entry(notification['id'], "Notificação reprovada (Aprovação)",
-                                                  user_name,
-                                                  f"Reprovada superiormente. Motivo: {approval_notes[:150]}..." if len(
-                                                      approval_notes) > 150 else f"Reprovada superiormente. Motivo: {approval_notes}")
+                                history = HistoryWriter()
+                                history.add(notification['id'], "Notificação reprovada (Aprovação)",
+                                            user_name,
+                                            f"Reprovada superiormente. Motivo: {approval_notes[:150]}..." if len(
+                                                approval_notes) > 150 else f"Reprovada superiormente. Motivo: {approval_notes}")
+                                update_notification(notification['id'], updates, history=history)  # Atualiza no DB, com o histórico
                                 st.warning(
                                     f"⚠️ Notificação #{notification['id']} reprovada! Devolvida para revisão pelo classificador.")
                                 st.info(
@@ -4206,12 +4829,12 @@ def show_approval():
             ).lower()
             filtered_closed_my_approval_notifications = []
             if search_query_app_closed:
+                matching_ids = search_notification_ids(search_query_app_closed)
                 for notif in closed_my_approval_notifications:
                     if search_query_app_closed.isdigit() and int(
                             search_query_app_closed) == notif.get('id'):
                         filtered_closed_my_approval_notifications.append(notif)
-                    elif (search_query_app_closed in notif.get('title', '').lower() or
-                            search_query_app_closed in notif.get('description', '').lower()):
+                    elif notif.get('id') in matching_ids:
                         filtered_closed_my_approval_notifications.append(notif)
             else:
                 filtered_closed_my_approval_notifications = closed_my_approval_notifications
@@ -4219,19 +4842,11 @@ def show_approval():
                 st.warning(
                     "⚠️ Nenhuma notificação encontrada com os critérios de busca especificados em suas aprovações encerradas.")
             else:
-                filtered_closed_my_approval_notifications.sort(
-                    key=lambda x: x.get('created_at', ''), reverse=True)
                 st.markdown(
                     f"**Notificações Encontradas ({len(filtered_closed_my_approval_notifications)})**:")
                 for notification in filtered_closed_my_approval_notifications:
                     status_class = f"status-{notification.get('status', UI_TEXTS.text_na).replace('_', '-')}"
-                    created_at_str = notification.get('created_at', UI_TEXTS.text_na)
-                    if created_at_str != UI_TEXTS.text_na:
-                        try:
-                            created_at_str = datetime.fromisoformat(created_at_str).strftime(
-                                '%d/%m/%Y %H:%M:%S')
-                        except ValueError:
-                            pass
+                    created_at_str = format_datetime_display(notification.get('created_at'))
                     concluded_by = UI_TEXTS.text_na
                     if notification.get('conclusion') and notification['conclusion'].get(
                             'concluded_by'):
@@ -4275,11 +4890,11 @@ def show_approval():
                                         """, unsafe_allow_html=True)
                     with st.expander(
                             f"👁️ Visualizar Detalhes - Notificação #{notification.get('id', UI_TEXTS.text_na)}"):
-                        display_notification_full_details(notification,
-                                                          st.session_state.user.get(
-                                                              'id') if st.session_state.authenticated else None,
-                                                          st.session_state.user.get(
-                                                              'username') if st.session_state.authenticated else None)
+                        display_notification_details_on_demand(notification, "approval_closed",
+                                                               st.session_state.user.get(
+                                                                   'id') if st.session_state.authenticated else None,
+                                                               st.session_state.user.get(
+                                                                   'username') if st.session_state.authenticated else None)
 
 
 @st_fragment
@@ -4622,7 +5237,7 @@ def show_admin():
 
                 backup_data = {
                     'users': [prepare_for_json(u) for u in all_users_for_backup],
-                    'notifications': [prepare_for_json(n) for n in
+                    'notifications': [prepare_for_json(n.to_dict()) for n in
                                       all_notifications_for_backup],
                     'backup_date': datetime.now().isoformat(),
                     'version': '1.1-db-based'
@@ -4659,7 +5274,11 @@ def show_admin():
                                     # Desabilita triggers de TSVECTOR para restauração massiva
                                     cur.execute(
                                         "ALTER TABLE notifications DISABLE TRIGGER trg_notifications_search_vector;")
-                                    # Limpa tabelas em ordem inversa de dependência
+                                    # Limpa tabelas em ordem inversa de dependência (inclusive o arquivo)
+                                    cur.execute(
+                                        "TRUNCATE TABLE notification_actions_archive, notification_history_archive, "
+                                        "notification_attachments_archive, notification_executors_archive, "
+                                        "notification_stage_timings_archive, notifications_archive;")
                                     cur.execute(
                                         "TRUNCATE TABLE notification_actions RESTART IDENTITY CASCADE;")
                                     cur.execute(
@@ -4816,6 +5435,7 @@ def show_admin():
                                         f"SELECT setval('notifications_id_seq', (SELECT MAX(id) FROM notifications));")
 
                                     conn.commit()
+                                    get_result_cache().clear()
                                     st.success(
                                         "✅ Dados restaurados com sucesso a partir do arquivo!\n\n")
                                     st.info(
@@ -4848,10 +5468,71 @@ def show_admin():
                             st.error(
                                 f"❌ Ocorreu um erro inesperado ao restaurar os dados: {str(e)}")
 
+        st.markdown("---")
+        st.markdown("#### 🗄️ Arquivamento de Notificações Encerradas")
+        st.info(
+            "Move notificações encerradas (aprovadas, rejeitadas, reprovadas e concluídas) antigas, com anexos, "
+            "histórico e ações, para as tabelas de arquivo. Elas continuam visíveis nas abas de encerradas e no "
+            "dashboard, mas deixam de pesar nas consultas das filas de trabalho.")
+        archive_months = st.number_input("Arquivar encerradas criadas há mais de (meses)", min_value=1,
+                                         max_value=120, value=DEFAULT_ARCHIVE_AFTER_MONTHS, step=1,
+                                         key="admin_archive_months")
+        if st.button("🗄️ Arquivar Agora", key="admin_archive_btn"):
+            conn = None
+            try:
+                conn = get_db_connection()
+                archived_count = archive_closed_notifications(conn, int(archive_months))
+                st.success(f"✅ {archived_count} notificação(ões) movida(s) para o arquivo.")
+            except psycopg2.Error as e:
+                st.error(f"❌ Erro ao arquivar notificações: {e}")
+                if conn:
+                    conn.rollback()
+            finally:
+                if conn:
+                    conn.close()
+
+        st.markdown("---")
+        st.markdown("#### 📦 Exportação para o BI (Parquet)")
+        st.info(
+            f"Grava notificações, histórico e ações em arquivos Parquet por mês de criação em `{BI_EXPORT_DIR}`, "
+            "para que as análises do BI não consultem o banco de produção. Só os meses alterados desde a última "
+            "exportação são regravados. Também pode ser executada por linha de comando: `python bi_export.py`.")
+        last_bi_export = load_watermark(BI_EXPORT_DIR).get('exported_at')
+        st.caption(f"Última exportação: {last_bi_export}" if last_bi_export else "Nenhuma exportação feita ainda.")
+        bi_export_full = st.checkbox("Regravar todos os meses", key="admin_bi_export_full")
+        if st.button("📦 Exportar Agora", key="admin_bi_export_btn"):
+            conn = None
+            try:
+                conn = get_db_connection()
+                with st.spinner("Exportando..."):
+                    bi_summary = export_to_parquet(conn, BI_EXPORT_DIR, full=bi_export_full)
+                st.success(
+                    f"✅ {len(bi_summary['months_exported'])} mês(es) exportado(s), "
+                    f"{len(bi_summary['months_removed'])} removido(s): "
+                    + ", ".join(f"{table}: {rows} linhas" for table, rows in bi_summary['rows'].items()))
+            except psycopg2.Error as e:
+                st.error(f"❌ Erro ao exportar para o BI: {e}")
+            except (RuntimeError, OSError) as e:
+                st.error(f"❌ {e}")
+            finally:
+                if conn:
+                    conn.close()
+
     with tab3:
         st.markdown("### 🛠️ Visualização de Desenvolvimento e Debug")
         st.warning(
             "⚠️ Esta seção é destinada a desenvolvedores para visualizar a estrutura completa dos dados. Não é para uso operacional normal.")
+        st.markdown("#### ⚡ Cache de Resultados")
+        st.caption("Em disco (compartilhado entre processos)" if RESULT_CACHE_PATH else "Em memória (deste processo)")
+        col_cache_stats, col_single_flight_stats = st.columns(2)
+        with col_cache_stats:
+            st.json(get_result_cache().stats())
+        with col_single_flight_stats:
+            st.json(get_single_flight().stats())
+        if st.button("🧹 Limpar Cache de Resultados", key="admin_clear_result_cache_btn"):
+            get_result_cache().clear()
+            st.success("✅ Cache de resultados limpo.")
+        st.markdown("---")
         notifications = load_notifications()  # Carrega do DB
         if notifications:
             selected_notif_display_options = [UI_TEXTS.selectbox_default_admin_debug_notif] + [
@@ -4881,10 +5562,8 @@ def show_admin():
                             (n for n in notifications if n.get('id') == notif_id), None)
                         if notification:
                             st.markdown("#### Dados Completos da Notificação (JSON)")
-                            # Para exibir JSON puro e bonito no Streamlit, garantimos que todas as datas/tempos e JSONB
-                            # já estejam formatados como strings ISO e dicionários/listas Python, respectivamente.
-                            # load_notifications já faz grande parte disso.
-                            st.json(notification)
+                            # Datas/horas são objetos nativos no registro; são convertidas para texto só aqui.
+                            st.json(json.dumps(notification.to_dict(), default=str))
                         else:
                             st.error("❌ Notificação não encontrada.")
                     else:
@@ -4918,17 +5597,28 @@ def show_dashboard():
     st.markdown("<h1 class='main-header'>   Dashboard de Notificações</h1>",
                 unsafe_allow_html=True)
 
-    all_notifications = load_notifications()  # Carrega do DB
+    # Última versão calculada (resumos para a lista e snapshot colunar para métricas, gráficos e indicadores);
+    # se estiver vencida, é atualizada em segundo plano e aparece na próxima interação
+    col_data_age, col_data_refresh = st.columns([4, 1])
+    with col_data_refresh:
+        force_refresh = st.button("🔄 Atualizar agora", key="dashboard_force_refresh_btn")
+    dashboard_data = load_dashboard_snapshot(force_refresh=force_refresh)
+    if dashboard_data is None:
+        return
+    all_notifications, df_notifications, data_computed_at = dashboard_data
+    with col_data_age:
+        data_age_label = f"🕒 Dados de {data_computed_at.strftime('%H:%M:%S')}"
+        if get_dashboard_snapshot().refreshing:
+            data_age_label += " (atualizando em segundo plano...)"
+        elif get_dashboard_snapshot().last_error is not None:
+            data_age_label += " (a última atualização falhou; exibindo a versão anterior)"
+        st.caption(data_age_label)
+
     if not all_notifications:
         st.warning(
             "⚠️ Nenhuma notificação encontrada para exibir no dashboard. Comece registrando uma nova notificação.")
         return
 
-    # Converte a lista de notificações em um DataFrame pandas para facilitar a manipulação
-    df_notifications = pd.DataFrame(all_notifications)
-    df_notifications['created_at_dt'] = pd.to_datetime(df_notifications['created_at'])
-    df_notifications['occurrence_date_dt'] = pd.to_datetime(df_notifications['occurrence_date'])
-
     # Define categorias de status para gráficos
     completed_statuses = ['aprovada', 'concluida']
     rejected_statuses = ['rejeitada', 'reprovada']
@@ -4942,15 +5632,14 @@ def show_dashboard():
         st.info("Visão geral e detalhada de todas as notificações registradas no sistema.")
 
         st.markdown("### Visão Geral e Métricas Chave")
-        total = len(all_notifications)
-        pending_classif = len(
-            [n for n in all_notifications if n.get('status') == "pendente_classificacao"])
+        status_series = df_notifications['status']
+        total = len(df_notifications)
+        pending_classif = int((status_series == "pendente_classificacao").sum())
         in_progress_statuses = ['classificada', 'em_execucao', 'aguardando_classificador',
                                 'aguardando_aprovacao', 'revisao_classificador_execucao']
-        in_progress = len(
-            [n for n in all_notifications if n.get('status') in in_progress_statuses])
-        completed = len([n for n in all_notifications if n.get('status') in completed_statuses])
-        rejected = len([n for n in all_notifications if n.get('status') in rejected_statuses])
+        in_progress = int(status_series.isin(in_progress_statuses).sum())
+        completed = int(status_series.isin(completed_statuses).sum())
+        rejected = int(status_series.isin(rejected_statuses).sum())
 
         col_m1, col_m2, col_m3, col_m4, col_m5 = st.columns(5)
         with col_m1:
@@ -4989,15 +5678,14 @@ def show_dashboard():
                 'rejeitada': 'Rejeitada (Classif. Inicial)',
                 'reprovada': 'Reprovada (Aprovação)'
             }
-            status_count = {}
-            for notification in all_notifications:
-                status = notification.get('status', UI_TEXTS.text_na)
-                mapped_status = status_mapping.get(status, status)
-                status_count[mapped_status] = status_count.get(mapped_status, 0) + 1
-
-            if status_count:
-                status_df = pd.DataFrame(list(status_count.items()),
-                                         columns=['Status', 'Quantidade'])
+            status_count = df_notifications['status'].value_counts()
+            status_count = status_count[status_count > 0]  # Categorias sem ocorrência ficam de fora
+
+            if not status_count.empty:
+                status_df = pd.DataFrame({
+                    'Status': [status_mapping.get(s, s) for s in status_count.index],
+                    'Quantidade': status_count.to_numpy()
+                })
                 status_order = [status_mapping.get(s) for s in
                                 ['pendente_classificacao', 'classificada', 'em_execucao',
                                  'revisao_classificador_execucao',
@@ -5017,12 +5705,9 @@ def show_dashboard():
         with col_chart2:
             st.markdown("#### Notificações Criadas ao Longo do Tempo")
             if not df_notifications.empty:
-                df_notifications_copy = df_notifications.copy()  # Cria uma cópia para evitar SettingWithCopyWarning
-                df_notifications_copy['month_year'] = df_notifications_copy[
-                    'created_at_dt'].dt.to_period('M').astype(
-                    str)
-                monthly_counts = df_notifications_copy.groupby('month_year').size().reset_index(
-                    name='count')
+                monthly_counts = df_notifications.groupby(
+                    df_notifications['created_at'].dt.to_period('M').astype(str).rename('month_year')
+                ).size().reset_index(name='count')
                 monthly_counts['month_year'] = pd.to_datetime(monthly_counts['month_year'])
                 monthly_counts = monthly_counts.sort_values('month_year')
                 monthly_counts['month_year'] = monthly_counts['month_year'].dt.strftime(
@@ -5135,12 +5820,12 @@ def show_dashboard():
                                         p != all_option_text]
             date_start_default = st.session_state.dashboard_filter_date_start or (
                 df_notifications[
-                    'created_at_dt'].min().date() if not df_notifications.empty else dt_date_class.today() - timedelta(
+                    'created_at'].min().date() if not df_notifications.empty else dt_date_class.today() - timedelta(
                     days=365)
             )
             date_end_default = st.session_state.dashboard_filter_date_end or (
                 df_notifications[
-                    'created_at_dt'].max().date() if not df_notifications.empty else dt_date_class.today()
+                    'created_at'].max().date() if not df_notifications.empty else dt_date_class.today()
             )
 
             st.session_state.dashboard_filter_date_start = st.date_input(
@@ -5185,6 +5870,8 @@ def show_dashboard():
                 key="dashboard_sort_ascending_checkbox"
             )
 
+        search_matching_ids = search_notification_ids(
+            st.session_state.dashboard_search_query) if st.session_state.dashboard_search_query else set()
         filtered_notifications = []
         for notification in all_notifications:
             match = True
@@ -5202,7 +5889,7 @@ def show_dashboard():
                     match = False
 
             if match and st.session_state.dashboard_filter_date_start and st.session_state.dashboard_filter_date_end:
-                created_at_date = datetime.fromisoformat(notification['created_at']).date()
+                created_at_date = notification['created_at'].date()
                 if not (
                         st.session_state.dashboard_filter_date_start <= created_at_date <= st.session_state.dashboard_filter_date_end):
                     match = False
@@ -5211,11 +5898,10 @@ def show_dashboard():
                 query = st.session_state.dashboard_search_query
                 search_fields = [
                     str(notification.get('id', '')).lower(),
-                    notification.get('title', '').lower(),
-                    notification.get('description', '').lower(),
-                    notification.get('location', '').lower()
+                    (notification.get('location') or '').lower()
                 ]
-                if not any(query in field for field in search_fields):
+                if notification.get('id') not in search_matching_ids and not any(
+                        query in field for field in search_fields):
                     match = False
 
             if match:
@@ -5225,7 +5911,7 @@ def show_dashboard():
             if sort_key == 'id':
                 return notif.get('id', 0)
             elif sort_key == 'created_at':
-                return datetime.fromisoformat(notif.get('created_at', '1900-01-01T00:00:00'))
+                return notif.get('created_at') or MIN_TIMESTAMP
             elif sort_key == 'title':
                 return notif.get('title', '')
             elif sort_key == 'location':
@@ -5247,6 +5933,33 @@ def show_dashboard():
 
         st.write(f"**Notificações Encontradas: {len(filtered_notifications)}**")
 
+        with st.expander("📤 Exportar lista filtrada"):
+            export_format = st.radio("Formato:", EXPORT_FORMATS, format_func=str.upper, horizontal=True,
+                                     key="dashboard_export_format")
+            if st.button("Gerar arquivo", key="dashboard_export_button"):
+                export_filters = {
+                    'statuses': applied_status_filters,
+                    'nncs': applied_nnc_filters,
+                    'priorities': applied_priority_filters,
+                    'date_start': st.session_state.dashboard_filter_date_start,
+                    'date_end': st.session_state.dashboard_filter_date_end,
+                    'search': st.session_state.dashboard_search_query,
+                    'sort_column': st.session_state.dashboard_sort_column,
+                    'sort_ascending': st.session_state.dashboard_sort_ascending,
+                }
+                with st.spinner("Gerando arquivo..."):
+                    exported = export_dashboard_list(export_filters, export_format)
+                if exported:
+                    export_path, exported_count = exported
+                    try:
+                        with open(export_path, 'rb') as export_file:
+                            st.download_button(
+                                f"⬇️ Baixar {export_format.upper()} ({exported_count} notificações)",
+                                data=export_file.read(), file_name=export_filename(export_format),
+                                mime=EXPORT_MIME_TYPES[export_format], key="dashboard_export_download")
+                    finally:
+                        os.remove(export_path)
+
         items_per_page_options = [5, 10, 20, 50]
         items_per_page_display_options = [UI_TEXTS.selectbox_items_per_page_placeholder] + [
             str(x) for x in
@@ -5288,8 +6001,7 @@ def show_dashboard():
         else:
             for notification in paginated_notifications:
                 status_class = f"status-{notification.get('status', UI_TEXTS.text_na).replace('_', '-')}"
-                created_at_str = datetime.fromisoformat(notification['created_at']).strftime(
-                    '%d/%m/%Y %H:%M:%S')
+                created_at_str = format_datetime_display(notification.get('created_at'))
                 current_status_display = status_mapping.get(
                     notification.get('status', UI_TEXTS.text_na),
                     notification.get('status', UI_TEXTS.text_na).replace('_',
@@ -5300,8 +6012,7 @@ def show_dashboard():
                 deadline_date_str = classif_info.get('deadline_date')
                 deadline_html = ""
                 if deadline_date_str:
-                    deadline_date_formatted = datetime.fromisoformat(
-                        deadline_date_str).strftime('%d/%m/%Y')
+                    deadline_date_formatted = format_datetime_display(deadline_date_str, '%d/%m/%Y')
                     deadline_status = get_deadline_status(deadline_date_str)
                     deadline_html = f" | <strong class='{deadline_status['class']}'>Prazo: {deadline_date_formatted} ({deadline_status['text']})</strong>"
 
@@ -5315,11 +6026,11 @@ def show_dashboard():
 
                 with st.expander(
                         f"👁️ Visualizar Detalhes - Notificação #{notification.get('id', UI_TEXTS.text_na)}"):
-                    display_notification_full_details(notification,
-                                                      st.session_state.user.get(
-                                                          'id') if st.session_state.authenticated else None,
-                                                      st.session_state.user.get(
-                                                          'username') if st.session_state.authenticated else None)
+                    display_notification_details_on_demand(notification, "dashboard",
+                                                           st.session_state.user.get(
+                                                               'id') if st.session_state.authenticated else None,
+                                                           st.session_state.user.get(
+                                                               'username') if st.session_state.authenticated else None)
 
     with tab_indicators:
         st.info("Explore os indicadores e tendências das notificações, com filtros de período.")
@@ -5327,10 +6038,10 @@ def show_dashboard():
 
         # Define as datas padrão para o filtro de período, usando a data mais antiga e mais recente
         min_date = df_notifications[
-            'created_at_dt'].min().date() if not df_notifications.empty else dt_date_class.today() - timedelta(
+            'created_at'].min().date() if not df_notifications.empty else dt_date_class.today() - timedelta(
             days=365)
         max_date = df_notifications[
-            'created_at_dt'].max().date() if not df_notifications.empty else dt_date_class.today()
+            'created_at'].max().date() if not df_notifications.empty else dt_date_class.today()
         col_date1, col_date2 = st.columns(2)
         with col_date1:
             start_date_indicators = st.date_input("Data de Início", value=min_date,
@@ -5339,11 +6050,12 @@ def show_dashboard():
             end_date_indicators = st.date_input("Data de Fim", value=max_date,
                                                 key="end_date_indicators")
 
-        # Filtra o DataFrame pelo período selecionado
+        # Filtra o DataFrame pelo período selecionado (comparação vetorizada em datetime64)
+        period_start = pd.Timestamp(start_date_indicators)
+        period_end = pd.Timestamp(end_date_indicators) + pd.Timedelta(days=1)
         df_filtered_by_period = df_notifications[
-            (df_notifications['created_at_dt'].dt.date >= start_date_indicators) &
-            (df_notifications[
-                 'created_at_dt'].dt.date <= end_date_indicators)].copy()
+            (df_notifications['created_at'] >= period_start) &
+            (df_notifications['created_at'] < period_end)].copy()
 
         if df_filtered_by_period.empty:
             st.warning("⚠️ Não há dados para o período selecionado para gerar os indicadores.")
@@ -5355,7 +6067,7 @@ def show_dashboard():
             "#### 📈 Quantidade de Notificações por Mês (Abertas, Concluídas, Rejeitadas)")
 
         df_monthly = df_filtered_by_period.copy()
-        df_monthly['month_year'] = df_monthly['created_at_dt'].dt.to_period('M').astype(str)
+        df_monthly['month_year'] = df_monthly['created_at'].dt.to_period('M').astype(str)
 
         # Categoriza o status da notificação
         df_monthly['status_category'] = 'Aberta'
@@ -5387,7 +6099,7 @@ def show_dashboard():
 
         # Usar o DataFrame original para a lista completa de setores notificados no filtro
         all_notified_departments_unique = sorted(
-            df_notifications['notified_department'].unique().tolist())
+            df_notifications['notified_department'].cat.categories.tolist())
         notified_departments_filter_options = ['Todos'] + all_notified_departments_unique
         selected_notified_dept = st.selectbox("Filtrar por Setor Notificado:",
                                               notified_departments_filter_options,
@@ -5399,7 +6111,7 @@ def show_dashboard():
 
         if not df_pending_analysis.empty:
             df_pending_analysis['month_year'] = df_pending_analysis[
-                'created_at_dt'].dt.to_period('M').astype(str)
+                'created_at'].dt.to_period('M').astype(str)
             monthly_pending_counts = df_pending_analysis.groupby(
                 'month_year').size().reset_index(name='Quantidade')
 
@@ -5425,6 +6137,7 @@ def show_dashboard():
             if not df_filtered_by_period.empty:
                 top_notified = df_filtered_by_period[
                     'notified_department'].value_counts().nlargest(10)
+                top_notified = top_notified[top_notified > 0]
                 if not top_notified.empty:
                     st.bar_chart(top_notified)
                 else:
@@ -5437,6 +6150,7 @@ def show_dashboard():
             if not df_filtered_by_period.empty:
                 top_reporting = df_filtered_by_period[
                     'reporting_department'].value_counts().nlargest(10)
+                top_reporting = top_reporting[top_reporting > 0]
                 if not top_reporting.empty:
                     st.bar_chart(top_reporting)
                 else:
@@ -5461,9 +6175,9 @@ def show_dashboard():
         with col_classif1:
             st.markdown("##### NNC - Concluídas")
             if not df_completed_period.empty:
-                # Usa .apply para acessar o dicionário 'classification' e pegar 'nnc'
-                completed_nnc = df_completed_period['classification'].apply(
-                    lambda x: x.get('nnc') if x else None).value_counts().dropna()
+                # Colunas categóricas: value_counts inclui categorias sem ocorrência, que são descartadas
+                completed_nnc = df_completed_period['nnc'].value_counts()
+                completed_nnc = completed_nnc[completed_nnc > 0]
                 if not completed_nnc.empty:
                     st.bar_chart(completed_nnc)
                 else:
@@ -5475,8 +6189,8 @@ def show_dashboard():
         with col_classif2:
             st.markdown("##### NNC - Abertas")
             if not df_open_period.empty:
-                open_nnc = df_open_period['classification'].apply(
-                    lambda x: x.get('nnc') if x else None).value_counts().dropna()
+                open_nnc = df_open_period['nnc'].value_counts()
+                open_nnc = open_nnc[open_nnc > 0]
                 if not open_nnc.empty:
                     st.bar_chart(open_nnc)
                 else:
@@ -5488,8 +6202,8 @@ def show_dashboard():
         with col_classif3:
             st.markdown("##### Tipo Principal - Concluídas")
             if not df_completed_period.empty:
-                completed_main_type = df_completed_period['classification'].apply(
-                    lambda x: x.get('event_type_main') if x else None).value_counts().dropna()
+                completed_main_type = df_completed_period['event_type_main'].value_counts()
+                completed_main_type = completed_main_type[completed_main_type > 0]
                 if not completed_main_type.empty:
                     st.bar_chart(completed_main_type)
                 else:
@@ -5500,8 +6214,8 @@ def show_dashboard():
         with col_classif4:
             st.markdown("##### Tipo Principal - Abertas")
             if not df_open_period.empty:
-                open_main_type = df_open_period['classification'].apply(
-                    lambda x: x.get('event_type_main') if x else None).value_counts().dropna()
+                open_main_type = df_open_period['event_type_main'].value_counts()
+                open_main_type = open_main_type[open_main_type > 0]
                 if not open_main_type.empty:
                     st.bar_chart(open_main_type)
                 else:
@@ -5509,6 +6223,36 @@ def show_dashboard():
             else:
                 st.info("Nenhuma notificação aberta no período.")
 
+        st.markdown("---")
+
+        st.markdown("#### ⏱️ Lead Time por Etapa (Classificação, Execução e Aprovação)")
+        st.caption("Tempo em cada etapa, em horas, das etapas encerradas no período selecionado. "
+                   "Notificações que voltaram a uma etapa somam o tempo de todas as passagens.")
+        lead_time_rows = load_lead_time_by_stage(start_date_indicators, end_date_indicators)
+        if not lead_time_rows:
+            st.info("Nenhuma etapa encerrada no período para calcular o lead time.")
+        else:
+            stage_totals = {row['stage']: row for row in lead_time_rows if row['is_total']}
+            stage_columns = st.columns(len(STAGE_LABELS))
+            for stage_column, (stage, stage_label) in zip(stage_columns, STAGE_LABELS.items()):
+                with stage_column:
+                    total_row = stage_totals.get(stage)
+                    if total_row:
+                        st.metric(f"{stage_label} - Mediana", f"{total_row['median_hours']:.1f} h",
+                                  help=f"Média: {total_row['mean_hours']:.1f} h | P90: {total_row['p90_hours']:.1f} h | "
+                                       f"{total_row['count']} notificação(ões)")
+                    else:
+                        st.metric(f"{stage_label} - Mediana", UI_TEXTS.text_na)
+            df_lead_time = pd.DataFrame([{
+                'Etapa': STAGE_LABELS.get(row['stage'], row['stage']),
+                'Setor Notificado': row['department'] or UI_TEXTS.text_na,
+                'Qtd.': row['count'],
+                'Média (h)': round(row['mean_hours'], 1),
+                'Mediana (h)': round(row['median_hours'], 1),
+                'P90 (h)': round(row['p90_hours'], 1),
+            } for row in lead_time_rows if not row['is_total']])
+            st.dataframe(df_lead_time, hide_index=True, use_container_width=True)
+
 
 def main():
     """Main function to run the Streamlit application."""
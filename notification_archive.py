@@ -0,0 +1,108 @@
+# notification_archive.py
+
+# Camada de arquivamento das notificações encerradas.
+# Notificações encerradas (aprovada, rejeitada, reprovada, concluida) com mais de N meses são movidas,
+# junto com anexos, histórico e ações, das tabelas "quentes" para tabelas *_archive de mesma estrutura.
+# As tabelas quentes ficam só com o que ainda está em andamento (e o encerrado recente), então as
+# varreduras e índices usados pelas filas de trabalho não passam mais pelo histórico inteiro.
+# As leituras que precisam de tudo (abas de encerradas, dashboard, detalhes, backup) usam as views
+# *_all, que fazem UNION ALL das tabelas quente e de arquivo.
+
+from typing import List, Tuple
+
+from psycopg2 import sql
+
+CLOSED_STATUSES = ['aprovada', 'rejeitada', 'reprovada', 'concluida']
+DEFAULT_ARCHIVE_AFTER_MONTHS = 6
+
+# (tabela quente, tabela de arquivo, view com as duas)
+NOTIFICATIONS_TABLES = ('notifications', 'notifications_archive', 'notifications_all')
+CHILD_TABLES = (
+    ('notification_attachments', 'notification_attachments_archive', 'notification_attachments_all'),
+    ('notification_history', 'notification_history_archive', 'notification_history_all'),
+    ('notification_actions', 'notification_actions_archive', 'notification_actions_all'),
+    ('notification_executors', 'notification_executors_archive', 'notification_executors_all'),
+    ('notification_stage_timings', 'notification_stage_timings_archive', 'notification_stage_timings_all'),
+)
+
+
+def _table_columns(cur, table: str) -> List[Tuple[str, str]]:
+    """Colunas (nome, tipo) de uma tabela, na ordem física."""
+    cur.execute("""
+        SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (table,))
+    return cur.fetchall()
+
+
+def ensure_archive_schema(cur):
+    """
+    Cria as tabelas de arquivo e as views *_all. Deve rodar depois de todas as alterações de colunas
+    das tabelas quentes: colunas novas são acrescentadas ao arquivo e às views.
+    """
+    for hot_table, archive_table, all_view in (NOTIFICATIONS_TABLES,) + CHILD_TABLES:
+        # INCLUDING ALL copia defaults, checks e índices (inclusive PK e GIN), mas não as FKs
+        cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} (LIKE {} INCLUDING ALL)").format(
+            sql.Identifier(archive_table), sql.Identifier(hot_table)))
+
+        hot_columns = _table_columns(cur, hot_table)
+        archive_column_names = {name for name, _ in _table_columns(cur, archive_table)}
+        for column_name, column_type in hot_columns:
+            if column_name not in archive_column_names:
+                cur.execute(sql.SQL("ALTER TABLE {} ADD COLUMN {} {}").format(
+                    sql.Identifier(archive_table), sql.Identifier(column_name), sql.SQL(column_type)))
+
+        column_list = sql.SQL(', ').join(sql.Identifier(name) for name, _ in hot_columns)
+        # CREATE OR REPLACE aceita colunas novas no fim, que é como as tabelas quentes evoluem
+        cur.execute(sql.SQL("""
+            CREATE OR REPLACE VIEW {view} AS
+            SELECT {columns} FROM {hot}
+            UNION ALL
+            SELECT {columns} FROM {archive}
+        """).format(view=sql.Identifier(all_view), columns=column_list,
+                    hot=sql.Identifier(hot_table), archive=sql.Identifier(archive_table)))
+
+
+def archive_closed_notifications(conn, older_than_months: int = DEFAULT_ARCHIVE_AFTER_MONTHS,
+                                 batch_size: int = 500) -> int:
+    """
+    Move as notificações encerradas criadas há mais de older_than_months meses para o arquivo,
+    em lotes de batch_size, cada lote na sua própria transação. Retorna quantas foram movidas.
+    Erros de banco são propagados; o lote em andamento deve ser desfeito pelo chamador (rollback).
+    """
+    total_moved = 0
+    with conn.cursor() as cur:
+        column_lists = {}
+        for hot_table, _, _ in (NOTIFICATIONS_TABLES,) + CHILD_TABLES:
+            column_lists[hot_table] = sql.SQL(', ').join(
+                sql.Identifier(name) for name, _ in _table_columns(cur, hot_table))
+
+        while True:
+            cur.execute("""
+                SELECT id FROM notifications
+                WHERE status = ANY(%s) AND created_at < now() - make_interval(months => %s)
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (CLOSED_STATUSES, older_than_months, batch_size))
+            notification_ids = [row[0] for row in cur.fetchall()]
+            if not notification_ids:
+                conn.commit()
+                break
+
+            # Filhos primeiro: o DELETE da notificação remove os filhos em cascata
+            for hot_table, archive_table, _ in CHILD_TABLES:
+                cur.execute(sql.SQL("INSERT INTO {archive} ({columns}) SELECT {columns} FROM {hot} "
+                                    "WHERE notification_id = ANY(%s)").format(
+                    archive=sql.Identifier(archive_table), hot=sql.Identifier(hot_table),
+                    columns=column_lists[hot_table]), (notification_ids,))
+            hot_table, archive_table, _ = NOTIFICATIONS_TABLES
+            cur.execute(sql.SQL("INSERT INTO {archive} ({columns}) SELECT {columns} FROM {hot} "
+                                "WHERE id = ANY(%s)").format(
+                archive=sql.Identifier(archive_table), hot=sql.Identifier(hot_table),
+                columns=column_lists[hot_table]), (notification_ids,))
+            cur.execute("DELETE FROM notifications WHERE id = ANY(%s)", (notification_ids,))
+            conn.commit()
+            total_moved += len(notification_ids)
+    return total_moved
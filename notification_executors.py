@@ -0,0 +1,106 @@
+# notification_executors.py
+
+# Tabela normalizada de executores por notificação, com o momento da atribuição e da conclusão.
+# A coluna notifications.executors (INTEGER[]) continua sendo a fonte usada pelas telas; um trigger
+# mantém notification_executors em sincronia com ela, e outro marca concluded_at quando o executor
+# registra a ação final ("Concluir Minha Parte"). Assim, "todos os executores concluíram?" vira uma
+# consulta por índice, sem recarregar e comparar todas as ações, e a carga de trabalho por executor
+# é uma varredura simples no índice (executor_id).
+
+from typing import List, Tuple
+
+NOTIFICATION_EXECUTORS_DDL = """
+    CREATE TABLE IF NOT EXISTS notification_executors (
+        notification_id INTEGER NOT NULL REFERENCES notifications(id) ON DELETE CASCADE,
+        executor_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        assigned_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        concluded_at TIMESTAMPTZ,
+        PRIMARY KEY (notification_id, executor_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_notification_executors_executor
+        ON notification_executors (executor_id, notification_id);
+
+    -- Sincroniza a tabela com notifications.executors: remove quem saiu da lista e inclui quem entrou
+    CREATE OR REPLACE FUNCTION sync_notification_executors() RETURNS TRIGGER AS $$
+    BEGIN
+        DELETE FROM notification_executors
+        WHERE notification_id = NEW.id AND NOT (executor_id = ANY(COALESCE(NEW.executors, '{}')));
+        INSERT INTO notification_executors (notification_id, executor_id)
+        SELECT DISTINCT NEW.id, assigned.executor_id
+        FROM unnest(COALESCE(NEW.executors, '{}')) AS assigned(executor_id)
+        JOIN users ON users.id = assigned.executor_id
+        ON CONFLICT DO NOTHING;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_notifications_sync_executors ON notifications;
+    CREATE TRIGGER trg_notifications_sync_executors
+        AFTER INSERT OR UPDATE OF executors ON notifications
+        FOR EACH ROW EXECUTE FUNCTION sync_notification_executors();
+
+    -- Ação final do executor: registra a conclusão da parte dele
+    CREATE OR REPLACE FUNCTION mark_executor_concluded() RETURNS TRIGGER AS $$
+    BEGIN
+        IF NEW.final_action_by_executor THEN
+            UPDATE notification_executors SET concluded_at = COALESCE(NEW.action_timestamp, now())
+            WHERE notification_id = NEW.notification_id AND executor_id = NEW.executor_id
+              AND concluded_at IS NULL;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_actions_executor_concluded ON notification_actions;
+    CREATE TRIGGER trg_actions_executor_concluded
+        AFTER INSERT ON notification_actions
+        FOR EACH ROW EXECUTE FUNCTION mark_executor_concluded();
+"""
+
+
+def ensure_executor_schema(cur):
+    """
+    Cria a tabela e os triggers; na primeira vez, preenche a tabela a partir de notifications.executors
+    e das ações finais já registradas. Deve rodar antes de ensure_archive_schema.
+    """
+    cur.execute(NOTIFICATION_EXECUTORS_DDL)
+    cur.execute("SELECT EXISTS (SELECT 1 FROM notification_executors)")
+    if cur.fetchone()[0]:
+        return
+    # A data exata da atribuição não existe no modelo antigo; usamos a criação da notificação
+    cur.execute("""
+        INSERT INTO notification_executors (notification_id, executor_id, assigned_at, concluded_at)
+        SELECT n.id, assigned.executor_id, n.created_at,
+               (SELECT MIN(a.action_timestamp) FROM notification_actions a
+                WHERE a.notification_id = n.id AND a.executor_id = assigned.executor_id
+                  AND a.final_action_by_executor)
+        FROM notifications n
+        CROSS JOIN LATERAL unnest(n.executors) AS assigned(executor_id)
+        JOIN users ON users.id = assigned.executor_id
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def execution_progress(cur, notification_id: int) -> Tuple[bool, List[int]]:
+    """
+    (todos os executores concluíram?, ids dos executores que ainda não concluíram).
+    Sem executores atribuídos, a execução não é considerada concluída.
+    """
+    cur.execute("""
+        SELECT COUNT(*),
+               COALESCE(array_agg(executor_id) FILTER (WHERE concluded_at IS NULL), '{}')
+        FROM notification_executors
+        WHERE notification_id = %s
+    """, (notification_id,))
+    assigned_count, pending_executor_ids = cur.fetchone()
+    return assigned_count > 0 and not pending_executor_ids, list(pending_executor_ids)
+
+
+def executor_has_concluded(cur, notification_id: int, executor_id: int) -> bool:
+    """Se o executor já concluiu a parte dele nesta notificação (busca pela chave primária)."""
+    cur.execute("""
+        SELECT concluded_at IS NOT NULL FROM notification_executors
+        WHERE notification_id = %s AND executor_id = %s
+    """, (notification_id, executor_id))
+    row = cur.fetchone()
+    return bool(row and row[0])
@@ -0,0 +1,196 @@
+# notification_export.py
+
+# Exportação da lista de notificações filtrada no dashboard para CSV ou XLSX.
+# Os filtros da lista (status, NNC, prioridade, período de criação, busca e ordenação) viram uma única
+# consulta SQL lida por um cursor nomeado (server-side): as linhas chegam do banco em lotes de
+# EXPORT_ITERSIZE e vão direto para o arquivo, sem montar listas em Python, então exportar 100 mil
+# linhas usa a mesma memória que exportar 100.
+# Os campos da classificação (JSONB) saem como colunas próprias; listas viram texto separado por vírgula.
+# CSV: separador ';' e UTF-8 com BOM, que o Excel em português abre direto.
+# XLSX: openpyxl em modo write_only (linhas gravadas em streaming); sem openpyxl, só CSV.
+
+import csv
+import io
+import uuid
+from datetime import date
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from psycopg2 import sql
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # openpyxl não instalado: exportação só em CSV
+    Workbook = None
+
+EXPORT_ITERSIZE = 2000
+EXPORT_FORMATS = ('csv', 'xlsx') if Workbook is not None else ('csv',)
+
+
+def classification_text(key: str) -> str:
+    """Campo da classificação (JSONB) como texto; a notificação deve ter o alias n na consulta."""
+    return f"n.classification->>'{key}'"
+
+
+def classification_list_text(key: str) -> str:
+    """Lista JSON da classificação como texto 'a, b' (valores que não são lista saem como estão)."""
+    return (f"CASE WHEN jsonb_typeof(n.classification->'{key}') = 'array' "
+            f"THEN array_to_string(ARRAY(SELECT jsonb_array_elements_text(n.classification->'{key}')), ', ') "
+            f"ELSE n.classification->>'{key}' END")
+
+
+# (cabeçalho, expressão SQL). created_at::timestamp devolve datas sem fuso, que o XLSX aceita.
+EXPORT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('ID', 'n.id'),
+    ('Título', 'n.title'),
+    ('Status', 'n.status'),
+    ('Data de Criação', 'n.created_at::timestamp'),
+    ('Data da Ocorrência', 'n.occurrence_date'),
+    ('Hora da Ocorrência', 'n.occurrence_time'),
+    ('Local', 'n.location'),
+    ('Turno', 'n.event_shift'),
+    ('Setor Notificante', 'n.reporting_department'),
+    ('Setor Notificado', 'n.notified_department'),
+    ('Paciente Envolvido', 'n.patient_involved'),
+    ('Óbito', 'n.patient_outcome_obito'),
+    ('NNC', classification_text('nnc')),
+    ('Nível de Dano', classification_text('nivel_dano')),
+    ('Prioridade', classification_text('prioridade')),
+    ('Never Event', classification_text('never_event')),
+    ('Evento Sentinela', classification_text('is_sentinel_event')),
+    ('Classificação OMS', classification_list_text('oms')),
+    ('Tipo de Evento', classification_text('event_type_main')),
+    ('Subtipo de Evento', classification_list_text('event_type_sub')),
+    ('Classificado por', classification_text('classificador')),
+    ('Classificado em', 'n.classified_at::timestamp'),
+    ('Prazo de Conclusão', classification_text('deadline_date')),
+    ('Requer Aprovação', classification_text('requires_approval')),
+)
+
+
+def build_export_query(filters: Dict[str, Any], priorities: Sequence[str]) -> Tuple[sql.Composed, List[Any]]:
+    """
+    Consulta da exportação com os mesmos filtros da lista do dashboard.
+    filters: statuses, nncs, priorities (listas; vazias = todos), date_start/date_end (datas de criação),
+    search (termo), sort_column (id, created_at, title, location ou classification.prioridade) e sort_ascending.
+    A busca segue a da lista na tela: título e descrição sem diferenciar maiúsculas (como
+    search_notification_ids); id e local contendo o termo exato, com o local em minúsculas.
+    """
+    conditions = []
+    params: List[Any] = []
+    if filters.get('statuses'):
+        conditions.append("n.status = ANY(%s)")
+        params.append(list(filters['statuses']))
+    if filters.get('nncs'):
+        conditions.append("n.classification->>'nnc' = ANY(%s)")
+        params.append(list(filters['nncs']))
+    if filters.get('priorities'):
+        conditions.append("n.classification->>'prioridade' = ANY(%s)")
+        params.append(list(filters['priorities']))
+    if filters.get('date_start') and filters.get('date_end'):
+        conditions.append("n.created_at::date BETWEEN %s AND %s")
+        params.extend([filters['date_start'], filters['date_end']])
+    if filters.get('search'):
+        escaped = filters['search'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        pattern = f"%{escaped}%"
+        conditions.append("(n.title ILIKE %s OR n.description ILIKE %s OR strpos(n.id::text, %s) > 0 "
+                          "OR strpos(lower(COALESCE(n.location, '')), %s) > 0)")
+        params.extend([pattern, pattern, filters['search'], filters['search']])
+
+    sort_expressions = {
+        'id': "n.id",
+        'created_at': "n.created_at",
+        'title': "n.title",
+        'location': "n.location",
+        # Sem prioridade conta como 'Baixa', como na lista do dashboard
+        'classification.prioridade': "array_position(%s::text[], COALESCE(n.classification->>'prioridade', %s))",
+    }
+    sort_column = filters.get('sort_column') if filters.get('sort_column') in sort_expressions else 'created_at'
+    order_by = sort_expressions[sort_column]
+    if sort_column == 'classification.prioridade':
+        params.extend([list(priorities), priorities[0]])
+    direction = "ASC" if filters.get('sort_ascending') else "DESC"
+
+    query = sql.SQL("SELECT {columns} FROM notifications_all n {where} ORDER BY {order_by} {direction} NULLS LAST, n.id {direction}").format(
+        columns=sql.SQL(', ').join(sql.SQL(expression) for _, expression in EXPORT_COLUMNS),
+        where=sql.SQL("WHERE " + " AND ".join(conditions)) if conditions else sql.SQL(""),
+        order_by=sql.SQL(order_by),
+        direction=sql.SQL(direction),
+    )
+    return query, params
+
+
+def iter_export_rows(conn, filters: Dict[str, Any], priorities: Sequence[str],
+                     itersize: int = EXPORT_ITERSIZE) -> Iterator[tuple]:
+    """Linhas da exportação lidas por um cursor nomeado, itersize linhas por ida ao banco."""
+    query, params = build_export_query(filters, priorities)
+    with conn.cursor(name=f"notification_export_{uuid.uuid4().hex}") as cur:
+        cur.itersize = itersize
+        cur.execute(query, params)
+        for row in cur:
+            yield row
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, bool):
+        return "Sim" if value else "Não"
+    return value
+
+
+def write_csv(rows: Iterator[tuple], output: BinaryIO) -> int:
+    """Grava cabeçalho e linhas em output (binário) à medida que chegam. Retorna o número de linhas."""
+    text_output = io.TextIOWrapper(output, encoding='utf-8-sig', newline='')
+    writer = csv.writer(text_output, delimiter=';')
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    count = 0
+    for row in rows:
+        writer.writerow([_cell(value) for value in row])
+        count += 1
+    text_output.flush()
+    text_output.detach()  # Devolve output ao chamador sem fechá-lo
+    return count
+
+
+def iter_csv_chunks(rows: Iterator[tuple], chunk_rows: int = 500) -> Iterator[bytes]:
+    """CSV em pedaços de bytes, para respostas HTTP em streaming."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')  # BOM, como o utf-8-sig de write_csv
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    pending = 0
+    for row in rows:
+        writer.writerow([_cell(value) for value in row])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_xlsx(rows: Iterator[tuple], output: BinaryIO) -> int:
+    """Grava uma planilha em modo write_only (memória constante). Retorna o número de linhas."""
+    if Workbook is None:
+        raise RuntimeError("Exportação XLSX indisponível: instale o pacote openpyxl.")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Notificações")
+    sheet.append([header for header, _ in EXPORT_COLUMNS])
+    count = 0
+    for row in rows:
+        sheet.append([_cell(value) for value in row])
+        count += 1
+    workbook.save(output)
+    return count
+
+
+def export_notifications(conn, filters: Dict[str, Any], priorities: Sequence[str], export_format: str,
+                         output: BinaryIO) -> int:
+    """Executa a consulta filtrada e grava o arquivo no formato pedido ('csv' ou 'xlsx')."""
+    rows = iter_export_rows(conn, filters, priorities)
+    if export_format == 'xlsx':
+        return write_xlsx(rows, output)
+    return write_csv(rows, output)
+
+
+def export_filename(export_format: str, today: Optional[date] = None) -> str:
+    return f"notificacoes_{(today or date.today()).isoformat()}.{export_format}"
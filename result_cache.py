@@ -0,0 +1,243 @@
+# result_cache.py
+
+# Cache de resultados das consultas (filas de trabalho, agregados do dashboard, listas de usuários por
+# função), invalidado pelas escritas.
+# Cada entrada é gravada com as tags de que depende ('notifications', 'users', 'notification:42', ...)
+# e com a versão de cada tag naquele momento. As funções de escrita chamam invalidate(tags), que só
+# incrementa a versão das tags afetadas: na leitura, uma entrada com alguma tag de versão mais nova é
+# descartada. A versão é lida antes de calcular o resultado, então uma escrita que acontece durante o
+# cálculo também invalida a entrada gravada em seguida.
+# Escritas feitas fora do app (API, intake) não passam por aqui; para essas, cada entrada pode ter um ttl.
+#
+# Dois backends com a mesma interface:
+#   MemoryBackend: no próprio processo, LRU limitado pelo tamanho (pickle) das entradas.
+#   DiskBackend: arquivo SQLite compartilhado entre os processos do Streamlit (WAL), com o mesmo limite LRU.
+# Os valores devolvidos pelo MemoryBackend são compartilhados entre as sessões e devem ser tratados como
+# somente leitura.
+
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Tag implícita de todas as entradas; clear() a incrementa para invalidar também os cálculos em andamento
+ALL_ENTRIES_TAG = '*'
+
+# (valor, versões das tags quando foi calculado, expira em (time.time()) ou None)
+Entry = Tuple[Any, Dict[str, int], Optional[float]]
+
+
+class MemoryBackend:
+    """Backend no processo: entradas num OrderedDict (ordem de uso) e versões das tags num dict."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Tuple[Entry, int]]' = OrderedDict()
+        self._tag_versions: Dict[str, int] = {}
+        self._total_bytes = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key: Hashable, entry: Entry):
+        size = len(pickle.dumps(entry[0], protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (entry, size)
+            self._total_bytes += size
+            while self._total_bytes > self._max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {tag: self._tag_versions.get(tag, 0) for tag in tags}
+
+    def bump(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            # As versões só crescem: entradas gravadas por cálculos ainda em andamento ficam inválidas
+            for tag in self._tag_versions:
+                self._tag_versions[tag] += 1
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._total_bytes, 'evictions': self.evictions}
+
+
+class DiskBackend:
+    """
+    Backend em um arquivo SQLite, compartilhado por todos os processos que apontam para o mesmo caminho.
+    As chaves são gravadas como hash de repr(key); use chaves com repr estável (p. ex. single_flight.make_key).
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,
+                expires_at REAL, last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS tag_versions (tag TEXT PRIMARY KEY, version INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        disk_key = self._key(key)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (disk_key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), disk_key))
+        return pickle.loads(row[0])
+
+    def set(self, key: Hashable, entry: Entry):
+        payload = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self._max_bytes:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("""
+                    INSERT OR REPLACE INTO entries (key, value, size, expires_at, last_used)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (self._key(key), payload, len(payload), entry[2], time.time()))
+                total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                evicted = 0
+                if total_bytes > self._max_bytes:
+                    for evict_key, size in self._conn.execute(
+                            "SELECT key, size FROM entries ORDER BY last_used").fetchall():
+                        self._conn.execute("DELETE FROM entries WHERE key = ?", (evict_key,))
+                        evicted += 1
+                        total_bytes -= size
+                        if total_bytes <= self._max_bytes:
+                            break
+                if evicted:
+                    self._conn.execute("""
+                        INSERT INTO counters (name, value) VALUES ('evictions', ?)
+                        ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+                    """, (evicted,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (self._key(key),))
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        tags = list(tags)
+        if not tags:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT tag, version FROM tag_versions WHERE tag IN ({', '.join('?' * len(tags))})",
+                tags).fetchall()
+        versions = dict(rows)
+        return {tag: versions.get(tag, 0) for tag in tags}
+
+    def bump(self, tags: Iterable[str]):
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO tag_versions (tag, version) VALUES (?, 1)
+                ON CONFLICT (tag) DO UPDATE SET version = version + 1
+            """, [(tag,) for tag in tags])
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("UPDATE tag_versions SET version = version + 1")
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            row = self._conn.execute("SELECT value FROM counters WHERE name = 'evictions'").fetchone()
+        return {'entries': entries, 'bytes': total_bytes, 'evictions': row[0] if row else 0}
+
+
+class ResultCache:
+    """Cache de resultados com invalidação por tags sobre um MemoryBackend ou DiskBackend."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_compute(self, key: Hashable, tags: Iterable[str], compute: Callable[[], Any],
+                       ttl: Optional[float] = None) -> Any:
+        """
+        Devolve o resultado guardado para key, se ainda válido; senão calcula com compute() e guarda.
+        Exceções de compute() são propagadas e nada é guardado.
+        """
+        tags = tuple(tags) + (ALL_ENTRIES_TAG,)
+        entry = self._backend.get(key)
+        if entry is not None:
+            value, versions, expires_at = entry
+            if (expires_at is None or expires_at > time.time()) and \
+                    self._backend.tag_versions(versions) == versions:
+                with self._lock:
+                    self._hits += 1
+                return value
+        with self._lock:
+            self._misses += 1
+        versions = self._backend.tag_versions(tags)
+        value = compute()
+        self._backend.set(key, (value, versions, time.time() + ttl if ttl else None))
+        return value
+
+    def invalidate(self, *tags: str):
+        """Invalida todas as entradas que dependem de alguma das tags."""
+        if tags:
+            self._backend.bump(tags)
+
+    def clear(self):
+        """Remove todas as entradas; as gravadas por cálculos que começaram antes também ficam inválidas."""
+        self._backend.bump((ALL_ENTRIES_TAG,))
+        self._backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Acertos e falhas deste processo, e ocupação do backend (entradas, bytes, remoções por LRU)."""
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        lookups = hits + misses
+        return dict(self._backend.usage(), hits=hits, misses=misses,
+                    hit_ratio=round(hits / lookups, 3) if lookups else 0.0)
@@ -0,0 +1,85 @@
+# single_flight.py
+
+# Agrupamento de chamadas idênticas e simultâneas ("single flight").
+# Na troca de turno, dezenas de sessões abrem o dashboard ao mesmo tempo e cada uma disparava as mesmas
+# consultas pesadas. Com o SingleFlight, a primeira chamada para uma chave executa a consulta e as que
+# chegam enquanto ela está em andamento esperam e recebem o mesmo resultado (ou a mesma exceção).
+# Não é um cache: terminada a execução, a próxima chamada consulta de novo. A chave inclui uma marca de
+# versão dos dados (p. ex. NotificationIndex.version), então quem chega depois de uma alteração nunca
+# recebe um resultado calculado antes dela por uma execução mais antiga.
+# O resultado é compartilhado entre as sessões e deve ser tratado como somente leitura.
+
+import threading
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+def _normalize(value: Any) -> Hashable:
+    """Converte parâmetros em uma forma hashable e estável (listas e sets viram tuplas, datas viram ISO)."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_normalize(item) for item in value))
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def make_key(name: str, *args, watermark: Hashable = None, **kwargs) -> Tuple:
+    """Chave de agrupamento: nome da consulta + parâmetros normalizados + marca de versão dos dados."""
+    return name, _normalize(args), _normalize(kwargs), watermark
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Executa no máximo uma chamada por chave ao mesmo tempo; chamadas simultâneas compartilham o resultado."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._executed = 0
+        self._shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """Quantas execuções foram feitas e quantas chamadas receberam o resultado de outra."""
+        with self._lock:
+            return {'executed': self._executed, 'shared': self._shared, 'in_flight': len(self._calls)}
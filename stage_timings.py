@@ -0,0 +1,157 @@
+# stage_timings.py
+
+# Tempo gasto por notificação em cada etapa do fluxo (classificação, execução, aprovação), para os
+# indicadores de lead time por setor.
+# Um trigger na mudança de status de notifications abre e fecha as etapas em notification_stage_timings:
+# ao sair de uma etapa soma o tempo da passagem em duration_seconds, ao voltar para ela (reclassificação,
+# execução reprovada) abre uma nova passagem na mesma linha. Assim os percentis saem direto do SQL
+# (percentile_cont), sem reconstruir as etapas a partir dos textos de notification_history em Python.
+# Na primeira execução, as etapas são preenchidas a partir do histórico já existente (backfill).
+
+from datetime import datetime
+from typing import Dict, List
+
+from psycopg2 import sql
+
+STAGE_LABELS = {
+    'classificacao': 'Classificação',
+    'execucao': 'Execução',
+    'aprovacao': 'Aprovação',
+}
+
+# Deve rodar antes de ensure_archive_schema (a tabela também é arquivada e tem view *_all)
+STAGE_TIMINGS_DDL = """
+    CREATE TABLE IF NOT EXISTS notification_stage_timings (
+        notification_id INTEGER NOT NULL REFERENCES notifications(id) ON DELETE CASCADE,
+        stage VARCHAR(32) NOT NULL,
+        department VARCHAR(255),
+        first_started_at TIMESTAMPTZ NOT NULL,
+        started_at TIMESTAMPTZ, -- início da passagem atual; NULL quando a notificação não está na etapa
+        ended_at TIMESTAMPTZ, -- fim da última passagem
+        duration_seconds DOUBLE PRECISION NOT NULL DEFAULT 0, -- soma das passagens já encerradas
+        visits INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (notification_id, stage)
+    );
+    CREATE INDEX IF NOT EXISTS idx_stage_timings_stage_department
+        ON notification_stage_timings (stage, department, ended_at);
+
+    CREATE OR REPLACE FUNCTION notification_stage(status TEXT) RETURNS TEXT AS $$
+        SELECT CASE
+            WHEN status IN ('pendente_classificacao', 'aguardando_classificador') THEN 'classificacao'
+            WHEN status IN ('classificada', 'em_execucao') THEN 'execucao'
+            WHEN status = 'aguardando_aprovacao' THEN 'aprovacao'
+        END
+    $$ LANGUAGE sql IMMUTABLE;
+
+    CREATE OR REPLACE FUNCTION track_notification_stage() RETURNS TRIGGER AS $$
+    DECLARE
+        old_stage TEXT := NULL;
+        new_stage TEXT := notification_stage(NEW.status);
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            old_stage := notification_stage(OLD.status);
+        END IF;
+        -- classificada -> em_execucao, por exemplo, continua na mesma etapa
+        IF old_stage IS NOT DISTINCT FROM new_stage THEN
+            RETURN NULL;
+        END IF;
+        IF old_stage IS NOT NULL THEN
+            UPDATE notification_stage_timings
+            SET duration_seconds = duration_seconds + GREATEST(EXTRACT(EPOCH FROM now() - started_at), 0),
+                ended_at = now(), started_at = NULL, department = NEW.notified_department
+            WHERE notification_id = NEW.id AND stage = old_stage AND started_at IS NOT NULL;
+        END IF;
+        IF new_stage IS NOT NULL THEN
+            INSERT INTO notification_stage_timings (notification_id, stage, department, first_started_at, started_at)
+            VALUES (NEW.id, new_stage, NEW.notified_department, now(), now())
+            ON CONFLICT (notification_id, stage) DO UPDATE
+            SET started_at = now(), visits = notification_stage_timings.visits + 1,
+                department = EXCLUDED.department;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_notifications_stage_timings ON notifications;
+    CREATE TRIGGER trg_notifications_stage_timings
+        AFTER INSERT OR UPDATE OF status ON notifications
+        FOR EACH ROW EXECUTE FUNCTION track_notification_stage();
+"""
+
+# Marcos de cada etapa no histórico antigo. Passagens repetidas são aproximadas por uma só, do primeiro
+# início ao último fim.
+_BACKFILL_SQL = """
+    WITH milestones AS (
+        SELECT n.id, n.status, n.notified_department, n.created_at,
+               MIN(h.action_timestamp) FILTER (WHERE h.action_type IN (
+                   'Notificação classificada e atribuída', 'Notificação rejeitada na Classificação Inicial'
+               )) AS classification_done_at,
+               MIN(h.action_timestamp) FILTER (
+                   WHERE h.action_type = 'Notificação classificada e atribuída') AS execution_started_at,
+               MAX(h.action_timestamp) FILTER (
+                   WHERE h.action_type = 'Execução concluída (por executor)') AS execution_done_at,
+               MIN(h.action_timestamp) FILTER (
+                   WHERE h.action_type = 'Revisão de Execução: Conclusão Aceita') AS approval_started_at,
+               MAX(h.action_timestamp) FILTER (WHERE h.action_type IN (
+                   'Notificação aprovada e finalizada', 'Notificação reprovada (Aprovação)'
+               )) AS approval_done_at
+        FROM {notifications} n
+        LEFT JOIN {history} h ON h.notification_id = n.id
+        GROUP BY n.id
+    )
+    INSERT INTO {timings} (notification_id, stage, department, first_started_at, started_at, ended_at,
+                           duration_seconds)
+    SELECT m.id, s.stage, m.notified_department, s.stage_start,
+           CASE WHEN notification_stage(m.status) = s.stage THEN s.stage_start END,
+           CASE WHEN notification_stage(m.status) = s.stage THEN NULL ELSE s.stage_end END,
+           CASE WHEN notification_stage(m.status) = s.stage THEN 0
+                ELSE GREATEST(EXTRACT(EPOCH FROM s.stage_end - s.stage_start), 0) END
+    FROM milestones m
+    CROSS JOIN LATERAL (VALUES
+        ('classificacao', m.created_at, m.classification_done_at),
+        ('execucao', m.execution_started_at, m.execution_done_at),
+        ('aprovacao', m.approval_started_at, m.approval_done_at)
+    ) AS s(stage, stage_start, stage_end)
+    WHERE s.stage_start IS NOT NULL
+      AND (s.stage_end IS NOT NULL OR notification_stage(m.status) = s.stage)
+    ON CONFLICT DO NOTHING
+"""
+
+
+def backfill_stage_timings(cur):
+    """
+    Preenche as etapas a partir de notification_history, só quando ainda não há nenhuma registrada.
+    Deve rodar depois de ensure_archive_schema: as notificações arquivadas vão para a tabela de arquivo.
+    """
+    cur.execute("SELECT EXISTS (SELECT 1 FROM notification_stage_timings_all)")
+    if cur.fetchone()[0]:
+        return
+    for notifications, history, timings in (
+            ('notifications', 'notification_history', 'notification_stage_timings'),
+            ('notifications_archive', 'notification_history_archive', 'notification_stage_timings_archive')):
+        cur.execute(sql.SQL(_BACKFILL_SQL).format(
+            notifications=sql.Identifier(notifications), history=sql.Identifier(history),
+            timings=sql.Identifier(timings)))
+
+
+def lead_time_by_stage(cur, period_start: datetime, period_end: datetime) -> List[Dict]:
+    """
+    Média e percentis (mediana e p90, em horas) do tempo em cada etapa, por setor notificado e no total
+    da etapa (department = None, is_total = True), para as etapas encerradas no período [início, fim).
+    Notificações que ainda estão na etapa ficam de fora.
+    """
+    cur.execute("""
+        SELECT stage, department, GROUPING(department) = 1 AS is_total, COUNT(*),
+               AVG(duration_seconds) / 3600,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_seconds) / 3600,
+               percentile_cont(0.9) WITHIN GROUP (ORDER BY duration_seconds) / 3600
+        FROM notification_stage_timings_all
+        WHERE started_at IS NULL AND ended_at >= %s AND ended_at < %s
+        GROUP BY GROUPING SETS ((stage, department), (stage))
+        ORDER BY stage, is_total DESC, department
+    """, (period_start, period_end))
+    return [
+        {'stage': stage, 'department': department, 'is_total': is_total, 'count': count,
+         'mean_hours': mean_hours, 'median_hours': median_hours, 'p90_hours': p90_hours}
+        for stage, department, is_total, count, mean_hours, median_hours, p90_hours in cur.fetchall()
+    ]
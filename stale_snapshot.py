@@ -0,0 +1,74 @@
+# stale_snapshot.py
+
+# Modo "stale-while-revalidate" para telas que podem mostrar dados de alguns segundos atrás (dashboard).
+# A última versão calculada é devolvida na hora, junto com o horário em que foi calculada; se ela já
+# passou de max_age, uma thread em segundo plano recalcula e troca a versão quando termina. Só a primeira
+# leitura (ou uma atualização pedida explicitamente) espera pelo cálculo.
+# Se a atualização em segundo plano falhar, a versão anterior continua sendo servida e o erro fica
+# disponível em last_error até a próxima atualização bem-sucedida.
+
+import threading
+from datetime import datetime
+from typing import Any, Callable, Optional, Tuple
+
+
+class StaleWhileRevalidate:
+    """
+    Guarda um único valor compartilhado por todas as sessões.
+
+    compute: calcula o valor; roda fora da thread do Streamlit quando a atualização é em segundo plano,
+    então não deve usar st.* (erros devem ser propagados).
+    """
+
+    def __init__(self, compute: Callable[[], Any], max_age_seconds: float = 60.0):
+        self._compute = compute
+        self._max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._computed_at: Optional[datetime] = None
+        self._refreshing = False
+        self.last_error: Optional[BaseException] = None
+
+    @property
+    def refreshing(self) -> bool:
+        return self._refreshing
+
+    def get(self) -> Tuple[Any, datetime]:
+        """
+        (valor, horário do cálculo). Sem valor ainda, calcula agora; com valor vencido, devolve o atual e
+        dispara a atualização em segundo plano (uma por vez).
+        """
+        with self._lock:
+            has_value = self._computed_at is not None
+            stale = has_value and (datetime.now() - self._computed_at).total_seconds() > self._max_age_seconds
+            start_refresh = stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+            value, computed_at = self._value, self._computed_at
+        if not has_value:
+            return self.refresh()
+        if start_refresh:
+            threading.Thread(target=self._refresh_in_background, name='stale-snapshot-refresh',
+                             daemon=True).start()
+        return value, computed_at
+
+    def refresh(self) -> Tuple[Any, datetime]:
+        """Recalcula agora (na thread de quem chamou) e troca o valor. Erros são propagados."""
+        computed_at = datetime.now()
+        value = self._compute()
+        with self._lock:
+            # Uma atualização mais recente pode ter terminado antes desta
+            if self._computed_at is None or computed_at >= self._computed_at:
+                self._value, self._computed_at = value, computed_at
+            self.last_error = None
+            return self._value, self._computed_at
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            with self._lock:
+                self.last_error = e
+        finally:
+            with self._lock:
+                self._refreshing = False
@@ -7,15 +7,24 @@ import os
 import sys # Importar sys (ainda pode ser útil para debug, mas não mais para path de script)
 from datetime import datetime, date as dt_date_class, time as dt_time_class, timedelta
 from typing import Dict, List, Optional, Any
-import uuid
 import pandas as pd
 import time as time_module
 import psycopg2
 from psycopg2 import sql
 
 # Importa as constantes e as funções utilitárias que serão compartilhadas
-from constants import UI_TEXTS, FORM_DATA, DEADLINE_DAYS_MAPPING, DATA_DIR, ATTACHMENTS_DIR
-from utils import _reset_form_state, _clear_execution_form_state, _clear_approval_form_state, get_deadline_status, format_date_time_summary, display_notification_full_details, save_uploaded_file_to_disk, get_attachment_data
+from constants import UI_TEXTS, FORM_DATA, DEADLINE_DAYS_MAPPING, DATA_DIR, ATTACHMENTS_DIR, STYLESHEET_FILE
+from models import Notification, NotificationSummary, Attachment, HistoryEntry, Action
+from change_feed import NotificationIndex, CHANGE_FEED_DDL
+from history_writer import HistoryWriter
+from notification_archive import ensure_archive_schema
+from attachment_pipeline import AttachmentIngestionPipeline, ATTACHMENT_PIPELINE_DDL, ATTACHMENT_STATUS_PENDING, build_unique_name
+from detail_render_cache import ROW_VERSION_DDL
+from classification_queue import CLASSIFICATION_QUEUE_DDL
+from notification_executors import ensure_executor_schema
+from stage_timings import STAGE_TIMINGS_DDL, backfill_stage_timings
+from approval_worklist import add_approval_columns, complete_approval_columns
+from utils import _reset_form_state, _clear_execution_form_state, _clear_approval_form_state, get_deadline_status, format_date_time_summary, display_notification_full_details, get_attachment_data, stylesheet_style_tag
 
 # --- Configuração do Banco de Dados ---
 DB_CONFIG = {
@@ -181,7 +190,7 @@ def update_user(user_id: int, updates: Dict) -> Optional[Dict]:
         pass # Não fecha a conexão
 
 @st.cache_data(ttl=5) # Cache para notificações (5 segundos)
-def load_notifications() -> List[Dict]:
+def load_notifications() -> List[Notification]:
     """Carrega dados de notificação do banco de dados, incluindo dados relacionados."""
     conn = get_db_connection()
     try:
@@ -196,20 +205,14 @@ def load_notifications() -> List[Dict]:
                 classification, rejection_classification, review_execution, approval,
                 rejection_approval, rejection_execution_review, conclusion,
                 executors, approver
-            FROM notifications ORDER BY created_at DESC
+            FROM notifications_all ORDER BY created_at DESC
         """)
         notifications_raw = cur.fetchall()
 
         column_names = [desc[0] for desc in cur.description]
         notifications = []
         for row in notifications_raw:
-            notification = dict(zip(column_names, row))
-            if notification.get('occurrence_date'):
-                notification['occurrence_date'] = notification['occurrence_date'].isoformat()
-            if notification.get('occurrence_time'):
-                notification['occurrence_time'] = notification['occurrence_time'].isoformat()
-            if notification.get('created_at'):
-                notification['created_at'] = notification['created_at'].isoformat()
+            notification = Notification.from_row(column_names, row)
 
             # Passa a conexão e cursor para as funções auxiliares usarem a mesma transação
             notification['attachments'] = get_notification_attachments(notification['id'], conn, cur)
@@ -225,6 +228,119 @@ def load_notifications() -> List[Dict]:
     finally:
         pass # Não fecha a conexão
 
+def _fetch_notification_summaries(notification_ids: Optional[List[int]] = None) -> List[NotificationSummary]:
+    """
+    Consulta a projeção resumida das notificações usada pelas listas (cards, filtros e contadores).
+    Campos pesados e tabelas relacionadas ficam para load_notification_detail.
+    Com notification_ids, busca apenas essas notificações. Erros de banco são propagados ao chamador.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        id_filter = sql.SQL("WHERE id = ANY(%s)") if notification_ids is not None else sql.SQL("")
+        cur.execute(sql.SQL("""
+            SELECT
+                id, title, location, status, created_at, occurrence_date,
+                reporting_department, notified_department, executors, approver,
+                CASE WHEN classification IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                    'prioridade', classification->'prioridade',
+                    'deadline_date', classification->'deadline_date',
+                    'nnc', classification->'nnc',
+                    'event_type_main', classification->'event_type_main',
+                    'classification_timestamp', classification->'classification_timestamp'
+                )) END AS classification,
+                CASE WHEN conclusion IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                    'concluded_by', conclusion->'concluded_by',
+                    'timestamp', conclusion->'timestamp'
+                )) END AS conclusion,
+                CASE WHEN approval IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                    'approved_by', approval->'approved_by'
+                )) END AS approval,
+                CASE WHEN rejection_classification IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                    'classified_by', rejection_classification->'classified_by'
+                )) END AS rejection_classification,
+                CASE WHEN rejection_approval IS NULL THEN NULL ELSE jsonb_strip_nulls(jsonb_build_object(
+                    'rejected_by', rejection_approval->'rejected_by'
+                )) END AS rejection_approval
+            FROM notifications_all {} ORDER BY created_at DESC
+        """).format(id_filter), (notification_ids,) if notification_ids is not None else None)
+        column_names = [desc[0] for desc in cur.description]
+        return [NotificationSummary.from_row(column_names, row) for row in cur.fetchall()]
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.close() # Não fecha a conexão
+
+@st.cache_resource
+def get_notification_index() -> NotificationIndex:
+    """Índice de resumos compartilhado por todas as sessões do processo, atualizado via LISTEN/NOTIFY."""
+    # O LISTEN usa uma conexão própria, separada da conexão compartilhada em cache
+    index = NotificationIndex(lambda: psycopg2.connect(**DB_CONFIG), _fetch_notification_summaries)
+    index.start()
+    return index
+
+def load_notification_summaries() -> List[NotificationSummary]:
+    """
+    Devolve a projeção resumida de todas as notificações a partir do índice em memória.
+    Apenas as notificações alteradas desde a última leitura são buscadas novamente no banco.
+    """
+    try:
+        return get_notification_index().summaries()
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar notificações: {e}")
+        return []
+
+@st.cache_data(ttl=5) # Cache para o detalhe de uma notificação (5 segundos)
+def load_notification_detail(notification_id: int) -> Optional[Notification]:
+    """Carrega uma única notificação completa (todas as colunas, anexos, histórico e ações)."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT
+                id, title, description, location, occurrence_date, occurrence_time,
+                reporting_department, reporting_department_complement, notified_department,
+                notified_department_complement, event_shift, immediate_actions_taken,
+                immediate_action_description, patient_involved, patient_id, patient_outcome_obito,
+                additional_notes, status, created_at,
+                classification, rejection_classification, review_execution, approval,
+                rejection_approval, rejection_execution_review, conclusion,
+                executors, approver, row_version
+            FROM notifications_all WHERE id = %s
+        """, (notification_id,))
+        row = cur.fetchone()
+        if not row:
+            cur.close()
+            return None
+        notification = Notification.from_row([desc[0] for desc in cur.description], row)
+        notification['attachments'] = get_notification_attachments(notification_id, conn, cur)
+        notification['history'] = get_notification_history(notification_id, conn, cur)
+        notification['actions'] = get_notification_actions(notification_id, conn, cur)
+        cur.close()
+        return notification
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar a notificação {notification_id}: {e}")
+        return None
+    finally:
+        pass # Não fecha a conexão
+
+@st.cache_resource
+def get_attachment_pipeline() -> AttachmentIngestionPipeline:
+    """Pipeline de ingestão de anexos compartilhado pelo processo; retoma em segundo plano o que ficou sem processar."""
+    pipeline = AttachmentIngestionPipeline(ATTACHMENTS_DIR, lambda: psycopg2.connect(**DB_CONFIG))
+    pipeline.start_recovery()
+    return pipeline
+
+def _clear_notification_caches():
+    """
+    Invalida os caches de leitura de notificações após uma escrita.
+    Os resumos não entram aqui: o índice em memória é atualizado pelo feed de alterações.
+    """
+    load_notifications.clear()
+    load_notification_detail.clear()
+    load_worklist_counts.clear()
+
 def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None) -> Dict:
     """
     Cria um novo registro de notificação no banco de dados e seus anexos iniciais,
@@ -232,11 +348,15 @@ def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None)
     """
     conn = get_db_connection()
     notification_id = None
+    pipeline = get_attachment_pipeline()
+    reserved_attachments = []
+    committed = False
     try:
         cur = conn.cursor()
 
-        occurrence_date_iso = data.get('occurrence_date').isoformat() if isinstance(data.get('occurrence_date'), dt_date_class) else None
-        occurrence_time_str = data.get('occurrence_time').isoformat() if isinstance(data.get('occurrence_time'), dt_time_class) else None
+        # psycopg2 adapta date/time/datetime nativos; não é preciso converter para string
+        occurrence_date = data.get('occurrence_date') if isinstance(data.get('occurrence_date'), dt_date_class) else None
+        occurrence_time = data.get('occurrence_time') if isinstance(data.get('occurrence_time'), dt_time_class) else None
 
         cur.execute("""
             INSERT INTO notifications (
@@ -251,8 +371,8 @@ def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None)
             data.get('title', '').strip(),
             data.get('description', '').strip(),
             data.get('location', '').strip(),
-            occurrence_date_iso,
-            occurrence_time_str,
+            occurrence_date,
+            occurrence_time,
             data.get('reporting_department', '').strip(),
             data.get('reporting_department_complement', '').strip(),
             data.get('notified_department', '').strip(),
@@ -265,18 +385,20 @@ def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None)
             (True if data.get('patient_outcome_obito') == "Sim" else False if data.get('patient_outcome_obito') == "Não" else None) if data.get('patient_involved') == "Sim" else None,
             data.get('additional_notes', '').strip(),
             "pendente_classificacao",
-            datetime.now().isoformat()
+            datetime.now()
         ))
         notification_id = cur.fetchone()[0]
 
-        if uploaded_files:
-            for file in uploaded_files:
-                saved_file_info = save_uploaded_file_to_disk(file, notification_id)
-                if saved_file_info:
-                    cur.execute("""
-                        INSERT INTO notification_attachments (notification_id, unique_name, original_name)
-                        VALUES (%s, %s, %s)
-                    """, (notification_id, saved_file_info['unique_name'], saved_file_info['original_name']))
+        # Anexos: conteúdo gravado sem processar na área de entrada e linha 'pending' antes do commit;
+        # compressão e hash ficam para o pipeline, após o commit
+        for file in uploaded_files or []:
+            unique_name = build_unique_name(notification_id, file.name)
+            reserved_attachments.append(unique_name)
+            pipeline.stage(file, unique_name)
+            cur.execute("""
+                INSERT INTO notification_attachments (notification_id, unique_name, original_name, status)
+                VALUES (%s, %s, %s, %s)
+            """, (notification_id, unique_name, file.name, ATTACHMENT_STATUS_PENDING))
 
         add_history_entry(
             notification_id,
@@ -289,25 +411,32 @@ def create_notification(data: Dict, uploaded_files: Optional[List[Any]] = None)
         )
 
         conn.commit()
+        committed = True
         cur.close()
-        load_notifications.clear() # Invalida o cache de notificações após a criação
+        _clear_notification_caches() # Invalida o cache de notificações após a criação
+        get_notification_index().mark_changed([notification_id]) # Não espera o NOTIFY para refletir a escrita
 
-        # Retorna a notificação completa para consistência (recarrega do cache)
-        all_notifications_cached = load_notifications()
-        created_notification = next((n for n in all_notifications_cached if n['id'] == notification_id), None)
-        return created_notification
+        for unique_name in reserved_attachments:
+            pipeline.submit(unique_name)
 
-    except psycopg2.Error as e:
+        # Retorna a notificação completa para consistência (apenas o registro criado)
+        return load_notification_detail(notification_id)
+
+    except (psycopg2.Error, OSError) as e:
         st.error(f"Erro ao criar notificação: {e}")
         if conn:
             conn.rollback()
+        if not committed:
+            for unique_name in reserved_attachments:
+                pipeline.discard(unique_name)
         return {}
     finally:
         pass # Não fecha a conexão
 
-def update_notification(notification_id: int, updates: Dict):
+def update_notification(notification_id: int, updates: Dict, history: Optional[HistoryWriter] = None):
     """
     Atualiza um registro de notificação, invalidando o cache de notificações.
+    As entradas acumuladas em history são gravadas na mesma transação (um único commit).
     """
     conn = get_db_connection()
     try:
@@ -320,8 +449,8 @@ def update_notification(notification_id: int, updates: Dict):
             'immediate_actions_taken': lambda x: True if x == "Sim" else False if x == "Não" else None,
             'patient_involved': lambda x: True if x == "Sim" else False if x == "Não" else None,
             'patient_outcome_obito': lambda x: (True if x == "Sim" else False if x == "Não" else None),
-            'occurrence_date': lambda x: x.isoformat() if isinstance(x, dt_date_class) else x,
-            'occurrence_time': lambda x: x.isoformat() if isinstance(x, dt_time_class) else x,
+            'occurrence_date': lambda x: x,  # date/time nativos são adaptados pelo psycopg2
+            'occurrence_time': lambda x: x,
             'classification': lambda x: json.dumps(x) if x is not None else None,
             'rejection_classification': lambda x: json.dumps(x) if x is not None else None,
             'review_execution': lambda x: json.dumps(x) if x is not None else None,
@@ -341,24 +470,25 @@ def update_notification(notification_id: int, updates: Dict):
                     set_clauses.append(sql.Identifier(key) + sql.SQL(' = %s'))
                     values.append(value)
 
-        if not set_clauses:
+        if not set_clauses and not history:
             return None
 
-        query = sql.SQL(
-            "UPDATE notifications SET {} WHERE id = %s").format(
-            sql.SQL(', ').join(set_clauses)
-        )
-        values.append(notification_id)
-
-        cur.execute(query, values)
+        if set_clauses:
+            query = sql.SQL(
+                "UPDATE notifications SET {} WHERE id = %s").format(
+                sql.SQL(', ').join(set_clauses)
+            )
+            values.append(notification_id)
+            cur.execute(query, values)
+        if history:
+            history.flush(cur)
         conn.commit()
         cur.close()
-        load_notifications.clear() # Invalida o cache de notificações após a atualização
+        _clear_notification_caches() # Invalida o cache de notificações após a atualização
+        get_notification_index().mark_changed([notification_id]) # Não espera o NOTIFY para refletir a escrita
 
-        # Retorna a notificação completa para consistência (recarrega do cache)
-        all_notifications_cached = load_notifications()
-        updated_notification = next((n for n in all_notifications_cached if n['id'] == notification_id), None)
-        return updated_notification
+        # Retorna a notificação completa para consistência (apenas o registro atualizado)
+        return load_notification_detail(notification_id)
 
     except psycopg2.Error as e:
         st.error(f"Erro ao atualizar notificação: {e}")
@@ -369,7 +499,41 @@ def update_notification(notification_id: int, updates: Dict):
         pass # Não fecha a conexão
 
 # Funções auxiliares para buscar dados relacionados (usadas por load_notifications)
-def get_notification_attachments(notification_id: int, conn=None, cur=None) -> List[Dict]:
+@st.cache_data(ttl=5) # Cache para os contadores da barra lateral (5 segundos)
+def load_worklist_counts(user_id: Optional[int]) -> Dict[str, int]:
+    """
+    Contadores das filas de trabalho para a barra lateral, numa única consulta agregada.
+    Lê só a tabela quente (as notificações em andamento nunca são arquivadas).
+    """
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT
+                COUNT(*) FILTER (WHERE status = 'pendente_classificacao'),
+                COUNT(*) FILTER (WHERE status = 'revisao_classificador_execucao'),
+                COUNT(*) FILTER (WHERE status IN ('classificada', 'em_execucao') AND id IN (
+                    SELECT notification_id FROM notification_executors WHERE executor_id = %s)),
+                COUNT(*) FILTER (WHERE status = 'aguardando_aprovacao' AND approver = %s)
+            FROM notifications
+            WHERE status IN ('pendente_classificacao', 'revisao_classificador_execucao', 'classificada',
+                             'em_execucao', 'aguardando_aprovacao')
+        """, (user_id, user_id))
+        pending_classification, pending_review, my_executions, my_approvals = cur.fetchone()
+        cur.close()
+        return {
+            'pending_classification': pending_classification,
+            'pending_review': pending_review,
+            'my_executions': my_executions,
+            'my_approvals': my_approvals,
+        }
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar contadores de pendências: {e}")
+        return {}
+    finally:
+        pass # Não fecha a conexão
+
+def get_notification_attachments(notification_id: int, conn=None, cur=None) -> List[Attachment]:
     """Busca anexos para uma notificação específica. Pode usar conexão e cursor existentes."""
     local_conn = conn
     local_cur = cur
@@ -378,10 +542,10 @@ def get_notification_attachments(notification_id: int, conn=None, cur=None) -> L
             local_conn = get_db_connection()
             local_cur = local_conn.cursor()
 
-        local_cur.execute("SELECT unique_name, original_name FROM notification_attachments WHERE notification_id = %s",
+        local_cur.execute("SELECT unique_name, original_name, status FROM notification_attachments_all WHERE notification_id = %s",
                           (notification_id,))
         attachments_raw = local_cur.fetchall()
-        return [{"unique_name": att[0], "original_name": att[1]} for att in attachments_raw]
+        return [Attachment.from_row(att) for att in attachments_raw]
     except psycopg2.Error as e:
         st.error(f"Erro ao carregar anexos da notificação {notification_id}: {e}")
         return []
@@ -392,7 +556,7 @@ def get_notification_attachments(notification_id: int, conn=None, cur=None) -> L
         if not (conn and cur) and local_conn and local_conn is not conn: local_conn.close()
 
 
-def get_notification_history(notification_id: int, conn=None, cur=None) -> List[Dict]:
+def get_notification_history(notification_id: int, conn=None, cur=None) -> List[HistoryEntry]:
     """Busca entradas de histórico para uma notificação. Pode usar conexão e cursor existentes."""
     local_conn = conn
     local_cur = cur
@@ -402,18 +566,10 @@ def get_notification_history(notification_id: int, conn=None, cur=None) -> List[
             local_cur = local_conn.cursor()
 
         local_cur.execute(
-            "SELECT action_type, performed_by, action_timestamp, details FROM notification_history WHERE notification_id = %s ORDER BY action_timestamp",
+            "SELECT action_type, performed_by, action_timestamp, details FROM notification_history_all WHERE notification_id = %s ORDER BY action_timestamp",
             (notification_id,))
         history_raw = local_cur.fetchall()
-        return [
-            {
-                "action": h[0],
-                "user": h[1],
-                "timestamp": h[2].isoformat() if h[2] else None,
-                "details": h[3]
-            }
-            for h in history_raw
-        ]
+        return [HistoryEntry.from_row(h) for h in history_raw]
     except psycopg2.Error as e:
         st.error(f"Erro ao carregar histórico da notificação {notification_id}: {e}")
         return []
@@ -421,7 +577,7 @@ def get_notification_history(notification_id: int, conn=None, cur=None) -> List[
         if not (conn and cur) and local_cur: local_cur.close()
         if not (conn and cur) and local_conn and local_conn is not conn: local_conn.close()
 
-def get_notification_actions(notification_id: int, conn=None, cur=None) -> List[Dict]:
+def get_notification_actions(notification_id: int, conn=None, cur=None) -> List[Action]:
     """Busca ações de executores para uma notificação. Pode usar conexão e cursor existentes."""
     local_conn = conn
     local_cur = cur
@@ -431,21 +587,10 @@ def get_notification_actions(notification_id: int, conn=None, cur=None) -> List[
             local_cur = local_conn.cursor()
 
         local_cur.execute(
-            "SELECT executor_id, executor_name, description, action_timestamp, final_action_by_executor, evidence_description, evidence_attachments FROM notification_actions WHERE notification_id = %s ORDER BY action_timestamp",
+            "SELECT executor_id, executor_name, description, action_timestamp, final_action_by_executor, evidence_description, evidence_attachments FROM notification_actions_all WHERE notification_id = %s ORDER BY action_timestamp",
             (notification_id,))
         actions_raw = local_cur.fetchall()
-        return [
-            {
-                "executor_id": a[0],
-                "executor_name": a[1],
-                "description": a[2],
-                "timestamp": a[3].isoformat() if a[3] else None,
-                "final_action_by_executor": a[4],
-                "evidence_description": a[5],
-                "evidence_attachments": a[6]
-            }
-            for a in actions_raw
-        ]
+        return [Action.from_row(a) for a in actions_raw]
     except psycopg2.Error as e:
         st.error(f"Erro ao carregar ações da notificação {notification_id}: {e}")
         return []
@@ -465,14 +610,13 @@ def add_history_entry(notification_id: int, action: str, user: str, details: str
             local_conn = get_db_connection()
             local_cur = local_conn.cursor()
 
-        local_cur.execute("""
-            INSERT INTO notification_history (notification_id, action_type, performed_by, action_timestamp, details)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (notification_id, action, user, datetime.now().isoformat(), details))
+        history = HistoryWriter()
+        history.add(notification_id, action, user, details)
+        history.flush(local_cur)
 
         if not (conn and cursor):
             local_conn.commit()
-        load_notifications.clear() # Invalida o cache de notificações
+        _clear_notification_caches() # Invalida o cache de notificações
         return True
     except psycopg2.Error as e:
         st.error(f"Erro ao adicionar entrada de histórico para notificação {notification_id}: {e}")
@@ -511,7 +655,7 @@ def add_notification_action(notification_id: int, action_data: Dict, conn=None,
         ))
         if not (conn and cur):
             local_conn.commit()
-        load_notifications.clear() # Invalida o cache de notificações
+        _clear_notification_caches() # Invalida o cache de notificações
         return True
     except psycopg2.Error as e:
         st.error(f"Erro ao adicionar ação para notificação {notification_id}: {e}")
@@ -578,259 +722,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# NOVO CSS: Oculta o menu de navegação nativo do Streamlit na sidebar
-st.markdown(r"""
-<style>
-    /* Esconde o menu de navegação nativo gerado pelo Streamlit */
-    div[data-testid="stSidebarNav"] {
-        display: none !important;
-    }
-
-    /* Esconde botões e decorações padrão do Streamlit */
-    button[data-testid="stDeployButton"],
-    .stDeployButton,
-    footer,
-    #stDecoration,
-    .stAppDeployButton {
-        display: none !important;
-    }
-
-    /* Ajuste de margem superior para o container principal do Streamlit */
-    .reportview-container {
-        margin-top: -2em;
-    }
-
-    /* Garante que a Sidebar fique ACIMA de outros elementos fixos, se houver */
-    div[data-testid="stSidebar"] {
-        z-index: 9999 !important; /* Prioridade de empilhamento muito alta */
-    }
-
-    /* Adjust Streamlit's default margins for sidebar content */
-    [data-testid="stSidebarContent"] {
-        padding-top: 10px;
-    }
-
-    /* Logo - Reduced size and moved up */
-    div[data-testid="stSidebar"] img {
-        transform: scale(0.6);
-        transform-origin: top center;
-        margin-top: -80px;
-        margin-bottom: -20px;
-    }
-
-    /* Estilo do cabeçalho principal da aplicação */
-    .main-header {
-        text-align: center;
-        color: #2E86AB;
-        margin-bottom: 30px;
-    }
-
-    /* Novo Estilo para o Título Principal da Sidebar */
-    [data-testid="stSidebarContent"] .sidebar-main-title {
-        text-align: center !important;
-        color: #00008B !important;
-        font-size: 1.76em !important;
-        font-weight: 700 !important;
-        text-transform: uppercase !important;
-        letter-spacing: 2px !important;
-        text-shadow: 1px 1px 2px rgba(0, 0, 0, 0.2) !important;
-        margin-top: -30px !important;
-    }
-
-    /* Novo Estilo para o Subtítulo da Sidebar */
-    [data-testid="stSidebarContent"] .sidebar-subtitle {
-        text-align: center !important;
-        color: #333 !important;
-        font-size: 0.72em !important;
-        font-weight: 400 !important;
-        text-transform: uppercase !important;
-        letter-spacing: 1.5px !important;
-        margin-top: -30px !important;
-        margin-bottom: 5px !important;
-    }
-
-    /* Estilo geral para cartões de notificação */
-    .notification-card {
-        border: 1px solid #ddd;
-        border-radius: 10px;
-        padding: 15px;
-        margin: 10px 0;
-        background-color: #f9f9f9;
-        color: #2E86AB;
-    }
-
-    /* Cores e destaque para diferentes status de notificação */
-    .status-pendente_classificacao { color: #ff9800; font-weight: bold; }
-    .status-classificada { color: #2196f3; font-weight: bold; }
-    .status-em_execucao { color: #9c27b0; font-weight: bold; }
-    .status-aguardando_classificador { color: #ff5722; font-weight: bold; }
-    .status-revisao_classificador_execucao { color: #8BC34A; font-weight: bold; }
-    .status-aguardando_aprovacao { color: #ffc107; font-weight: bold; }
-    .status-aprovada { color: #4caf50; font-weight: bold; }
-    .status-concluida { color: #4caf50; font-weight: bold; }
-    .status-rejeitada { color: #f44336; font-weight: bold; }
-    .status-reprovada { color: #f44336; font-weight: bold; }
-    /* Estilo para o conteúdo da barra lateral */
-    .sidebar .sidebar-content {
-        background-color: #f0f2f6;
-    }
-
-    /* Estilo para a caixa de informações do usuário na sidebar */
-    .user-info {
-        background-color: #e8f4fd;
-        padding: 10px;
-        border-radius: 5px;
-        margin-bottom: 20px;
-    }
-
-    /* Estilo para seções de formulário */
-    .form-section {
-        background-color: #f8f9fa;
-        padding: 15px;
-        border-radius: 8px;
-        margin: 10px 0;
-        border-left: 4px solid #2E86AB;
-    }
-
-    /* Estilo para campos condicionais em formulários (ex: detalhes de ação imediata) */
-    .conditional-field {
-        background-color: #fff3cd;
-        padding: 10px;
-        border-radius: 5px;
-        border-left: 3px solid #ffc107;
-        margin: 10px 0;
-    }
-
-    /* Estilo para campos obrigatórios */
-    .required-field {
-        color: #dc3545;
-        font-weight: bold;
-    }
-
-    /* Cores específicas para botões "Sim" e "Não" selecionados */
-    div.stButton > button[data-testid='stButton'][data-key*='_sim_step'][data-selected='true'] {
-        border-color: #4caf50;
-        color: #4caf50;
-    }
-    div.stButton > button[data-testid='stButton'][data-key*='_nao_step'][data-selected='true'] {
-        border-color: #f44336;
-        color: #f44336;
-    }
-
-    /* Negrito geral para labels dentro de blocos horizontais do Streamlit */
-    div[data-testid="stHorizontalBlock"] div[data-testid^="st"] label p {
-        font-weight: bold;
-    }
-
-    /* Estilo para cartões de métricas no dashboard */
-    .metric-card {
-        background-color: #ffffff;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 10px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        text-align: center;
-    }
-
-    .metric-card h4 {
-        margin-top: 0;
-        color: #333;
-    }
-
-    .metric-card p {
-        font-size: 1.8em;
-        font-weight: bold;
-        color: #2E86AB;
-        margin-bottom: 0;
-    }
-
-    /* Estilo para o rodapé da sidebar */
-    .sidebar-footer {
-        text-align: center;
-        margin-top: 20px;
-        padding: 10px;
-        color: #888;
-        font-size: 0.75em;
-        border-top: 1px solid #eee;
-    }
-
-    /* Remove padding do container principal, pois o rodapé fixo foi removido */
-    div[data-testid="stAppViewContainer"] {
-        padding-bottom: 0px;
-    }
-
-    /* Estilos para o fundo do cartão de notificação com base no status do prazo */
-    .notification-card.card-prazo-dentro {
-        background-color: #e6ffe6;
-        border: 1px solid #4CAF50;
-    }
-
-    /* Estilos para o fundo do cartão de notificação com base no status do prazo */
-    .notification-card.card-prazo-fora {
-        background-color: #ffe6e6;
-        border: 1px solid #F44336;
-    }
-
-    /* Estilos para status de prazo */
-    .deadline-ontrack { color: #4CAF50; font-weight: bold; }
-    .deadline-duesoon { color: #FFC107; font-weight: bold; }
-
-    /* Estilo para entrada de ação individual */
-    .action-entry-card {
-        border: 1px solid #cceeff;
-        border-left: 5px solid #2E86AB;
-        border-radius: 8px;
-        padding: 12px;
-        margin-top: 10px;
-        margin-bottom: 10px;
-        background-color: #f0f8ff;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-    }
-
-    .action-entry-card strong {
-        color: #2E86AB;
-    }
-
-    .action-entry-card em {
-        color: #555;
-    }
-
-    /* Estilo para "minhas" ações na execução */
-    .my-action-entry-card {
-        border: 1px solid #d4edda;
-        border-left: 5px solid #28a745;
-        border-radius: 8px;
-        padding: 12px;
-        margin-top: 10px;
-        margin-bottom: 10px;
-        background-color: #eaf7ed;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-    }
-
-    .my-action-entry-card strong {
-        color: #28a745;
-    }
-
-    /* Estilo para a seção de evidências dentro de uma ação */
-    .evidence-section {
-        background-color: #ffffff;
-        border-top: 1px dashed #cccccc;
-        margin-top: 10px;
-        padding-top: 10px;
-    }
-
-    .evidence-section h6 {
-        color: #666;
-        margin-bottom: 5px;
-    }
-
-    options = {
-        'show_menu': False }
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-
-</style>
-""", unsafe_allow_html=True)
+# CSS em static/streamlit_app.css, lido uma vez por processo e injetado num bloco <style>
+# (o servidor de arquivos estáticos do Streamlit envia .css como text/plain, então um <link> não funciona)
+st.markdown(stylesheet_style_tag(STYLESHEET_FILE), unsafe_allow_html=True)
 
 # --- Funções de Renderização da Interface (UI) da Sidebar ---
 
@@ -856,6 +750,7 @@ def show_sidebar():
 
             # --- BOTÕES DE NAVEGAÇÃO CUSTOMIZADOS ---
             user_roles = st.session_state.user.get('roles', [])
+            worklist_counts = load_worklist_counts(st.session_state.user.get('id'))
 
             # Botão "Nova Notificação" (geralmente acessível a todos)
             if st.button("📝 Nova Notificação", key="nav_create_notif", use_container_width=True):
@@ -868,17 +763,25 @@ def show_sidebar():
 
             # Botão "Classificação/Revisão" (acessível para Classificador e Admin)
             if 'classificador' in user_roles or 'admin' in user_roles:
-                if st.button("🔍 Classificação/Revisão", key="nav_classification", use_container_width=True):
+                classification_badge = (f" ({worklist_counts['pending_classification']} · "
+                                        f"{worklist_counts['pending_review']})") if worklist_counts else ""
+                if st.button(f"🔍 Classificação/Revisão{classification_badge}", key="nav_classification",
+                             use_container_width=True,
+                             help="Pendentes de classificação · aguardando revisão da execução"):
                     st.switch_page("pages/3_Classificacao_e_Revisao.py")
 
             # Botão "Execução" (acessível para Executor e Admin)
             if 'executor' in user_roles or 'admin' in user_roles:
-                if st.button("⚡ Execução", key="nav_execution", use_container_width=True):
+                execution_badge = f" ({worklist_counts['my_executions']})" if worklist_counts else ""
+                if st.button(f"⚡ Execução{execution_badge}", key="nav_execution", use_container_width=True,
+                             help="Notificações atribuídas a você aguardando ou em execução"):
                     st.switch_page("pages/4_Execucao.py")
 
             # Botão "Aprovação" (acessível para Aprovador e Admin)
             if 'aprovador' in user_roles or 'admin' in user_roles:
-                if st.button("✅ Aprovação", key="nav_approval", use_container_width=True):
+                approval_badge = f" ({worklist_counts['my_approvals']})" if worklist_counts else ""
+                if st.button(f"✅ Aprovação{approval_badge}", key="nav_approval", use_container_width=True,
+                             help="Notificações aguardando a sua aprovação"):
                     st.switch_page("pages/5_Aprovacao.py")
 
             # Botão "Administração" (acessível apenas para Admin)
@@ -1046,6 +949,25 @@ def init_database():
             CREATE INDEX IF NOT EXISTS idx_actions_executor_id ON notification_actions (executor_id);
             CREATE INDEX IF NOT EXISTS idx_actions_timestamp ON notification_actions (action_timestamp);
         """)
+        # Triggers do feed de alterações (pg_notify 'notif_changes') usados pelo índice em memória
+        cur.execute(CHANGE_FEED_DDL)
+        # Colunas de status/hash dos anexos gravados pelo pipeline de ingestão
+        cur.execute(ATTACHMENT_PIPELINE_DDL)
+        # row_version da notificação, usado como chave do cache de renderização dos detalhes
+        cur.execute(ROW_VERSION_DDL)
+        # Colunas de reserva da fila de classificação inicial
+        cur.execute(CLASSIFICATION_QUEUE_DDL)
+        # Executores por notificação (tabela normalizada mantida por triggers a partir de executors)
+        ensure_executor_schema(cur)
+        # Tempo por etapa do fluxo, usado nos indicadores de lead time
+        cur.execute(STAGE_TIMINGS_DDL)
+        # classified_at e approved_by/rejected_by, usados pela página de aprovação
+        approval_columns_added = add_approval_columns(cur)
+        # Tabelas de arquivo e views *_all (depois de todas as alterações de colunas acima)
+        ensure_archive_schema(cur)
+        # Na primeira vez, preenche o tempo por etapa a partir do histórico (depois do arquivo existir)
+        backfill_stage_timings(cur)
+        complete_approval_columns(cur, backfill=approval_columns_added)
 
         # Verifica se o usuário 'admin' padrão existe, se não, cria
         # Acesso direto a conn.cursor() já garante que a conexão está ativa devido ao get_db_connection()
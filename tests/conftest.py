@@ -0,0 +1,15 @@
+# Os módulos do app ficam na raiz do repositório (sem pacote); os testes os importam de lá.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def wait_until(predicate, timeout=5.0):
+    """Espera predicate() ficar verdadeiro (threads em segundo plano); falha o teste depois de timeout segundos."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condição não atingida no tempo limite")
+        time.sleep(0.001)
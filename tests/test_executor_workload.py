@@ -0,0 +1,56 @@
+from datetime import date
+
+from executor_workload import deadline_counts, executor_workload, parse_deadline_date, suggest_executors
+
+TODAY = date(2024, 3, 10)
+
+
+class FakeCursor:
+    """Cursor que devolve linhas prontas, no formato da consulta de executor_workload."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=None):
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_parse_deadline_date():
+    assert parse_deadline_date('2024-03-15') == date(2024, 3, 15)
+    assert parse_deadline_date('2024-03-15T18:00:00') == date(2024, 3, 15)
+    assert parse_deadline_date('2024-03-15 18:00') == date(2024, 3, 15)
+    for invalid in (None, '', 'N/A', '15/03/2024', '2024-3-15', '2024-03-15x', '2024-13-01'):
+        assert parse_deadline_date(invalid) is None
+
+
+def test_impossible_dates_are_ignored():
+    assert parse_deadline_date('2024-02-30') is None
+    assert parse_deadline_date('2023-04-31') is None
+    assert parse_deadline_date('2023-02-29') is None
+    assert parse_deadline_date('2024-02-29') == date(2024, 2, 29)
+
+
+def test_deadline_counts():
+    deadlines = ['2024-03-09', '2024-02-30', '2024-03-10', '2024-03-13', '2024-03-14', 'N/A', None]
+    # Atrasado: 09/03; vencem em até 3 dias: 10/03 e 13/03; 14/03 ainda não; inválidos não contam
+    assert deadline_counts(deadlines, TODAY) == (1, 2)
+
+
+def test_workload_with_impossible_deadline_is_not_dropped():
+    cur = FakeCursor([
+        (1, 'Ana', 'ana', 2, ['2024-02-30', '2024-03-01'], 0),
+        (2, 'Bruno', 'bruno', 1, ['2023-04-31'], 3),
+        (3, 'Carla', 'carla', 0, [], 1),
+    ])
+    workload = executor_workload(cur, 'UTI', today=TODAY)
+
+    assert cur.params == {'department': 'UTI'}
+    assert [e['id'] for e in workload] == [3, 2, 1]
+    ana = workload[2]
+    assert (ana['open_count'], ana['overdue_count'], ana['due_soon_count']) == (2, 1, 0)
+    assert ana['load_score'] == 4
+    assert workload[1]['overdue_count'] == 0
+    assert suggest_executors(workload) == [workload[0]]
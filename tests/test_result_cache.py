@@ -0,0 +1,101 @@
+import pickle
+
+import pytest
+
+from result_cache import DiskBackend, MemoryBackend, ResultCache
+
+
+@pytest.fixture(params=['memory', 'disk'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return ResultCache(MemoryBackend())
+    return ResultCache(DiskBackend(str(tmp_path / 'cache.sqlite3')))
+
+
+def test_hit_until_tag_is_invalidated(cache):
+    values = iter(['v1', 'v2'])
+    assert cache.get_or_compute('k', ('notifications',), lambda: next(values)) == 'v1'
+    assert cache.get_or_compute('k', ('notifications',), lambda: next(values)) == 'v1'
+    cache.invalidate('users')
+    assert cache.get_or_compute('k', ('notifications',), lambda: next(values)) == 'v1'
+    cache.invalidate('notifications')
+    assert cache.get_or_compute('k', ('notifications',), lambda: next(values)) == 'v2'
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 2
+
+
+def test_tag_bump_during_compute_invalidates_stored_entry(cache):
+    def compute_with_concurrent_write():
+        # Uma escrita termina enquanto o resultado (já desatualizado) ainda está sendo calculado
+        cache.invalidate('notification:42')
+        return 'antes da escrita'
+
+    assert cache.get_or_compute('k', ('notification:42',), compute_with_concurrent_write) == 'antes da escrita'
+    assert cache.get_or_compute('k', ('notification:42',), lambda: 'depois da escrita') == 'depois da escrita'
+    assert cache.get_or_compute('k', ('notification:42',), lambda: 'não recalcula') == 'depois da escrita'
+
+
+def test_compute_error_stores_nothing(cache):
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('k', ('notifications',), lambda: (_ for _ in ()).throw(RuntimeError("falha")))
+    assert cache.get_or_compute('k', ('notifications',), lambda: 'ok') == 'ok'
+
+
+def test_clear_invalidates_entries_computed_before_it(cache):
+    def compute_with_concurrent_clear():
+        cache.clear()
+        return 'antigo'
+
+    cache.get_or_compute('k', ('users',), compute_with_concurrent_clear)
+    assert cache.get_or_compute('k', ('users',), lambda: 'novo') == 'novo'
+
+
+def _size(value):
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def test_memory_backend_lru_byte_accounting():
+    a, b, c = b'a' * 100, b'b' * 100, b'c' * 100
+    entry_size = _size(a)
+    backend = MemoryBackend(max_bytes=entry_size * 2 + entry_size // 2)
+
+    backend.set('a', (a, {}, None))
+    backend.set('b', (b, {}, None))
+    assert backend.usage() == {'entries': 2, 'bytes': 2 * entry_size, 'evictions': 0}
+
+    # Regravar a mesma chave não conta o tamanho duas vezes
+    backend.set('a', (a, {}, None))
+    assert backend.usage()['bytes'] == 2 * entry_size
+
+    # 'a' foi usada por último; a próxima entrada remove 'b', a menos usada
+    assert backend.get('a')[0] == a
+    backend.set('c', (c, {}, None))
+    assert backend.get('b') is None
+    assert backend.get('a')[0] == a
+    assert backend.get('c')[0] == c
+    assert backend.usage() == {'entries': 2, 'bytes': 2 * entry_size, 'evictions': 1}
+
+    backend.delete('a')
+    backend.delete('a')
+    assert backend.usage() == {'entries': 1, 'bytes': entry_size, 'evictions': 1}
+
+
+def test_memory_backend_skips_values_larger_than_limit():
+    backend = MemoryBackend(max_bytes=50)
+    backend.set('small', (b'x', {}, None))
+    backend.set('big', (b'x' * 100, {}, None))
+    assert backend.get('big') is None
+    assert backend.get('small') is not None
+    assert backend.usage() == {'entries': 1, 'bytes': _size(b'x'), 'evictions': 0}
+
+
+def test_disk_backend_evicts_least_recently_used(tmp_path):
+    entry_size = len(pickle.dumps((b'a' * 100, {}, None), protocol=pickle.HIGHEST_PROTOCOL))
+    backend = DiskBackend(str(tmp_path / 'cache.sqlite3'), max_bytes=entry_size * 2 + entry_size // 2)
+    backend.set('a', (b'a' * 100, {}, None))
+    backend.set('b', (b'b' * 100, {}, None))
+    backend.get('a')
+    backend.set('c', (b'c' * 100, {}, None))
+    assert backend.get('b') is None
+    assert backend.get('a') is not None
+    assert backend.usage() == {'entries': 2, 'bytes': 2 * entry_size, 'evictions': 1}
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from conftest import wait_until
+from single_flight import SingleFlight, make_key
+
+
+def start_leader(flight, key, fn):
+    """Inicia o líder numa thread e espera fn começar a rodar."""
+    started = threading.Event()
+    outcome = {}
+
+    def leader_fn():
+        started.set()
+        return fn()
+
+    def run():
+        try:
+            outcome['result'] = flight.do(key, leader_fn)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    return thread, outcome
+
+
+def start_follower(flight, key, fn):
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = flight.do(key, fn)
+        except BaseException as e:
+            outcome['error'] = e
+
+    shared_before = flight.stats()['shared']
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_until(lambda: flight.stats()['shared'] > shared_before)
+    return thread, outcome
+
+
+def test_follower_receives_leader_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    follower_calls = []
+
+    def compute():
+        release.wait(5)
+        return ['resultado']
+
+    leader, leader_outcome = start_leader(flight, 'k', compute)
+    follower, follower_outcome = start_follower(flight, 'k', lambda: follower_calls.append(1))
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert follower_calls == []
+    assert follower_outcome['result'] is leader_outcome['result']
+    assert flight.stats() == {'executed': 1, 'shared': 1, 'in_flight': 0}
+
+
+def test_follower_receives_leader_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    error = ValueError("falha na consulta")
+
+    def compute():
+        release.wait(5)
+        raise error
+
+    leader, leader_outcome = start_leader(flight, 'k', compute)
+    follower, follower_outcome = start_follower(flight, 'k', lambda: 'não deveria rodar')
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert leader_outcome['error'] is error
+    assert follower_outcome['error'] is error
+    assert 'result' not in follower_outcome
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_finished_call_is_not_cached():
+    flight = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do('k', compute) == 1
+    assert flight.do('k', compute) == 2
+    with pytest.raises(KeyError):
+        flight.do('k', lambda: {}['ausente'])
+    assert flight.do('k', compute) == 3
+
+
+def test_make_key_normalizes_arguments():
+    assert make_key('q', [1, 2], {'b': 1, 'a': {3}}) == make_key('q', (1, 2), {'a': [3], 'b': 1})
+    assert make_key('q', watermark=1) != make_key('q', watermark=2)
+    hash(make_key('q', [1, {'x': [2]}], filtro={'s'}))
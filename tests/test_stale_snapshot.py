@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from conftest import wait_until
+from stale_snapshot import StaleWhileRevalidate
+
+
+class ScriptedCompute:
+    """Devolve (ou levanta) os resultados na ordem dada; chamadas marcadas com um Event esperam por ele."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.gates = {}
+
+    def __call__(self):
+        self.calls += 1
+        gate = self.gates.get(self.calls)
+        if gate is not None:
+            assert gate.wait(5)
+        outcome = self.outcomes[min(self.calls, len(self.outcomes)) - 1]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def test_first_get_computes_synchronously():
+    compute = ScriptedCompute('v1')
+    snapshot = StaleWhileRevalidate(compute, max_age_seconds=60)
+    value, computed_at = snapshot.get()
+    assert value == 'v1'
+    assert computed_at is not None
+    assert snapshot.get() == (value, computed_at)
+    assert compute.calls == 1
+    assert not snapshot.refreshing
+
+
+def test_stale_value_is_served_while_one_background_refresh_runs():
+    compute = ScriptedCompute('v1', 'v2')
+    release = threading.Event()
+    compute.gates[2] = release
+    # max_age negativo: o valor vence logo depois de calculado
+    snapshot = StaleWhileRevalidate(compute, max_age_seconds=-1)
+    assert snapshot.get()[0] == 'v1'
+
+    for _ in range(20):
+        assert snapshot.get()[0] == 'v1'
+    wait_until(lambda: compute.calls == 2)
+    assert snapshot.refreshing
+    assert compute.calls == 2  # Uma única atualização em segundo plano, apesar das 20 leituras
+
+    release.set()
+    wait_until(lambda: not snapshot.refreshing)
+    assert snapshot.get()[0] == 'v2'
+    wait_until(lambda: not snapshot.refreshing)
+
+
+def test_last_error_is_set_and_cleared():
+    error = RuntimeError("banco indisponível")
+    compute = ScriptedCompute('v1', error, 'v2')
+    snapshot = StaleWhileRevalidate(compute, max_age_seconds=-1)
+    assert snapshot.get()[0] == 'v1'
+    assert snapshot.last_error is None
+
+    # A atualização em segundo plano falha: o valor anterior continua sendo servido
+    assert snapshot.get()[0] == 'v1'
+    wait_until(lambda: not snapshot.refreshing)
+    assert snapshot.last_error is error
+
+    # A próxima leitura serve o valor antigo e dispara outra atualização, que dá certo
+    assert snapshot.get()[0] == 'v1'
+    wait_until(lambda: not snapshot.refreshing)
+    assert snapshot.last_error is None
+    assert snapshot.get()[0] == 'v2'
+    wait_until(lambda: not snapshot.refreshing)
+
+
+def test_explicit_refresh_propagates_errors():
+    error = RuntimeError("falha")
+    compute = ScriptedCompute('v1', error)
+    snapshot = StaleWhileRevalidate(compute, max_age_seconds=60)
+    snapshot.get()
+    with pytest.raises(RuntimeError):
+        snapshot.refresh()
+    assert snapshot.get()[0] == 'v1'
@@ -2,12 +2,16 @@
 
 import streamlit as st
 import os
-from datetime import datetime, date as dt_date_class, time as dt_time_class, timedelta
+from functools import lru_cache
+from datetime import datetime, date as dt_date_class, time as dt_time_class, timedelta, timezone
 from typing import Dict, List, Optional, Any
-import uuid
 
 # Importa as constantes
-from constants import UI_TEXTS, ATTACHMENTS_DIR, DEADLINE_DAYS_MAPPING
+from constants import UI_TEXTS, ATTACHMENTS_DIR, PREVIEWS_DIR, DEADLINE_DAYS_MAPPING, STATIC_DIR
+from models import Attachment
+from attachment_pipeline import open_attachment, wait_for_ingestion
+from attachment_previews import PreviewCache, preview_kind
+from detail_render_cache import DetailRenderCache
 
 # Importa as funções do streamlit_app que interagem com o DB, para evitar circular imports
 # As funções que usam st.session_state e st.rerun() serão tratadas nas páginas ou no main.
@@ -45,49 +49,57 @@ def get_deadline_status(deadline_date_str: Optional[str], completion_timestamp_s
     except ValueError:
         return {"text": UI_TEXTS.text_na, "class": ""}
 
-def format_date_time_summary(date_val: Any, time_val: Any) -> str:
-    """Formata data e hora opcional para exibição."""
-    date_part_formatted = UI_TEXTS.text_na
-    time_part_formatted = ''
+# created_at é TIMESTAMPTZ (datetime com fuso); chave de ordenação para valores ausentes
+MIN_TIMESTAMP = datetime.min.replace(tzinfo=timezone.utc)
+
+
+@lru_cache(maxsize=4096)
+def format_datetime_display(value: Any, fmt: str = '%d/%m/%Y %H:%M:%S') -> str:
+    """
+    Formata datetime/date/time para exibição, com cache por (valor, formato).
+    Também aceita as strings ISO gravadas dentro dos campos JSONB (ex.: classification_timestamp);
+    se a string não for uma data válida, ela é exibida como está.
+    """
+    if value is None or value == '':
+        return UI_TEXTS.text_na
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value.strftime(fmt)
+
 
-    if isinstance(date_val, dt_date_class):
+@lru_cache(maxsize=4096)
+def format_date_time_summary(date_val: Any, time_val: Any) -> str:
+    """Formata data e hora opcional para exibição. O resultado fica em cache por par (data, hora)."""
+    if date_val is None:
+        date_part_formatted = 'Não informada'
+    elif isinstance(date_val, dt_date_class):
         date_part_formatted = date_val.strftime('%d/%m/%Y')
     elif isinstance(date_val, str) and date_val:
         try:
-            date_part_formatted = datetime.fromisoformat(date_val).date().strftime('%d/%m/%Y')
+            date_part_formatted = datetime.fromisoformat(date_val).strftime('%d/%m/%Y')
         except ValueError:
             date_part_formatted = 'Data inválida'
-    elif date_val is None:
-        date_part_formatted = 'Não informada'
+    else:
+        date_part_formatted = UI_TEXTS.text_na
 
+    time_part_formatted = ''
     if isinstance(time_val, dt_time_class):
         time_part_formatted = f" às {time_val.strftime('%H:%M')}"
     elif isinstance(time_val, str) and time_val and time_val.lower() != 'none':
+        # Strings de hora vêm de dados antigos; "00:00:00" indica hora não informada
         try:
-            time_str_part = time_val.split('.')[0]
-            try:
-                time_obj = datetime.strptime(time_str_part, '%H:%M:%S').time()
-                if time_obj == datetime.strptime("00:00:00", '%H:%M:%S').time():
-                    time_part_formatted = ''
-                else:
-                    time_part_formatted = f" às {time_obj.strftime('%H:%M')}"
-            except ValueError:
-                try:
-                    time_obj = datetime.strptime("00:00", '%H:%M').time()
-                    if time_obj == datetime.strptime("00:00", '%H:%M').time():
-                        time_part_formatted = ''
-                    else:
-                        time_part_formatted = f" às {time_obj.strftime('%H:%M')}"
-                except ValueError:
-                    time_part_formatted = f" às {time_val}"
-                    time_obj = None
+            time_obj = dt_time_class.fromisoformat(time_val.split('.')[0])
+            if time_obj != dt_time_class(0, 0):
+                time_part_formatted = f" às {time_obj.strftime('%H:%M')}"
         except ValueError:
-            time_part_formatted = f" às {time_val}"
-    elif time_val is None:
-        time_part_formatted = ''
+            pass
 
     return f"{date_part_formatted}{time_part_formatted}"
 
+
 def _clear_execution_form_state(notification_id: int):
     """Limpa as chaves do session_state para o formulário de execução após o envio."""
     key_desc = f"exec_action_desc_{notification_id}_refactored"
@@ -156,28 +168,14 @@ def _reset_form_state():
         'notified_department_complement': '', 'additional_notes': '', 'attachments': []
     }
 
-def save_uploaded_file_to_disk(uploaded_file: Any, notification_id: int) -> Optional[Dict]:
-    """Salva um arquivo enviado para o diretório de anexos no disco e retorna suas informações."""
-    if uploaded_file is None:
-        return None
-    original_name = uploaded_file.name
-    safe_original_name = "".join(c for c in original_name if c.isalnum() or c in ('.', '_', '-')).rstrip('.')
-    unique_filename = f"{notification_id}_{uuid.uuid4().hex}_{safe_original_name}"
-    file_path = os.path.join(ATTACHMENTS_DIR, unique_filename)
-    try:
-        os.makedirs(ATTACHMENTS_DIR, exist_ok=True)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        return {"unique_name": unique_filename, "original_name": original_name}
-    except Exception as e:
-        st.error(f"Erro ao salvar o anexo {original_name} no disco: {e}")
-        return None
-
 def get_attachment_data(unique_filename: str) -> Optional[bytes]:
-    """Lê o conteúdo de um arquivo de anexo do disco."""
-    file_path = os.path.join(ATTACHMENTS_DIR, unique_filename)
+    """Lê o conteúdo de um arquivo de anexo do disco (descomprimindo, se ele estiver guardado comprimido)."""
+    # Anexos recém-enviados podem ainda estar sendo gravados pelo pipeline de ingestão
+    if not wait_for_ingestion(unique_filename, timeout=5):
+        st.info(f"⏳ O anexo {unique_filename} ainda está sendo processado. Atualize a página em instantes.")
+        return None
     try:
-        with open(file_path, "rb") as f:
+        with open_attachment(ATTACHMENTS_DIR, unique_filename) as f:
             return f.read()
     except FileNotFoundError:
         st.warning(f"Anexo não encontrado no caminho: {unique_filename}")
@@ -186,135 +184,145 @@ def get_attachment_data(unique_filename: str) -> Optional[bytes]:
         st.error(f"Erro ao ler o anexo {unique_filename}: {e}")
         return None
 
-def display_notification_full_details(notification: Dict, user_id_logged_in: Optional[int] = None,
-                                      user_username_logged_in: Optional[str] = None):
+@st.cache_resource
+def stylesheet_style_tag(filename: str) -> str:
+    """Conteúdo de uma folha de estilos de STATIC_DIR num bloco <style>, lido uma vez por processo."""
+    with open(os.path.join(STATIC_DIR, filename), encoding='utf-8') as f:
+        return f"<style>\n{f.read()}</style>"
+
+@st.cache_resource
+def get_preview_cache() -> PreviewCache:
+    """Cache de miniaturas dos anexos, compartilhado pelo processo (gerado sob demanda em segundo plano)."""
+    return PreviewCache(PREVIEWS_DIR, lambda unique_name: open_attachment(ATTACHMENTS_DIR, unique_name))
+
+@st.cache_resource
+def get_detail_render_cache() -> DetailRenderCache:
+    """Cache dos blocos de texto dos detalhes das notificações, compartilhado pelo processo."""
+    return DetailRenderCache()
+
+def display_attachment_preview(unique_name: str, original_name: str):
+    """Mostra a miniatura de um anexo (imagem ou PDF), se o tipo tiver pré-visualização."""
+    if preview_kind(unique_name) is None:
+        return
+    preview_path = get_preview_cache().get(unique_name)
+    if preview_path:
+        st.image(preview_path, caption=original_name, width=240)
+    else:
+        st.caption(f"🖼️ Gerando pré-visualização de {original_name}...")
+
+def _build_notification_detail_blocks(notification: Dict, user_id_logged_in: Optional[int] = None,
+                                      user_username_logged_in: Optional[str] = None) -> List[tuple]:
     """
-    Exibe os detalhes completos de uma notificação.
-    A função get_notification_actions deve ser importada do streamlit_app.
+    Monta os blocos de texto dos detalhes de uma notificação, sem chamar o Streamlit.
+    Cada bloco é (tipo, conteúdo); anexos e evidências entram como listas de (unique_name, original_name),
+    renderizadas a cada exibição porque criam widgets.
     """
-    # Importação LOCAL para evitar circular imports no topo do utils.py
-    # Assumimos que essas funções estão disponíveis no streamlit_app.py
-    from streamlit_app import get_notification_actions, load_users # Carregar users para nomes de executor
-
-    st.markdown("### Detalhes da Notificação")
-    col_det1, col_det2 = st.columns(2)
-    with col_det1:
-        st.markdown("**📝 Evento Reportado Original**")
-        st.write(f"**Título:** {notification.get('title', UI_TEXTS.text_na)}")
-        st.write(f"**Local:** {notification.get('location', UI_TEXTS.text_na)}")
-        occurrence_datetime_summary = format_date_time_summary(notification.get('occurrence_date'),
-                                                               notification.get('occurrence_time'))
-        st.write(f"**Data/Hora Ocorrência:** {occurrence_datetime_summary}")
-        st.write(f"**Setor Notificante:** {notification.get('reporting_department', UI_TEXTS.text_na)}")
-        if notification.get('immediate_actions_taken') and notification.get('immediate_action_description'):
-            st.write(
-                f"**Ações Imediatas Reportadas:** {notification.get('immediate_action_description', UI_TEXTS.text_na)[:100]}...")
-
-    with col_det2:
-        st.markdown("**⏱️ Informações de Gestão e Classificação**")
-        classif = notification.get('classification') or {}
-        st.write(f"**Classificação NNC:** {classif.get('nnc', UI_TEXTS.text_na)}")
-        if classif.get('nivel_dano'): st.write(f"**Nível de Dano:** {classif.get('nivel_dano', UI_TEXTS.text_na)}")
-        st.write(f"**Prioridade:** {classif.get('prioridade', UI_TEXTS.text_na)}")
-        st.write(f"**Never Event:** {classif.get('never_event', UI_TEXTS.text_na)}")
-        st.write(f"**Evento Sentinela:** {'Sim' if classif.get('is_sentinel_event') else 'Não'}")
-        st.write(f"**Tipo Principal:** {classif.get('event_type_main', UI_TEXTS.text_na)}")
-        sub_type_display_closed = ''
-        if classif.get('event_type_sub'):
-            if isinstance(classif['event_type_sub'], list):
-                sub_type_display_closed = ', '.join(classif['event_type_sub'])
-            else:
-                sub_type_display_closed = str(classif['event_type_sub'])
-        if sub_type_display_closed: st.write(f"**Especificação:** {sub_type_display_closed}")
-        st.write(f"**Classificação OMS:** {', '.join(classif.get('oms', [UI_TEXTS.text_na]))}")
-        st.write(f"**Classificado por:** {classif.get('classificador', UI_TEXTS.text_na)}")
-
-        deadline_date_str = classif.get('deadline_date')
-        if deadline_date_str:
-            deadline_date_formatted = datetime.fromisoformat(deadline_date_str).strftime('%d/%m/%Y')
-            completion_timestamp_str = (notification.get('conclusion') or {}).get('timestamp')
-            deadline_status = get_deadline_status(deadline_date_str, completion_timestamp_str)
-            st.markdown(
-                f"**Prazo de Conclusão:** {deadline_date_formatted} (<span class='{deadline_status['class']}'>{deadline_status['text']}</span>)",
-                unsafe_allow_html=True)
+    blocks = [('markdown', "### Detalhes da Notificação")]
+
+    reported_lines = [
+        "**📝 Evento Reportado Original**",
+        f"**Título:** {notification.get('title', UI_TEXTS.text_na)}",
+        f"**Local:** {notification.get('location', UI_TEXTS.text_na)}",
+        f"**Data/Hora Ocorrência:** {format_date_time_summary(notification.get('occurrence_date'), notification.get('occurrence_time'))}",
+        f"**Setor Notificante:** {notification.get('reporting_department', UI_TEXTS.text_na)}",
+    ]
+    if notification.get('immediate_actions_taken') and notification.get('immediate_action_description'):
+        reported_lines.append(
+            f"**Ações Imediatas Reportadas:** {notification.get('immediate_action_description', UI_TEXTS.text_na)[:100]}...")
+
+    classif = notification.get('classification') or {}
+    management_lines = [
+        "**⏱️ Informações de Gestão e Classificação**",
+        f"**Classificação NNC:** {classif.get('nnc', UI_TEXTS.text_na)}",
+    ]
+    if classif.get('nivel_dano'):
+        management_lines.append(f"**Nível de Dano:** {classif.get('nivel_dano', UI_TEXTS.text_na)}")
+    management_lines += [
+        f"**Prioridade:** {classif.get('prioridade', UI_TEXTS.text_na)}",
+        f"**Never Event:** {classif.get('never_event', UI_TEXTS.text_na)}",
+        f"**Evento Sentinela:** {'Sim' if classif.get('is_sentinel_event') else 'Não'}",
+        f"**Tipo Principal:** {classif.get('event_type_main', UI_TEXTS.text_na)}",
+    ]
+    sub_type_display_closed = ''
+    if classif.get('event_type_sub'):
+        if isinstance(classif['event_type_sub'], list):
+            sub_type_display_closed = ', '.join(classif['event_type_sub'])
         else:
-            st.write(f"**Prazo de Conclusão:** {UI_TEXTS.deadline_days_nan}")
+            sub_type_display_closed = str(classif['event_type_sub'])
+    if sub_type_display_closed:
+        management_lines.append(f"**Especificação:** {sub_type_display_closed}")
+    management_lines += [
+        f"**Classificação OMS:** {', '.join(classif.get('oms', [UI_TEXTS.text_na]))}",
+        f"**Classificado por:** {classif.get('classificador', UI_TEXTS.text_na)}",
+    ]
+    # O status do prazo depende da data de hoje, então só os parâmetros entram no bloco
+    deadline = (classif.get('deadline_date'), (notification.get('conclusion') or {}).get('timestamp'))
+    blocks.append(('columns', ("\n\n".join(reported_lines), "\n\n".join(management_lines), deadline)))
 
-    st.markdown("**📝 Descrição Completa do Evento**")
-    st.info(notification.get('description', UI_TEXTS.text_na))
+    blocks.append(('markdown', "**📝 Descrição Completa do Evento**"))
+    blocks.append(('info', notification.get('description', UI_TEXTS.text_na)))
     if classif.get('notes'):
-        st.markdown("**📋 Orientações / Observações do Classificador**")
-        st.success(classif.get('notes', UI_TEXTS.text_na))
+        blocks.append(('markdown', "**📋 Orientações / Observações do Classificador**"))
+        blocks.append(('success', classif.get('notes', UI_TEXTS.text_na)))
 
     if notification.get('actions'):
-        st.markdown("#### ⚡ Histórico de Ações")
-        for action in sorted(notification['actions'], key=lambda x: x.get('timestamp', '')):
+        blocks.append(('markdown', "#### ⚡ Histórico de Ações"))
+        for action in notification['actions']:  # Já vêm ordenadas por action_timestamp do banco
             action_type = "🏁 CONCLUSÃO (Executor)" if action.get('final_action_by_executor') else "📝 AÇÃO Registrada"
-            action_timestamp = action.get('timestamp', UI_TEXTS.text_na)
-            if action_timestamp != UI_TEXTS.text_na:
-                try:
-                    action_timestamp = datetime.fromisoformat(action_timestamp).strftime('%d/%m/%Y %H:%M:%S')
-                except ValueError:
-                    pass
+            action_timestamp = format_datetime_display(action.get('timestamp'))
 
             if user_id_logged_in and action.get('executor_id') == user_id_logged_in:
-                st.markdown(f"""
+                blocks.append(('html', f"""
                 <div class='my-action-entry-card'>
                     <strong>{action_type}</strong> - por <strong>VOCÊ ({action.get('executor_name', UI_TEXTS.text_na)})</strong> em {action_timestamp}
                     <br>
                     <em>{action.get('description', UI_TEXTS.text_na)}</em>
                 </div>
-                """, unsafe_allow_html=True)
+                """))
             else:
-                st.markdown(f"""
+                blocks.append(('html', f"""
                 <div class='action-entry-card'>
                     <strong>{action_type}</strong> - por <strong>{action.get('executor_name', UI_TEXTS.text_na)}</strong> em {action_timestamp}
                     <br>
                     <em>{action.get('description', UI_TEXTS.text_na)}</em>
                 </div>
-                """, unsafe_allow_html=True)
+                """))
 
+            # Evidências da ação final do executor, se houver
             if action.get('final_action_by_executor'):
-                evidence_desc = action.get('evidence_description', '').strip()
-                evidence_atts = action.get('evidence_attachments', [])
+                evidence_desc = (action.get('evidence_description') or '').strip()
+                evidence_atts = action.get('evidence_attachments') or []
                 if evidence_desc or evidence_atts:
-                    st.markdown(f"""<div class='evidence-section'>""", unsafe_allow_html=True)
-                    st.markdown("<h6>Evidências da Conclusão:</h6>", unsafe_allow_html=True)
+                    blocks.append(('html', "<div class='evidence-section'>"))
+                    blocks.append(('html', "<h6>Evidências da Conclusão:</h6>"))
                     if evidence_desc:
-                        st.info(evidence_desc)
+                        blocks.append(('info', evidence_desc))
                     if evidence_atts:
-                        for attach_info in evidence_atts:
-                            unique_name = attach_info.get('unique_name')
-                            original_name = attach_info.get('original_name')
-                            if unique_name and original_name:
-                                file_content = get_attachment_data(unique_name)
-                                if file_content:
-                                    st.download_button(
-                                        label=f"Baixar Evidência: {original_name}",
-                                        data=file_content,
-                                        file_name=original_name,
-                                        mime="application/octet-stream",
-                                        key=f"download_action_evidence_{notification['id']}_{unique_name}"
-                                    )
-                                else:
-                                    st.write(f"Anexo: {original_name} (arquivo não encontrado ou corrompido)")
-                    st.markdown(f"""</div>""", unsafe_allow_html=True)
-
-            st.markdown("---")
+                        blocks.append(('evidence', [
+                            (attach_info.get('unique_name'), attach_info.get('original_name'))
+                            for attach_info in evidence_atts
+                            if attach_info.get('unique_name') and attach_info.get('original_name')
+                        ]))
+                    blocks.append(('html', "</div>"))
+
+            blocks.append(('markdown', "---"))
 
     if notification.get('review_execution'):
-        st.markdown("#### 🛠️ Revisão de Execução")
         review_exec = notification['review_execution']
-        st.write(f"**Decisão:** {review_exec.get('decision', UI_TEXTS.text_na)}")
-        st.write(f"**Revisado por:** {review_exec.get('reviewed_by', UI_TEXTS.text_na)}")
-        st.write(f"**Observações:** {review_exec.get('notes', UI_TEXTS.text_na)}")
+        review_lines = [
+            "#### 🛠️ Revisão de Execução",
+            f"**Decisão:** {review_exec.get('decision', UI_TEXTS.text_na)}",
+            f"**Revisado por:** {review_exec.get('reviewed_by', UI_TEXTS.text_na)}",
+            f"**Observações:** {review_exec.get('notes', UI_TEXTS.text_na)}",
+        ]
         if review_exec.get('rejection_reason'):
-            st.write(f"**Motivo Rejeição:** {review_exec.get('rejection_reason', UI_TEXTS.text_na)}")
+            review_lines.append(f"**Motivo Rejeição:** {review_exec.get('rejection_reason', UI_TEXTS.text_na)}")
+        blocks.append(('markdown', "\n\n".join(review_lines)))
     if notification.get('approval'):
-        st.markdown("#### ✅ Aprovação Final")
+        blocks.append(('markdown', "#### ✅ Aprovação Final"))
         approval_info = notification['approval']
         if user_username_logged_in and approval_info.get('approved_by') == user_username_logged_in:
-            st.markdown(f"""
+            blocks.append(('html', f"""
             <div style='background-color: #e6ffe6; padding: 10px; border-radius: 5px; border-left: 3px solid #4CAF50;'>
                 <strong>Decisão:</strong> {approval_info.get('decision', UI_TEXTS.text_na)}
                 <br>
@@ -322,70 +330,136 @@ def display_notification_full_details(notification: Dict, user_id_logged_in: Opt
                 <br>
                 <strong>Observações:</strong> {approval_info.get('notes', UI_TEXTS.text_na)}
             </div>
-            """, unsafe_allow_html=True)
+            """))
         else:
-            st.write(f"**Decisão:** {approval_info.get('decision', UI_TEXTS.text_na)}")
-            st.write(f"**Aprovado por:** {approval_info.get('approved_by', UI_TEXTS.text_na)}")
-            st.write(f"**Observações:** {approval_info.get('notes', UI_TEXTS.text_na)}")
+            blocks.append(('markdown', "\n\n".join([
+                f"**Decisão:** {approval_info.get('decision', UI_TEXTS.text_na)}",
+                f"**Aprovado por:** {approval_info.get('approved_by', UI_TEXTS.text_na)}",
+                f"**Observações:** {approval_info.get('notes', UI_TEXTS.text_na)}",
+            ])))
 
     if notification.get('rejection_classification'):
-        st.markdown("#### ❌ Rejeição na Classificação Inicial")
         rej_classif = notification['rejection_classification']
-        st.write(f"**Motivo:** {rej_classif.get('reason', UI_TEXTS.text_na)}")
-        st.write(f"**Rejeitado por:** {rej_classif.get('classified_by', UI_TEXTS.text_na)}")
+        blocks.append(('markdown', "\n\n".join([
+            "#### ❌ Rejeição na Classificação Inicial",
+            f"**Motivo:** {rej_classif.get('reason', UI_TEXTS.text_na)}",
+            f"**Rejeitado por:** {rej_classif.get('classified_by', UI_TEXTS.text_na)}",
+        ])))
 
     if notification.get('rejection_approval'):
-        st.markdown("#### ⛔ Reprovada na Aprovação")
+        blocks.append(('markdown', "#### ⛔ Reprovada na Aprovação"))
         rej_appr = notification['rejection_approval']
         if user_username_logged_in and rej_appr.get('rejected_by') == user_username_logged_in:
-            st.markdown(f"""
+            blocks.append(('html', f"""
             <div style='background-color: #ffe6e6; padding: 10px; border-radius: 5px; border-left: 3px solid #f44336;'>
                 <strong>Motivo:</strong> {rej_appr.get('reason', UI_TEXTS.text_na)}
                 <br>
                 <strong>Reprovado por:</strong> VOCÊ ({rej_appr.get('rejected_by', UI_TEXTS.text_na)})
             </div>
-            """, unsafe_allow_html=True)
+            """))
         else:
-            st.write(f"**Motivo:** {rej_appr.get('reason', UI_TEXTS.text_na)}")
-            st.write(f"**Reprovado por:** {rej_appr.get('rejected_by', UI_TEXTS.text_na)}")
+            blocks.append(('markdown', "\n\n".join([
+                f"**Motivo:** {rej_appr.get('reason', UI_TEXTS.text_na)}",
+                f"**Reprovado por:** {rej_appr.get('rejected_by', UI_TEXTS.text_na)}",
+            ])))
 
     if notification.get('rejection_execution_review'):
-        st.markdown("#### 🔄 Execução Rejeitada (Revisão do Classificador)")
+        blocks.append(('markdown', "#### 🔄 Execução Rejeitada (Revisão do Classificador)"))
         rej_exec_review = notification['rejection_execution_review']
         if user_username_logged_in and rej_exec_review.get('reviewed_by') == user_username_logged_in:
-            st.markdown(f"""
+            blocks.append(('html', f"""
             <div style='background-color: #ffe6e6; padding: 10px; border-radius: 5px; border-left: 3px solid #f44336;'>
                 <strong>Motivo:</strong> {rej_exec_review.get('reason', UI_TEXTS.text_na)}
                 <br>
                 <strong>Rejeitado por:</strong> VOCÊ ({rej_exec_review.get('reviewed_by', UI_TEXTS.text_na)})
             </div>
-            """, unsafe_allow_html=True)
+            """))
         else:
-            st.write(f"**Motivo:** {rej_exec_review.get('reason', UI_TEXTS.text_na)}")
-            st.write(f"**Rejeitado por:** {rej_exec_review.get('reviewed_by', UI_TEXTS.text_na)}")
+            blocks.append(('markdown', "\n\n".join([
+                f"**Motivo:** {rej_exec_review.get('reason', UI_TEXTS.text_na)}",
+                f"**Rejeitado por:** {rej_exec_review.get('reviewed_by', UI_TEXTS.text_na)}",
+            ])))
 
     if notification.get('attachments'):
-        st.markdown("#### 📎 Anexos")
+        attachments = []
         for attach_info in notification['attachments']:
-            unique_name_to_use = None
-            original_name_to_use = None
-            if isinstance(attach_info, dict) and 'unique_name' in attach_info and 'original_name' in attach_info:
-                unique_name_to_use = attach_info['unique_name']
-                original_name_to_use = attach_info['original_name']
-            elif isinstance(attach_info, str):
-                unique_name_to_use = attach_info
-                original_name_to_use = attach_info
-            if unique_name_to_use:
-                file_content = get_attachment_data(unique_name_to_use)
+            if isinstance(attach_info, (dict, Attachment)) and 'unique_name' in attach_info and 'original_name' in attach_info:
+                attachments.append((attach_info['unique_name'], attach_info['original_name']))
+            elif isinstance(attach_info, str):  # Fallback para compatibilidade antiga
+                attachments.append((attach_info, attach_info))
+        blocks.append(('markdown', "#### 📎 Anexos"))
+        blocks.append(('attachments', [(unique_name, original_name) for unique_name, original_name in attachments
+                                       if unique_name]))
+
+    blocks.append(('markdown', "---"))
+    return blocks
+
+def display_notification_full_details(notification: Dict, user_id_logged_in: Optional[int] = None,
+                                      user_username_logged_in: Optional[str] = None):
+    """
+    Exibe os detalhes completos de uma notificação.
+    Os blocos de texto ficam no cache de renderização, com chave pela versão da linha e pelo usuário
+    (que muda os destaques "VOCÊ"); anexos, downloads e o status do prazo são renderizados a cada vez.
+    """
+    notification_id = notification.get('id')
+    row_version = notification.get('row_version')
+    cache_key = (notification_id, row_version, user_id_logged_in, user_username_logged_in)
+    render_cache = get_detail_render_cache()
+    blocks = render_cache.get(cache_key) if row_version is not None else None
+    if blocks is None:
+        blocks = _build_notification_detail_blocks(notification, user_id_logged_in, user_username_logged_in)
+        if row_version is not None:
+            render_cache.put(cache_key, blocks)
+
+    for kind, content in blocks:
+        if kind == 'markdown':
+            st.markdown(content)
+        elif kind == 'html':
+            st.markdown(content, unsafe_allow_html=True)
+        elif kind == 'info':
+            st.info(content)
+        elif kind == 'success':
+            st.success(content)
+        elif kind == 'columns':
+            reported_md, management_md, (deadline_date_str, completion_timestamp_str) = content
+            col_det1, col_det2 = st.columns(2)
+            with col_det1:
+                st.markdown(reported_md)
+            with col_det2:
+                st.markdown(management_md)
+                if deadline_date_str:
+                    deadline_date_formatted = format_datetime_display(deadline_date_str, '%d/%m/%Y')
+                    deadline_status = get_deadline_status(deadline_date_str, completion_timestamp_str)
+                    st.markdown(
+                        f"**Prazo de Conclusão:** {deadline_date_formatted} (<span class='{deadline_status['class']}'>{deadline_status['text']}</span>)",
+                        unsafe_allow_html=True)
+                else:
+                    st.write(f"**Prazo de Conclusão:** {UI_TEXTS.deadline_days_nan}")
+        elif kind == 'evidence':
+            for unique_name, original_name in content:
+                display_attachment_preview(unique_name, original_name)
+                file_content = get_attachment_data(unique_name)
                 if file_content:
                     st.download_button(
-                        label=f"Baixar {original_name_to_use}",
+                        label=f"Baixar Evidência: {original_name}",
                         data=file_content,
-                        file_name=original_name_to_use,
+                        file_name=original_name,
                         mime="application/octet-stream",
-                        key=f"download_closed_{notification['id']}_{unique_name_to_use}"
+                        key=f"download_action_evidence_{notification_id}_{unique_name}"
                     )
                 else:
-                    st.write(f"Anexo: {original_name_to_use} (arquivo não encontrado ou corrompido)")
-
-    st.markdown("---")
\ No newline at end of file
+                    st.write(f"Anexo: {original_name} (arquivo não encontrado ou corrompido)")
+        elif kind == 'attachments':
+            for unique_name, original_name in content:
+                display_attachment_preview(unique_name, original_name)
+                file_content = get_attachment_data(unique_name)
+                if file_content:
+                    st.download_button(
+                        label=f"Baixar {original_name}",
+                        data=file_content,
+                        file_name=original_name,
+                        mime="application/octet-stream",
+                        key=f"download_closed_{notification_id}_{unique_name}"
+                    )
+                else:
+                    st.write(f"Anexo: {original_name} (arquivo não encontrado ou corrompido)")